@@ -0,0 +1,241 @@
+"""批次檢查的HTTP API（與Streamlit介面並行執行）
+
+其他系統以程式送出餐廳清單，不需要透過瀏覽器上傳：
+    POST   /jobs               JSON {"urls": [...]} 或 {"restaurants": [{"url": ..., "name": ..., "priority": 1}]}
+    POST   /jobs/xlsx          請求內容為Excel檔（與Web介面上傳的格式相同），可加 ?priority_column=重點poi
+    GET    /jobs/{id}          工作狀態與各狀態的餐廳數
+    GET    /jobs/{id}/results  NDJSON串流：每完成一間餐廳輸出一行（依完成順序，index為原始順序），工作結束時串流結束
+    GET    /jobs/{id}/report   依原始順序排列的Excel報告
+    DELETE /jobs/{id}          取消尚未開始的餐廳
+    GET    /metrics            Prometheus格式的指標
+
+所有工作都交給同一個 CheckerPool（worker數由 --workers 或 CHECKER_WORKERS 設定），
+每個工作的結果也會保存到歷史紀錄（一個工作是一次執行）。
+
+用法:
+    pip install fastapi uvicorn
+    python api.py --port 8000 --workers 4
+    curl -X POST localhost:8000/jobs -H 'Content-Type: application/json' -d '{"urls": ["https://s.openrice.com/xxx"]}'
+    curl -X POST 'localhost:8000/jobs/xlsx?priority_column=重點poi' --data-binary @restaurants.xlsx
+    curl -N localhost:8000/jobs/<job_id>/results
+"""
+import io
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from batch_scheduler import build_work_queue
+from log_config import logger, setup_logging
+from metrics import REGISTRY
+from worker_pool import BatchJob, CheckerPool
+
+try:
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+    from pydantic import BaseModel
+    FASTAPI_AVAILABLE = True
+except ImportError:
+    FASTAPI_AVAILABLE = False
+
+# 已結束的工作保留多久（秒），之後從記憶體中移除
+JOB_TTL = float(os.environ.get('API_JOB_TTL', '3600'))
+# NDJSON串流等待新結果的間隔（秒）
+STREAM_POLL_SECONDS = 15
+
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+if FASTAPI_AVAILABLE:
+    class RestaurantIn(BaseModel):
+        url: str
+        name: Optional[str] = None
+        priority: float = 0.0
+
+    class JobRequest(BaseModel):
+        urls: List[str] = []
+        restaurants: List[RestaurantIn] = []
+        restaurant_budget: Optional[float] = None
+
+
+def ndjson_lines(job, offset=0, poll_seconds=STREAM_POLL_SECONDS):
+    """依完成順序產生工作結果的NDJSON行，直到工作結束
+    :param offset: 從第幾個完成的結果開始（斷線後重新連線時使用）
+    """
+    cursor = offset
+    while True:
+        batch = job.wait_results(cursor, poll_seconds)
+        for item, result in batch:
+            yield json.dumps({'index': item.index, **result}, ensure_ascii=False, default=str) + '\n'
+        cursor += len(batch)
+        if not batch and job.finished:
+            return
+
+
+class JobRegistry:
+    """記憶體中的工作清單，送出工作時順便移除結束超過JOB_TTL的工作"""
+
+    def __init__(self, pool, history=None, ttl=JOB_TTL):
+        self.pool = pool
+        self.history = history
+        self.ttl = ttl
+        self._jobs = {}
+        self._run_ids = {}
+        self._lock = threading.Lock()
+
+    def create(self, df, priority_column=None, restaurant_budget=None, label=None):
+        """由包含'餐廳名稱'與'URL'欄位的DataFrame建立工作並送進worker池"""
+        from check_restaurants import OpenRiceChecker
+        items = build_work_queue(df, priority_column=priority_column,
+                                 short_url_hosts=OpenRiceChecker.SHORT_URL_HOSTS)
+        job = BatchJob(items, restaurant_budget=restaurant_budget, label=label)
+        run_id = None
+        if self.history is not None:
+            run_id = self.history.start_run(source='api', label=label or job.id)
+            job.on_result = lambda job, item, result: self.history.record(run_id, result)
+            job.on_finish = lambda job: self.history.finish_run(run_id)
+        with self._lock:
+            now = time.time()
+            for job_id, old in list(self._jobs.items()):
+                if old.finished_at and now - old.finished_at > self.ttl:
+                    del self._jobs[job_id]
+                    self._run_ids.pop(job_id, None)
+            self._jobs[job.id] = job
+            self._run_ids[job.id] = run_id
+        self.pool.submit(job)
+        logger.info(f"API工作 {job.id}: {job.total} 間餐廳（佇列中共 {self.pool.queued} 間）")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def history_run_id(self, job):
+        """工作在歷史紀錄中的run_id（沒有保存歷史紀錄時為None）"""
+        with self._lock:
+            return self._run_ids.get(job.id)
+
+
+def restaurants_frame(request):
+    """把JSON請求中的URL清單轉成build_work_queue使用的DataFrame"""
+    import pandas as pd
+    rows = [{'餐廳名稱': url, 'URL': url, '優先級': 0.0} for url in request.urls]
+    rows += [{'餐廳名稱': item.name or item.url, 'URL': item.url, '優先級': item.priority}
+             for item in request.restaurants]
+    return pd.DataFrame(rows, columns=['餐廳名稱', 'URL', '優先級'])
+
+
+def create_app(pool=None, history=None):
+    """建立FastAPI應用
+    :param pool: CheckerPool，None時建立一個（worker數使用CHECKER_WORKERS）
+    :param history: HistoryStore，None時不保存歷史紀錄
+    """
+    if not FASTAPI_AVAILABLE:
+        raise RuntimeError("FastAPI未安裝（pip install fastapi uvicorn）")
+    from check_restaurants import load_restaurant_sheet
+
+    registry = JobRegistry(pool or CheckerPool(), history)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        registry.pool.close()
+
+    app = FastAPI(title='OpenRice 餐廳要素檢查 API', lifespan=lifespan)
+
+    def find_job(job_id):
+        job = registry.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f'找不到工作 {job_id}')
+        return job
+
+    def accepted(job):
+        return {**job.summary(), 'results_url': f'/jobs/{job.id}/results', 'report_url': f'/jobs/{job.id}/report'}
+
+    @app.post('/jobs', status_code=202)
+    def submit_json(request: JobRequest):
+        df = restaurants_frame(request)
+        if df.empty:
+            raise HTTPException(status_code=400, detail='請提供 urls 或 restaurants')
+        return accepted(registry.create(df, priority_column='優先級', restaurant_budget=request.restaurant_budget))
+
+    @app.post('/jobs/xlsx', status_code=202)
+    async def submit_xlsx(request: Request, priority_column: Optional[str] = None,
+                          restaurant_budget: Optional[float] = None, filename: Optional[str] = None):
+        body = await request.body()
+        # 讀取Excel與建立工作佇列是阻塞的（pandas/openpyxl），在執行緒池中執行，不阻塞其他請求
+        df = await run_in_threadpool(load_restaurant_sheet, io.BytesIO(body)) if body else None
+        if df is None or df.empty:
+            raise HTTPException(status_code=400, detail='無法讀取Excel，需要包含餐廳名稱與URL欄位')
+        if priority_column and priority_column not in df.columns:
+            raise HTTPException(status_code=400, detail=f'Excel中沒有欄位 {priority_column}')
+        job = await run_in_threadpool(registry.create, df, priority_column=priority_column,
+                                      restaurant_budget=restaurant_budget, label=filename)
+        return accepted(job)
+
+    @app.get('/jobs/{job_id}')
+    def job_status(job_id: str):
+        return find_job(job_id).summary()
+
+    @app.get('/jobs/{job_id}/results')
+    def job_results(job_id: str, offset: int = 0):
+        return StreamingResponse(ndjson_lines(find_job(job_id), offset), media_type='application/x-ndjson')
+
+    @app.get('/jobs/{job_id}/report')
+    def job_report(job_id: str):
+        import pandas as pd
+        from report import write_report_sheets
+        job = find_job(job_id)
+        results = job.results_in_order()
+        if not results:
+            raise HTTPException(status_code=409, detail='工作還沒有任何結果')
+        run_id = registry.history_run_id(job)
+        delta = registry.history.delta_rows(run_id) if run_id is not None and job.finished else None
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            write_report_sheets(writer, pd.DataFrame(results), delta=delta)
+        return Response(buffer.getvalue(), media_type=XLSX_MEDIA_TYPE,
+                        headers={'Content-Disposition': f'attachment; filename="report-{job.id}.xlsx"'})
+
+    @app.delete('/jobs/{job_id}')
+    def cancel_job(job_id: str):
+        job = find_job(job_id)
+        job.cancel()
+        return job.summary()
+
+    @app.get('/metrics')
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return app
+
+
+def main(argv=None):
+    import argparse
+    from history_store import DEFAULT_HISTORY_FILE, HistoryStore
+
+    parser = argparse.ArgumentParser(description='OpenRice 餐廳要素檢查：批次HTTP API')
+    parser.add_argument('--host', default=os.environ.get('API_HOST', '127.0.0.1'), help='監聽位址')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('API_PORT', '8000')), help='監聽埠')
+    parser.add_argument('--workers', type=int, help='檢查器worker數（預設環境變量CHECKER_WORKERS或2）')
+    parser.add_argument('--no-selenium', action='store_true', help='只使用requests（不啟動Chrome）')
+    parser.add_argument('--history', default=os.environ.get('CHECKER_HISTORY', DEFAULT_HISTORY_FILE),
+                        help=f'歷史紀錄檔(SQLite)（預設{DEFAULT_HISTORY_FILE}）')
+    parser.add_argument('--no-history', action='store_true', help='不保存歷史紀錄')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error("uvicorn未安裝（pip install fastapi uvicorn）")
+    pool = CheckerPool(workers=args.workers, checker_options={'use_selenium': not args.no_selenium})
+    history = None if args.no_history else HistoryStore(args.history)
+    uvicorn.run(create_app(pool, history), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
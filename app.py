@@ -1,9 +1,31 @@
 import streamlit as st
 import pandas as pd
 from check_restaurants import OpenRiceChecker
-import time
+from time_budget import TIMEOUT_MARK
+from log_config import setup_logging
+from batch_scheduler import RULE_FAILED_FIRST, build_work_queue, find_priority_column, row_fingerprint
+from report import CATEGORY_ERROR, CATEGORY_PASSED, CHECK_ITEMS, status_categories, summarize, write_report_sheets
+from history_store import DEFAULT_HISTORY_FILE, HistoryStore
+from metrics import DEFAULT_METRICS_PORT, start_metrics_server
 import os
 import sys
+import time
+
+# 日誌設定（LOG_LEVEL / LOG_FORMAT / CHECKER_QUIET 環境變量）
+setup_logging()
+
+# 重新上傳時直接使用的結果有效時間預設值（小時），環境變量CHECKER_CACHE_HOURS
+DEFAULT_CACHE_HOURS = int(os.environ.get('CHECKER_CACHE_HOURS', '12'))
+
+
+@st.cache_resource(show_spinner=False)
+def start_metrics():
+    """在Streamlit旁邊提供 /metrics（整個行程只啟動一次；METRICS_PORT=0 不啟動）"""
+    port = int(os.environ.get('METRICS_PORT', DEFAULT_METRICS_PORT))
+    if port:
+        return start_metrics_server(port, host=os.environ.get('METRICS_HOST', '127.0.0.1'))
+    return None
+
 
 # 設置Streamlit配置（確保在Railway環境中正常運行）
 st.set_page_config(
@@ -12,6 +34,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# set_page_config 必須是第一個Streamlit指令，之後才啟動指標伺服器
+start_metrics()
+
 # 確保輸出被刷新（Railway環境需要）
 sys.stdout.flush()
 sys.stderr.flush()
@@ -74,8 +99,7 @@ with st.sidebar:
                     st.json(result)
                     
                     # 清理資源
-                    if checker.driver:
-                        checker.driver.quit()
+                    checker.close()
                 except Exception as e:
                     st.error(f"測試失敗: {e}")
                     import traceback
@@ -110,6 +134,39 @@ if uploaded_file is not None:
             st.warning("⚠️ 請確保Excel檔案包含'餐廳名稱'和'URL'欄位")
         else:
             st.success("✅ Excel檔案格式正確")
+        
+        # 檢查順序：優先級高的（例如重點poi）先檢查，結果會先出現在表格中
+        column_options = ['（不使用）'] + [str(col) for col in df.columns]
+        default_column = find_priority_column(df.columns)
+        priority_choice = st.selectbox(
+            "優先級欄位",
+            column_options,
+            index=column_options.index(default_column) if default_column else 0,
+            help="數字越大越先檢查；「是/Y/重點」視為1"
+        )
+        st.session_state.priority_column = None if priority_choice == '（不使用）' else priority_choice
+        # 時間上限：一間很慢的餐廳不會卡住整批，整批也可以設定「時間到就給我已完成的結果」
+        budget_col1, budget_col2 = st.columns(2)
+        with budget_col1:
+            st.session_state.restaurant_budget = st.number_input(
+                "每間餐廳時間上限（秒，0為不限）", min_value=0, value=90, step=10,
+                help="超過時已完成的項目保留結果，其餘標記為「逾時」"
+            )
+        with budget_col2:
+            st.session_state.batch_budget_minutes = st.number_input(
+                "整批時間上限（分鐘，0為不限）", min_value=0, value=0, step=5,
+                help="時間到時停止檢查，報告只包含已完成的餐廳"
+            )
+        st.session_state.failed_first = st.checkbox(
+            "上次不合格的餐廳先檢查",
+            value=False,
+            disabled=not st.session_state.get('results'),
+            help="依本次工作階段上一輪的檢查結果排序"
+        )
+        st.session_state.cache_hours = st.number_input(
+            "結果有效時間（小時，0為全部重新檢查）", min_value=0, value=DEFAULT_CACHE_HOURS, step=1,
+            help="同一間餐廳（名稱與URL相同）在這段時間內已檢查過時直接使用之前的結果，只檢查新的或過期的餐廳；逾時與錯誤的結果不會被使用"
+        )
     except Exception as e:
         st.error(f"讀取Excel檔案時出錯: {e}")
         uploaded_file = None
@@ -133,6 +190,26 @@ if 'checker' not in st.session_state:
     st.session_state.checker = None
 if 'checker_initialized' not in st.session_state:
     st.session_state.checker_initialized = False
+if 'circuit_events' not in st.session_state:
+    st.session_state.circuit_events = []
+if 'work_queue' not in st.session_state:
+    st.session_state.work_queue = []
+if 'results_by_index' not in st.session_state:
+    st.session_state.results_by_index = {}
+if 'history_run_id' not in st.session_state:
+    st.session_state.history_run_id = None
+if 'cached_count' not in st.session_state:
+    st.session_state.cached_count = 0
+
+# 保存每次檢查結果的歷史紀錄檔（報告中的「與上次比較」由此產生；每完成一間就寫入，
+# Web應用不另寫檢查點檔：多個session會共用同一個檔案，而且中斷的session無法從檔案繼續）
+HISTORY_FILE = os.environ.get('CHECKER_HISTORY', DEFAULT_HISTORY_FILE)
+
+
+@st.cache_resource
+def get_history_store():
+    """整個行程共用的歷史紀錄連線"""
+    return HistoryStore(HISTORY_FILE)
 
 # 開始檢查按鈕
 st.markdown("---")
@@ -148,16 +225,22 @@ if uploaded_file is not None:
             if st.button("⏹️ 停止檢查", type="secondary", use_container_width=True):
                 st.session_state.should_stop = True
                 st.session_state.checking = False
+                get_history_store().finish_run(st.session_state.history_run_id)
                 st.rerun()
     
     # 開始檢查按鈕
     if not st.session_state.checking:
         if st.button("開始檢查", type="primary", use_container_width=True):
+            # 上一輪的結果（用於「上次不合格的先檢查」）
+            previous_results = st.session_state.results if st.session_state.get('failed_first') else None
+            
             # 重置狀態
             st.session_state.checking = True
             st.session_state.should_stop = False
             st.session_state.results = []
+            st.session_state.results_by_index = {}
             st.session_state.current_index = 0
+            st.session_state.circuit_events = []
             
             # 儲存上傳的檔案到臨時位置
             temp_file = "temp_restaurants.xlsx"
@@ -187,9 +270,44 @@ if uploaded_file is not None:
             st.session_state.total_restaurants = len(df)
             st.session_state.df_restaurants = df
             
-            # 初始化checker（只創建一次，復用）
+            # 依優先級與預估成本排序工作佇列
+            st.session_state.work_queue = build_work_queue(
+                df,
+                priority_column=st.session_state.get('priority_column'),
+                rule=RULE_FAILED_FIRST if previous_results else None,
+                previous_results=previous_results,
+                short_url_hosts=OpenRiceChecker.SHORT_URL_HOSTS
+            )
+            st.session_state.history_run_id = get_history_store().start_run(source='web', label=uploaded_file.name)
+            
+            # 有效時間內已檢查過的行（名稱與標準URL的雜湊相同）直接使用歷史紀錄中的結果，只檢查新的或過期的行
+            st.session_state.cached_count = 0
+            cache_hours = st.session_state.get('cache_hours') or 0
+            if cache_hours:
+                history = get_history_store()
+                row_keys = {item.index: row_fingerprint(item.name, item.url) for item in st.session_state.work_queue}
+                fresh = history.fresh_results(row_keys.values(), cache_hours * 3600)
+                remaining = []
+                for item in st.session_state.work_queue:
+                    cached = fresh.get(row_keys[item.index])
+                    if cached is None:
+                        remaining.append(item)
+                        continue
+                    cached_result, recorded_at = cached
+                    result = {**cached_result, '餐廳名稱': item.name, 'URL': item.url}
+                    st.session_state.results_by_index[item.index] = result
+                    history.record(st.session_state.history_run_id, result, recorded_at=recorded_at)
+                st.session_state.cached_count = len(st.session_state.work_queue) - len(remaining)
+                st.session_state.work_queue = remaining
+                st.session_state.results = [
+                    st.session_state.results_by_index[index] for index in sorted(st.session_state.results_by_index)
+                ]
+            batch_minutes = st.session_state.get('batch_budget_minutes') or 0
+            st.session_state.batch_deadline = time.time() + batch_minutes * 60 if batch_minutes else None
+            
+            # 初始化checker（只創建一次，復用；全部使用之前的結果時不需要）
             # 啟用Selenium來處理JavaScript動態內容（Railway環境需要）
-            if not st.session_state.checker_initialized:
+            if not st.session_state.checker_initialized and st.session_state.work_queue:
                 st.session_state.checker = OpenRiceChecker(temp_file, use_selenium=True)
                 st.session_state.checker_initialized = True
             
@@ -200,22 +318,36 @@ if uploaded_file is not None:
         df = st.session_state.df_restaurants
         current_idx = st.session_state.current_index
         total = st.session_state.total_restaurants
+        # 需要實際檢查的餐廳（使用之前結果的已經完成）
+        queue_total = len(st.session_state.work_queue)
+        cached_count = st.session_state.cached_count
         
         # 進度條
-        progress_bar = st.progress(current_idx / total if total > 0 else 0)
+        progress_bar = st.progress((cached_count + current_idx) / total if total > 0 else 0)
+        if cached_count:
+            st.caption(f"⚡ {cached_count} 間餐廳在 {st.session_state.get('cache_hours')} 小時內已檢查過，直接使用之前的結果")
+        
+        # 整批時間上限已到：停止並輸出已完成的結果
+        batch_deadline = st.session_state.get('batch_deadline')
+        if batch_deadline and current_idx < queue_total and time.time() >= batch_deadline:
+            st.session_state.should_stop = True
         
         # 檢查是否應該停止
         if st.session_state.should_stop:
             st.session_state.checking = False
-            st.warning("⚠️ 檢查已中斷")
-        elif current_idx < total:
-            # 檢查當前餐廳
-            row = df.iloc[current_idx]
-            restaurant_name = row['餐廳名稱']
-            url = row['URL']
+            get_history_store().finish_run(st.session_state.history_run_id)
+            if batch_deadline and time.time() >= batch_deadline:
+                st.warning(f"⏱️ 已達整批時間上限，尚有 {queue_total - current_idx} 間餐廳未檢查")
+            else:
+                st.warning("⚠️ 檢查已中斷")
+        elif current_idx < queue_total:
+            # 依排序後的工作佇列檢查下一間餐廳
+            item = st.session_state.work_queue[current_idx]
+            restaurant_name = item.name
+            url = item.url
             
             status_text = st.empty()
-            status_text.text(f"正在檢查: {restaurant_name} ({current_idx + 1}/{total})")
+            status_text.text(f"正在檢查: {restaurant_name} ({cached_count + current_idx + 1}/{total})")
             
             try:
                 # 使用已創建的checker（復用，避免重複創建）
@@ -228,9 +360,19 @@ if uploaded_file is not None:
                     st.session_state.checker_initialized = True
                 
                 checker = st.session_state.checker
+                # 斷路器狀態變化記錄在checker上，保留引用以便寫入報告（checker完成後會被清理）
+                st.session_state.circuit_events = checker.circuit_events
                 
-                # 檢查餐廳
-                result = checker.check_restaurant(url, restaurant_name)
+                # 所有抓取後端都不健康時暫停，等待斷路器背景探測恢復
+                if not checker.backends_available():
+                    status_text.text(f"OpenRice或Chrome暫時無法使用，暫停等待恢復... "
+                                     f"({cached_count + current_idx + 1}/{total})")
+                    checker.wait_for_backends(max_pause=60)
+                
+                # 檢查餐廳（不超過每間餐廳與整批剩餘的時間上限）
+                checker.restaurant_budget = st.session_state.get('restaurant_budget') or None
+                budget = max(0.1, batch_deadline - time.time()) if batch_deadline else None
+                result = checker.check_restaurant(url, restaurant_name, budget=budget)
                 
                 # 顯示調試信息（如果有錯誤）
                 if result.get('狀態') == '錯誤':
@@ -238,20 +380,26 @@ if uploaded_file is not None:
                 elif result.get('狀態') == '不合格':
                     # 顯示詳細的檢查結果
                     failed_items = []
-                    for key in ['中文名稱', '英文名稱', '門面照片', '菜單', '餐點照片', '相關影片']:
+                    for key in CHECK_ITEMS:
                         if result.get(key) == '✗':
                             failed_items.append(key)
                     if failed_items:
                         st.caption(f"❌ 缺少: {', '.join(failed_items)}")
+                elif result.get('狀態', '').startswith('逾時'):
+                    timed_out = [key for key in CHECK_ITEMS if result.get(key) == TIMEOUT_MARK]
+                    st.caption(f"⏱️ {restaurant_name} 超過時間上限，未完成: {', '.join(timed_out)}")
                 
-                st.session_state.results.append(result)
+                # 結果依原始順序保存，並寫入歷史紀錄
+                st.session_state.results_by_index[item.index] = result
+                st.session_state.results = [
+                    st.session_state.results_by_index[index] for index in sorted(st.session_state.results_by_index)
+                ]
+                get_history_store().record(st.session_state.history_run_id, result)
                 
                 # 更新索引
                 st.session_state.current_index += 1
                 
-                # 減少延遲（從0.5秒減少到0.1秒，或完全移除）
-                # 因為我們已經有session復用，不需要太多延遲
-                time.sleep(0.1)
+                # 不需要固定延遲：請求速率由checker的共用限速器控制
                 
                 # 繼續下一個
                 st.rerun()
@@ -260,7 +408,7 @@ if uploaded_file is not None:
                 st.error(f"檢查 {restaurant_name} 時出錯: {e}")
                 st.session_state.current_index += 1
                 # 即使出錯也繼續下一個
-                if st.session_state.current_index < total:
+                if st.session_state.current_index < queue_total:
                     st.rerun()
                 else:
                     st.session_state.checking = False
@@ -269,14 +417,25 @@ if uploaded_file is not None:
             st.session_state.checking = False
             progress_bar.progress(1.0)
             st.success("✅ 檢查完成！")
+            get_history_store().finish_run(st.session_state.history_run_id)
             
             # 清理checker
             st.session_state.checker = None
             st.session_state.checker_initialized = False
         
-        # 顯示當前進度
+        # 顯示當前進度，已完成的結果即時顯示（優先級高的會先出現）
         if len(st.session_state.results) > 0:
             st.info(f"已完成 {len(st.session_state.results)}/{total} 間餐廳")
+            if st.session_state.checking:
+                st.dataframe(pd.DataFrame(st.session_state.results), use_container_width=True)
+        
+        # 顯示限速器目前的請求速率
+        if st.session_state.checker is not None:
+            rate_metrics = st.session_state.checker.rate_limiter.metrics()
+            if rate_metrics:
+                st.caption("目前請求速率: " + ", ".join(
+                    f"{host} {m['rate']:.2f} req/s" for host, m in rate_metrics.items()
+                ))
     
     # 顯示結果（如果有結果且不在檢查中）
     if len(st.session_state.results) > 0 and not st.session_state.checking:
@@ -284,10 +443,14 @@ if uploaded_file is not None:
         st.header("📊 檢查結果")
         
         df_results = pd.DataFrame(st.session_state.results)
+        category = status_categories(df_results['狀態'])
+        summary = summarize(df_results)
+        run_id = st.session_state.history_run_id
+        delta = get_history_store().delta_rows(run_id) if run_id is not None else None
         
         # 統計
         total = len(df_results)
-        passed = len(df_results[df_results['狀態'] == '合格'])
+        passed = int((category == CATEGORY_PASSED).sum())
         failed = total - passed
         
         col1, col2, col3 = st.columns(3)
@@ -300,12 +463,15 @@ if uploaded_file is not None:
         
         if st.session_state.should_stop:
             st.info(f"💡 共 {st.session_state.total_restaurants} 間餐廳，已檢查 {total} 間")
+        if st.session_state.cached_count:
+            st.info(f"⚡ 其中 {st.session_state.cached_count} 間餐廳直接使用 {st.session_state.get('cache_hours')} "
+                    f"小時內的檢查結果（不重新檢查），{total - st.session_state.cached_count} 間為本次檢查")
         
         # 顯示結果表格
         st.subheader("詳細結果")
         
         # 如果有錯誤，顯示錯誤詳情
-        error_results = df_results[df_results['狀態'] == '錯誤']
+        error_results = df_results[category == CATEGORY_ERROR]
         if len(error_results) > 0:
             st.warning(f"⚠️ {len(error_results)} 間餐廳檢查時發生錯誤")
             with st.expander("查看錯誤詳情"):
@@ -316,9 +482,16 @@ if uploaded_file is not None:
         
         st.dataframe(df_results, use_container_width=True)
         
+        # 摘要統計（狀態分類與各項目的缺失分布，報告中另有工作表）
+        col1, col2 = st.columns(2)
+        with col1:
+            st.dataframe(summary['狀態分類'], use_container_width=True, hide_index=True)
+        with col2:
+            st.dataframe(summary['項目缺失分布'], use_container_width=True, hide_index=True)
+        
         # 不合格餐廳清單
         # 過濾不合格餐廳（排除"合格"狀態）
-        failed_restaurants = df_results[~df_results['狀態'].str.contains('^合格$', regex=True, na=False)]
+        failed_restaurants = df_results[category != CATEGORY_PASSED]
         if len(failed_restaurants) > 0:
             st.subheader("❌ 不合格餐廳清單")
             # 只選擇存在的列，避免KeyError
@@ -330,12 +503,15 @@ if uploaded_file is not None:
             # 顯示不合格餐廳清單，狀態列會包含不合格項目
             st.dataframe(failed_restaurants[display_cols], use_container_width=True)
         
+        # 與上次檢查相比有變化的餐廳（來自歷史紀錄）
+        if delta:
+            st.subheader("🔁 與上次比較")
+            st.dataframe(pd.DataFrame(delta), use_container_width=True, hide_index=True)
+        
         # 產生報告檔案
         output_file = 'restaurant_check_report.xlsx'
         with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            df_results.to_excel(writer, sheet_name='完整報告', index=False)
-            if len(failed_restaurants) > 0:
-                failed_restaurants.to_excel(writer, sheet_name='不合格餐廳', index=False)
+            write_report_sheets(writer, df_results, st.session_state.circuit_events, summary, delta)
         
         # 下載按鈕
         st.markdown("---")
@@ -354,6 +530,9 @@ if uploaded_file is not None:
             st.session_state.checking = False
             st.session_state.should_stop = False
             st.session_state.results = []
+            st.session_state.results_by_index = {}
+            st.session_state.work_queue = []
+            st.session_state.cached_count = 0
             st.session_state.current_index = 0
             st.session_state.df_restaurants = None
             st.session_state.checker = None
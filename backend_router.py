@@ -0,0 +1,109 @@
+"""依頁面類型自適應選擇抓取後端
+
+瀏覽器（Selenium / Playwright）能處理JavaScript動態內容，但每頁比requests慢很多；
+有些頁面類型用requests取得的內容與瀏覽器相同，而且OpenRice改版後可能改變。
+每個頁面類型抽樣一小部分頁面同時以兩種後端取得，比較與檢查結果有關的摘要
+（PageFacts.summary）是否一致：最近的樣本足夠且一致率達標時該頁面類型改用requests，
+一致率下降（或requests取得失敗）時改回瀏覽器，每次切換都寫入日誌。
+所有檢查器共用同一份統計（與限速器相同，整個行程一個）。
+
+環境變量：
+- CHECKER_ROUTE_SAMPLE_RATE: 抽樣比例（預設 0.1，0 表示停用，全部使用瀏覽器）
+- CHECKER_ROUTE_MIN_SAMPLES: 改用requests前至少需要的樣本數（預設 20）
+- CHECKER_ROUTE_MIN_AGREEMENT: 改用requests（及繼續使用）需要的一致率（預設 0.95）
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from log_config import logger
+from metrics import ROUTE_SAMPLES
+
+ROUTE_BROWSER = 'browser'
+ROUTE_REQUESTS = 'requests'
+
+
+class BackendRouter:
+    def __init__(self, sample_rate=None, min_samples=None, min_agreement=None, window=50, rng=None):
+        """
+        :param sample_rate: 抽樣比例（0~1），None時使用環境變量CHECKER_ROUTE_SAMPLE_RATE
+        :param min_samples: 改用requests前至少需要的樣本數，None時使用環境變量CHECKER_ROUTE_MIN_SAMPLES
+        :param min_agreement: 需要的一致率，None時使用環境變量CHECKER_ROUTE_MIN_AGREEMENT
+        :param window: 每個頁面類型只看最近幾個樣本（改版後舊樣本會逐漸被取代）
+        :param rng: 抽樣用的random.Random（測試時可固定種子）
+        """
+        if sample_rate is None:
+            sample_rate = float(os.environ.get('CHECKER_ROUTE_SAMPLE_RATE', '0.1'))
+        if min_samples is None:
+            min_samples = int(os.environ.get('CHECKER_ROUTE_MIN_SAMPLES', '20'))
+        if min_agreement is None:
+            min_agreement = float(os.environ.get('CHECKER_ROUTE_MIN_AGREEMENT', '0.95'))
+        self.sample_rate = sample_rate
+        self.min_samples = min(min_samples, window)
+        self.min_agreement = min_agreement
+        self.window = window
+        self._random = rng or random.Random()
+        self._samples = {}
+        self._routes = {}
+        # 路由切換紀錄 (時間, 頁面類型, 原路由, 新路由, 一致率)
+        self.route_changes = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def route(self, page_type):
+        """頁面類型目前使用的後端（沒有足夠樣本前使用瀏覽器）"""
+        with self._lock:
+            return self._routes.get(page_type, ROUTE_BROWSER)
+
+    def should_sample(self, page_type):
+        """這次是否同時以另一個後端取得頁面並比較"""
+        return self.enabled and self._random.random() < self.sample_rate
+
+    def record(self, page_type, agreed):
+        """記錄一個樣本：requests與瀏覽器取得的頁面摘要是否一致（requests失敗視為不一致）"""
+        ROUTE_SAMPLES.inc(page_type=page_type, result='agree' if agreed else 'disagree')
+        with self._lock:
+            samples = self._samples.setdefault(page_type, deque(maxlen=self.window))
+            samples.append(bool(agreed))
+            agreement = sum(samples) / len(samples)
+            current = self._routes.get(page_type, ROUTE_BROWSER)
+            if current == ROUTE_BROWSER:
+                accurate = len(samples) >= self.min_samples and agreement >= self.min_agreement
+                new = ROUTE_REQUESTS if accurate else ROUTE_BROWSER
+            else:
+                new = ROUTE_REQUESTS if agreement >= self.min_agreement else ROUTE_BROWSER
+            if new == current:
+                return
+            self._routes[page_type] = new
+            self.route_changes.append((time.time(), page_type, current, new, agreement))
+        logger.info(f"頁面類型 {page_type} 改用 {new}（最近 {len(samples)} 個樣本與瀏覽器的一致率 {agreement:.0%}）")
+
+    def stats(self):
+        """各頁面類型的路由、樣本數與一致率"""
+        with self._lock:
+            return {
+                page_type: {
+                    'route': self._routes.get(page_type, ROUTE_BROWSER),
+                    'samples': len(samples),
+                    'agreement': sum(samples) / len(samples),
+                }
+                for page_type, samples in self._samples.items()
+            }
+
+
+_shared_router = None
+_shared_lock = threading.Lock()
+
+
+def get_backend_router():
+    """取得整個行程共用的後端路由（所有檢查器共用樣本與路由）"""
+    global _shared_router
+    with _shared_lock:
+        if _shared_router is None:
+            _shared_router = BackendRouter()
+        return _shared_router
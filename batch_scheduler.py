@@ -0,0 +1,194 @@
+"""批次檢查的優先排程與檢查點
+
+- 依優先級欄位（例如「重點poi」）或規則（上次不合格的先檢查）排序工作佇列
+- 同優先級內先做預估成本低的（快的先出結果），最後依原始順序
+- 每完成一間餐廳就寫入檢查點（JSONL），中斷後可從檢查點繼續，報告仍依原始順序輸出
+"""
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+# 可作為優先級的欄位名稱（依序嘗試）
+PRIORITY_COLUMNS = ['優先級', '優先順序', 'priority', 'Priority', '重點poi', '重點POI', '重点poi']
+# 視為「是」的文字
+TRUTHY_VALUES = {'是', 'y', 'yes', 'true', 'v', '✓', '重點', '重点'}
+
+# 規則：上次不合格/錯誤的餐廳優先
+RULE_FAILED_FIRST = 'failed_first'
+
+# 預估成本（相對值）：每間餐廳固定5個頁面，縮短URL多一次解析，上次錯誤或逾時的通常又會很慢
+BASE_COST = 5.0
+SHORT_URL_COST = 1.0
+PREVIOUS_ERROR_COST = 5.0
+
+
+@dataclass(order=True)
+class WorkItem:
+    sort_key: tuple = field(init=False, repr=False)
+    index: int
+    name: str
+    url: str
+    priority: float = 0.0
+    expected_cost: float = BASE_COST
+
+    def __post_init__(self):
+        # 優先級高的先做，同優先級成本低的先做，最後依原始順序
+        self.sort_key = (-self.priority, self.expected_cost, self.index)
+
+
+def parse_priority(value):
+    """把欄位值轉成數值優先級：數字直接使用，「是/Y/重點」等視為1，其餘為0"""
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return 0.0 if value != value else float(value)  # NaN視為0
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        return 1.0 if text.lower() in TRUTHY_VALUES else 0.0
+
+
+def find_priority_column(columns):
+    for column in PRIORITY_COLUMNS:
+        if column in columns:
+            return column
+    return None
+
+
+def _status_category(status):
+    status = str(status or '')
+    if status == '合格':
+        return 'passed'
+    if status.startswith('錯誤') or status.startswith('逾時'):
+        return 'error'
+    return 'failed'
+
+
+def normalize_url(url):
+    url = str(url).strip()
+    if not url.startswith('http'):
+        url = 'https://' + url
+    return url
+
+
+def canonical_url(url):
+    """分片用的標準URL：統一協定與主機大小寫，去掉查詢參數、錨點與結尾斜線"""
+    parts = urlsplit(normalize_url(url))
+    host = (parts.hostname or '').lower()
+    if host.startswith('m.'):
+        host = 'www.' + host[2:]
+    return f"https://{host}{parts.path.rstrip('/')}"
+
+
+def shard_of(url, shard_count):
+    """依標準URL的穩定雜湊決定分片（不同機器、不同次執行結果都相同）"""
+    digest = hashlib.sha1(canonical_url(url).encode('utf-8')).hexdigest()
+    return int(digest[:16], 16) % shard_count
+
+
+def normalize_name(name):
+    """比較用的餐廳名稱：全形/半形統一（NFKC）、忽略大小寫與多餘空白"""
+    return ' '.join(unicodedata.normalize('NFKC', str(name or '')).casefold().split())
+
+
+def row_fingerprint(name, url):
+    """Excel一行的內容雜湊（標準化名稱 + 標準URL），同一間餐廳重新上傳時雜湊相同"""
+    key = f"{normalize_name(name)}\n{canonical_url(url)}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def build_work_queue(df, priority_column=None, rule=None, previous_results=None, short_url_hosts=('s.openrice.com',),
+                     shard=None):
+    """依優先級與預估成本建立工作佇列
+    :param df: 包含'餐廳名稱'與'URL'欄位的DataFrame
+    :param priority_column: 優先級欄位名稱，None時自動尋找PRIORITY_COLUMNS
+    :param rule: 排序規則，RULE_FAILED_FIRST 表示上次不合格的先檢查
+    :param previous_results: 上次的檢查結果（list of dict，需有'URL'與'狀態'）
+    :param shard: (分片編號, 分片數)，只保留屬於該分片的餐廳（索引仍為原始順序）
+    :return: 排序後的WorkItem清單
+    """
+    if priority_column is None:
+        priority_column = find_priority_column(df.columns)
+    previous_status = {}
+    for result in previous_results or []:
+        if result.get('URL'):
+            previous_status[normalize_url(result['URL'])] = _status_category(result.get('狀態'))
+
+    items = []
+    for position, (_, row) in enumerate(df.iterrows()):
+        url = normalize_url(row['URL'])
+        if shard is not None and shard_of(url, shard[1]) != shard[0]:
+            continue
+        priority = parse_priority(row[priority_column]) if priority_column else 0.0
+        expected_cost = BASE_COST
+        if any(f'//{host}' in url for host in short_url_hosts):
+            expected_cost += SHORT_URL_COST
+        previous = previous_status.get(url)
+        if previous == 'error':
+            expected_cost += PREVIOUS_ERROR_COST
+        if rule == RULE_FAILED_FIRST and previous in ('failed', 'error'):
+            # 上次不合格的排在同一優先級的前面（但不超過更高的優先級）
+            priority += 0.5
+        items.append(WorkItem(index=position, name=row['餐廳名稱'], url=url,
+                              priority=priority, expected_cost=expected_cost))
+    return sorted(items)
+
+
+class Checkpoint:
+    """每完成一間餐廳就追加一行JSON的檢查點檔"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """讀取已完成的結果，回傳 {原始索引: 結果}"""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中斷時可能留下寫了一半的最後一行
+                    continue
+                done[record['index']] = record['result']
+        return done
+
+    def append(self, index, result):
+        line = json.dumps({'index': index, 'result': result}, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def load_previous_results(path):
+    """從上次的報告（xlsx）、檢查點（jsonl）或歷史紀錄（db，最近一次執行）讀取結果"""
+    if path.endswith('.jsonl'):
+        return list(Checkpoint(path).load().values())
+    if path.endswith('.db'):
+        from history_store import HistoryStore
+        store = HistoryStore(path)
+        try:
+            return store.latest_results()
+        finally:
+            store.close()
+    import pandas as pd
+    return pd.read_excel(path, sheet_name='完整報告').to_dict('records')
@@ -0,0 +1,141 @@
+"""瀏覽器後端的記憶體比較：每個檢查器一個webdriver.Chrome vs 共用一個Chromium（Playwright browser context）
+
+對每種後端與每個並行數N，在獨立的子行程中建立N個 OpenRiceChecker（各在自己的執行緒中），
+同時檢查替身伺服器上的餐廳，取樣整個行程樹（含Chrome/Chromium子行程）的峰值RSS，報告：
+- 峰值RSS與每個並行頁面的RSS
+- 每GB記憶體可同時開啟的頁面數（並行數 / 峰值RSS）
+- 吞吐量（間/分鐘）
+
+需要psutil才能量到瀏覽器子行程的RSS。
+
+用法:
+    python benchmarks/bench_browser_memory.py --concurrency 1,2,4,8 --backends chrome,playwright
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from run_benchmark import RESULT_MARKER, PeakRssSampler
+from stub_server import OpenRiceStubServer, StubConfig
+
+
+def run_worker(args):
+    """子行程：N個檢查器同時檢查餐廳，結果以JSON輸出到stdout"""
+    from log_config import setup_logging
+    setup_logging(level='WARNING', buffered=True)
+
+    from check_restaurants import BROWSER_CHROME, OpenRiceChecker
+    from rate_limiter import HostRateLimiter
+
+    label = f'{args.backend} x{args.concurrency}'
+    sampler = PeakRssSampler().start()
+    if sampler._process is None:
+        print(RESULT_MARKER + json.dumps({'label': label, 'skipped': '需要psutil才能量測瀏覽器子行程的RSS'}))
+        return
+
+    limiter = HostRateLimiter(initial_rate=1000, max_rate=1000)
+    checkers = [OpenRiceChecker('benchmark.xlsx', use_selenium=True, rate_limiter=limiter, browser=args.backend)
+                for _ in range(args.concurrency)]
+    try:
+        ready = [checker for checker in checkers
+                 if (checker.driver if args.backend == BROWSER_CHROME else checker.browser_session) is not None]
+        if len(ready) < len(checkers):
+            print(RESULT_MARKER + json.dumps({'label': label, 'skipped': f'只有 {len(ready)}/{len(checkers)} 個瀏覽器啟動成功'}))
+            return
+
+        # 每個檢查器依序檢查分到的餐廳
+        assignments = [args.urls[i::args.concurrency] for i in range(args.concurrency)]
+        statuses = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=lambda c=checker, urls=urls: statuses.extend(
+                       c.check_restaurant(url, url.rsplit('/', 1)[-1]).get('狀態', '').split(' - ')[0] for url in urls))
+                   for checker, urls in zip(checkers, assignments)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        for checker in checkers:
+            checker.close()
+    peak_mb = sampler.stop() / (1024 * 1024)
+
+    print(RESULT_MARKER + json.dumps({
+        'label': label,
+        'backend': args.backend,
+        'concurrency': args.concurrency,
+        'restaurants': len(args.urls),
+        'elapsed': elapsed,
+        'restaurants_per_minute': len(args.urls) / elapsed * 60 if elapsed else 0,
+        'peak_rss_mb': peak_mb,
+        'mb_per_page': peak_mb / args.concurrency,
+        'pages_per_gb': args.concurrency / (peak_mb / 1024) if peak_mb else 0,
+        'statuses': {status: statuses.count(status) for status in set(statuses)},
+    }, ensure_ascii=False))
+
+
+def run_case(backend, concurrency, urls):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--backend', backend,
+               '--concurrency', str(concurrency), '--urls', *urls]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'label': f'{backend} x{concurrency}', 'skipped': f'子行程失敗: {completed.stderr.strip()[-500:]}'}
+
+
+def print_report(results):
+    print('=' * 80)
+    print(f"{'後端 x 並行數':<20}{'峰值RSS(MB)':>12}{'MB/頁面':>10}{'頁面/GB':>10}{'間/分鐘':>10}")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['label']:<20}略過: {result['skipped']}")
+            continue
+        print(f"{result['label']:<20}{result['peak_rss_mb']:>12.0f}{result['mb_per_page']:>10.0f}"
+              f"{result['pages_per_gb']:>10.1f}{result['restaurants_per_minute']:>10.1f}")
+    print('=' * 80)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較瀏覽器後端每GB記憶體可並行的頁面數')
+    parser.add_argument('--backends', default='chrome,playwright', help='要比較的瀏覽器後端（逗號分隔）')
+    parser.add_argument('--concurrency', default='1,2,4', help='並行檢查器數量（逗號分隔）')
+    parser.add_argument('--restaurants', type=int, default=8, help='每個並行檢查器檢查的餐廳數')
+    parser.add_argument('--latency', type=float, default=0.02, help='伺服器每個請求的延遲（秒）')
+    parser.add_argument('--output', help='將結果寫入JSON檔')
+    # 子行程參數
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--urls', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.concurrency = int(args.concurrency)
+        run_worker(args)
+        return
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    results = []
+    with OpenRiceStubServer(StubConfig(latency=args.latency)) as server:
+        for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+            for concurrency in levels:
+                urls = [server.restaurant_url(i) for i in range(1, args.restaurants * concurrency + 1)]
+                results.append(run_case(backend, concurrency, urls))
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}, f,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""冷啟動的匯入耗時（python -X importtime）
+
+每個情境在獨立的子行程中以 -X importtime 執行（避免已匯入的模組互相影響），重複數次取中位數，報告：
+- 匯入總耗時（扣除直譯器啟動本身的匯入）與子行程的總耗時
+- 最耗時的套件（含其依賴的累計時間）
+- 載入了哪些可選的重量級依賴（Selenium、Playwright、pandas等）
+
+情境：
+- check_restaurants: 只匯入 check_restaurants
+- app: 執行 app.py 開頭的所有匯入（Streamlit第一次渲染頁面前的匯入）
+- requests: 建立只用requests的檢查器
+- replay: 建立重播模式的檢查器
+
+requests與replay情境載入Selenium/Playwright時以非零狀態碼結束；搭配 --baseline 使用時，
+匯入耗時增加超過 --tolerance 也會以非零狀態碼結束。
+
+用法:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --repeat 7 --output imports.json
+    python benchmarks/bench_import_time.py --baseline imports.json --tolerance 0.3
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+RESULT_MARKER = 'IMPORT_RESULT '
+
+# 報告中列出是否已載入的重量級依賴
+TRACKED_MODULES = ['selenium', 'webdriver_manager', 'playwright', 'pandas', 'numpy', 'bs4', 'requests', 'streamlit']
+
+# 不應載入瀏覽器相關依賴的情境
+BROWSERLESS_SCENARIOS = {'requests', 'replay'}
+BROWSER_MODULES = {'selenium', 'webdriver_manager', 'playwright'}
+
+
+def app_imports():
+    """app.py 開頭的匯入敘述（遇到第一個非匯入敘述為止）"""
+    with open(os.path.join(ROOT_DIR, 'app.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    statements = []
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            break
+        statements.append(ast.unparse(node))
+    return '\n'.join(statements)
+
+
+def scenarios(workdir):
+    archive = os.path.join(workdir, 'replay.db')
+    return {
+        'check_restaurants': 'import check_restaurants',
+        'app': app_imports(),
+        'requests': ("from check_restaurants import OpenRiceChecker\n"
+                     "OpenRiceChecker('restaurants.xlsx', use_selenium=False).close()"),
+        'replay': ("from check_restaurants import OpenRiceChecker\n"
+                   "from page_store import PageStore, REPLAY\n"
+                   f"OpenRiceChecker('restaurants.xlsx', page_store=PageStore({archive!r}, mode=REPLAY)).close()"),
+    }
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的輸出
+    :return: ({頂層模組: 累計微秒}, {套件: 最大累計微秒})，套件的時間是第一次匯入它時含依賴的累計時間
+    """
+    top_level = {}
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        cumulative = int(cumulative)
+        package = name.strip().split('.')[0]
+        packages[package] = max(packages.get(package, 0), cumulative)
+        # 巢狀匯入的模組名稱前有額外的縮排
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = top_level.get(name.strip(), 0) + cumulative
+    return top_level, packages
+
+
+def run_once(code):
+    probe = (f"{code}\nimport sys\n"
+             f"print({RESULT_MARKER!r} + ','.join(m for m in {TRACKED_MODULES!r} if m in sys.modules))")
+    env = dict(os.environ, LOG_LEVEL='WARNING', PYTHONDONTWRITEBYTECODE='1')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], cwd=ROOT_DIR, env=env,
+                               capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    loaded = None
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            loaded = [name for name in line[len(RESULT_MARKER):].split(',') if name]
+    if completed.returncode != 0 or loaded is None:
+        error = [line for line in completed.stderr.splitlines() if not line.startswith('import time:')]
+        return {'error': '\n'.join(error[-5:])}
+    modules, packages = parse_importtime(completed.stderr)
+    return {'modules': modules, 'packages': packages, 'elapsed': elapsed, 'loaded': loaded}
+
+
+def startup_modules():
+    """直譯器啟動時就會匯入的頂層模組（site、encodings等），不計入各情境的匯入耗時"""
+    run = run_once('pass')
+    return set(run.get('modules', ()))
+
+
+def run_scenario(name, code, repeat, startup):
+    runs = [run_once(code) for _ in range(repeat)]
+    failed = [run for run in runs if 'error' in run]
+    if failed:
+        return {'scenario': name, 'skipped': failed[0]['error']}
+    totals = [sum(us for module, us in run['modules'].items() if module not in startup) / 1000 for run in runs]
+    # 最耗時的套件取各次的中位數
+    names = set().union(*(run['packages'] for run in runs)) - startup
+    per_package = {package: statistics.median(run['packages'].get(package, 0) for run in runs) / 1000
+                   for package in names}
+    heaviest = sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:8]
+    return {
+        'scenario': name,
+        'import_ms': statistics.median(totals),
+        'process_ms': statistics.median(run['elapsed'] for run in runs) * 1000,
+        'heaviest': [{'package': package, 'ms': ms} for package, ms in heaviest],
+        'loaded': runs[-1]['loaded'],
+    }
+
+
+def print_report(results):
+    print('=' * 72)
+    print(f"{'情境':<20}{'匯入(ms)':>10}{'行程(ms)':>10}  已載入的依賴")
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['scenario']:<20}略過: {result['skipped']}")
+            continue
+        print(f"{result['scenario']:<20}{result['import_ms']:>10.0f}{result['process_ms']:>10.0f}  "
+              f"{', '.join(result['loaded']) or '-'}")
+    for result in results:
+        if 'heaviest' in result:
+            print(f"\n[{result['scenario']}] 最耗時的套件（含依賴）:")
+            for item in result['heaviest']:
+                print(f"  {item['package']:<40}{item['ms']:>8.1f} ms")
+    print('=' * 72)
+
+
+def check_results(results, baseline_file=None, tolerance=0.3):
+    """回傳問題說明：不需要瀏覽器的情境載入了瀏覽器依賴，或匯入耗時比基準增加超過tolerance"""
+    problems = []
+    for result in results:
+        if 'skipped' in result:
+            continue
+        if result['scenario'] in BROWSERLESS_SCENARIOS:
+            unexpected = BROWSER_MODULES.intersection(result['loaded'])
+            if unexpected:
+                problems.append(f"[{result['scenario']}] 不需要瀏覽器卻載入了 {', '.join(sorted(unexpected))}")
+    if baseline_file:
+        with open(baseline_file, encoding='utf-8') as f:
+            baseline = {item['scenario']: item for item in json.load(f)['results']}
+        for result in results:
+            base = baseline.get(result['scenario'])
+            if 'skipped' in result or not base or 'skipped' in base:
+                continue
+            if result['import_ms'] > base['import_ms'] * (1 + tolerance):
+                problems.append(f"[{result['scenario']}] 匯入耗時 {base['import_ms']:.0f} -> "
+                                f"{result['import_ms']:.0f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='以 -X importtime 量測冷啟動的匯入耗時')
+    parser.add_argument('--scenarios', default='check_restaurants,app,requests,replay', help='要量測的情境（逗號分隔）')
+    parser.add_argument('--repeat', type=int, default=5, help='每個情境重複的次數（取中位數）')
+    parser.add_argument('--output', help='將結果寫入JSON檔（可作為之後的 --baseline）')
+    parser.add_argument('--baseline', help='基準結果JSON檔')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='允許的匯入耗時增加比例')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        available = scenarios(workdir)
+        names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            parser.error(f"未知的情境: {', '.join(unknown)}")
+        startup = startup_modules()
+        results = [run_scenario(name, available[name], args.repeat, startup) for name in names]
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': sys.version.split()[0],
+                       'results': results}, f, ensure_ascii=False, indent=2)
+
+    problems = check_results(results, args.baseline, args.tolerance)
+    if problems:
+        print('匯入問題:')
+        for line in problems:
+            print(f'  {line}')
+        sys.exit(1)
+    if args.baseline:
+        print('與基準相比沒有匯入耗時退化')
+
+
+if __name__ == '__main__':
+    main()
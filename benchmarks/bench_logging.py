@@ -0,0 +1,102 @@
+"""比較舊的逐行輸出（DEBUG + 每筆立即寫出）與新的緩衝/安靜模式的執行時間
+
+不需要網絡：以合成的OpenRice頁面取代頁面抓取，只測量檢查邏輯與日誌輸出的成本。
+
+用法:
+    python benchmarks/bench_logging.py [--restaurants 200] [--images 120]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from check_restaurants import OpenRiceChecker
+from page_facts import extract_facts
+from log_config import setup_logging, flush_logs
+
+
+def build_page(image_count):
+    """產生一個包含大量圖片的合成頁面"""
+    imgs = ''.join(
+        f'<img src="https://static8.orstatic.com/userphoto/photo/{i}.jpg" alt="photo {i}">'
+        for i in range(image_count)
+    )
+    videos = ''.join(
+        f'<img src="https://c-vod.orstatic.com/video/{i}.jpg" alt="video {i}">'
+        for i in range(image_count // 10)
+    )
+    return (
+        '<html><body>'
+        '<h1 class="poi-name">測試餐廳</h1>'
+        '<div class="pdhs-en-section">Test Restaurant</div>'
+        f'<p>{"OpenRice 餐廳介紹 " * 80}</p>'
+        f'<div class="photo-list">{imgs}</div>'
+        f'<div class="video-list">{videos}</div>'
+        f'<div class="menu-list">{imgs}</div>'
+        '</body></html>'
+    )
+
+
+class OfflineChecker(OpenRiceChecker):
+    """不連網的檢查器：所有頁面都回傳同一份合成HTML"""
+
+    def __init__(self, html):
+        super().__init__('unused.xlsx', use_selenium=False)
+        self._html = html
+
+    def resolve_short_url(self, url):
+        return url
+
+    def _get_page(self, url, fast_mode, facts):
+        soup = BeautifulSoup(self._html, 'html.parser')
+        return extract_facts(soup, url, len(self._html)) if facts else soup
+
+
+def run(checker, restaurants):
+    start = time.perf_counter()
+    for i in range(restaurants):
+        checker.check_restaurant(f'https://tw.openrice.com/zh/taipei/r-test-r{i}', f'測試餐廳{i}')
+    flush_logs()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--restaurants', type=int, default=200)
+    parser.add_argument('--images', type=int, default=120)
+    args = parser.parse_args()
+
+    checker = OfflineChecker(build_page(args.images))
+    modes = [
+        ('舊版逐行輸出 (DEBUG, 無緩衝)', dict(level='DEBUG', quiet=False, buffered=False)),
+        ('INFO + 緩衝', dict(level='INFO', quiet=False, buffered=True)),
+        ('安靜模式 + 緩衝', dict(level='INFO', quiet=True, buffered=True)),
+        ('安靜模式 + JSON', dict(level='INFO', quiet=True, buffered=True, json_format=True)),
+    ]
+
+    results = []
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as sink:
+        for label, options in modes:
+            options.setdefault('json_format', False)
+            setup_logging(stream=sink, **options)
+            elapsed = run(checker, args.restaurants)
+            sink.flush()
+            size = sink.tell()
+            sink.seek(0)
+            sink.truncate()
+            results.append((label, elapsed, size))
+
+    baseline = results[0][1]
+    print(f"{'模式':<28}{'耗時(s)':>10}{'輸出(KB)':>12}{'節省':>10}")
+    for label, elapsed, size in results:
+        saving = (1 - elapsed / baseline) * 100 if baseline else 0
+        print(f"{label:<28}{elapsed:>10.2f}{size / 1024:>12.1f}{saving:>9.1f}%")
+
+
+if __name__ == '__main__':
+    main()
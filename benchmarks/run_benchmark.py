@@ -0,0 +1,314 @@
+"""端到端基準測試：對本地OpenRice替身伺服器執行 OpenRiceChecker
+
+每個抓取後端在獨立的子行程中執行（峰值RSS互不影響），報告：
+- 每分鐘檢查的餐廳數
+- 各階段（縮短URL解析、主頁、各照片分類、菜單）的延遲 p50/p95
+- 峰值RSS（有psutil時包含Chrome等子行程），以及worker行程本身（解析頁面的Python行程）的峰值RSS與檢查過程中的RSS增長
+
+Selenium後端可用 --navigation spa,cold 分別測試「分頁內點擊切換子頁面」與「每頁driver.get冷載入」，
+階段統計中 selenium_spa 與 selenium 分別是兩種切換方式的單頁耗時。
+
+搭配 --baseline 使用時，吞吐量下降或RSS上升超過 --tolerance 會以非零狀態碼結束，
+可在部署前的CI中攔截效能退化；--max-rss-mb 設定worker行程峰值RSS的上限，超過時同樣以非零狀態碼結束。
+
+用法:
+    python benchmarks/run_benchmark.py --restaurants 30 --backends requests,selenium
+    python benchmarks/run_benchmark.py --backends selenium --navigation spa,cold
+    python benchmarks/run_benchmark.py --output bench.json
+    python benchmarks/run_benchmark.py --baseline bench.json --tolerance 0.2
+    python benchmarks/run_benchmark.py --photos-per-page 300 --no-photo-inventory --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import OpenRiceStubServer, StubConfig
+
+RESULT_MARKER = 'BENCH_RESULT '
+
+
+class PeakRssSampler:
+    """定期取樣本行程（含子行程）的RSS，記錄峰值"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except ImportError:
+            self._process = None
+
+    def _sample(self):
+        total = self._process.memory_info().rss
+        for child in self._process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except Exception:
+                pass
+        self.peak_bytes = max(self.peak_bytes, total)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self._process is not None:
+            self._sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._sample()
+        # 沒有psutil時使用getrusage（Linux單位為KB，只含已結束的子行程）
+        rusage_peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+        return max(self.peak_bytes, rusage_peak)
+
+
+def worker_peak_rss_bytes():
+    """worker行程本身（不含瀏覽器子行程）的峰值RSS（Linux的ru_maxrss單位為KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss_bytes():
+    """worker行程目前的RSS（讀取/proc，其他平台回傳None）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+def run_worker(args):
+    """子行程：用指定後端檢查所有餐廳，結果以JSON輸出到stdout"""
+    from log_config import setup_logging
+    setup_logging(level=args.log_level, buffered=True)
+
+    from check_restaurants import BROWSER_PLAYWRIGHT, OpenRiceChecker, SELENIUM_AVAILABLE
+    from browser_pool import PLAYWRIGHT_AVAILABLE
+    from rate_limiter import HostRateLimiter
+
+    if args.backend == 'selenium' and not SELENIUM_AVAILABLE:
+        print(RESULT_MARKER + json.dumps({'backend': args.label, 'skipped': 'Selenium未安裝'}))
+        return
+    if args.backend == BROWSER_PLAYWRIGHT and not PLAYWRIGHT_AVAILABLE:
+        print(RESULT_MARKER + json.dumps({'backend': args.label, 'skipped': 'Playwright未安裝'}))
+        return
+
+    sampler = PeakRssSampler().start()
+    checker = OpenRiceChecker('benchmark.xlsx', use_selenium=(args.backend != 'requests'),
+                              rate_limiter=HostRateLimiter(initial_rate=args.rate, max_rate=args.rate * 4),
+                              navigation=args.navigation, photo_inventory=not args.no_photo_inventory,
+                              browser=BROWSER_PLAYWRIGHT if args.backend == BROWSER_PLAYWRIGHT else None)
+    if args.backend == 'selenium' and not checker.use_selenium:
+        print(RESULT_MARKER + json.dumps({'backend': args.label, 'skipped': 'Selenium初始化失敗'}))
+        return
+    if args.backend == BROWSER_PLAYWRIGHT and checker.browser_session is None:
+        print(RESULT_MARKER + json.dumps({'backend': args.label, 'skipped': 'Playwright初始化失敗'}))
+        checker.close()
+        return
+    # 替身伺服器用 localhost 模擬 s.openrice.com
+    checker.SHORT_URL_HOSTS = checker.SHORT_URL_HOSTS + ('localhost',)
+
+    statuses = {}
+    # 第一間餐廳之後與最後一間之後的RSS差距（持續增長表示頁面資料沒有被釋放）
+    rss_samples = []
+    start = time.perf_counter()
+    for url in args.urls:
+        result = checker.check_restaurant(url, url.rsplit('/', 1)[-1])
+        status = result.get('狀態', '').split(' - ')[0]
+        statuses[status] = statuses.get(status, 0) + 1
+        rss_samples.append(current_rss_bytes())
+    elapsed = time.perf_counter() - start
+    worker_peak = worker_peak_rss_bytes()
+    rss_growth = rss_samples[-1] - rss_samples[0] if rss_samples and None not in rss_samples else None
+
+    checker.close()
+    peak_rss = sampler.stop()
+
+    print(RESULT_MARKER + json.dumps({
+        'backend': args.label,
+        'restaurants': len(args.urls),
+        'elapsed': elapsed,
+        'restaurants_per_minute': len(args.urls) / elapsed * 60 if elapsed else 0,
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+        'worker_peak_rss_mb': worker_peak / (1024 * 1024),
+        'rss_growth_mb': rss_growth / (1024 * 1024) if rss_growth is not None else None,
+        'statuses': statuses,
+        'stages': checker.stage_timer.summary(),
+        'navigation': checker.navigation_stats,
+        'lazy_load': checker.lazy_load_stats,
+        'inventory': checker.inventory_stats,
+        'routes': checker.backend_router.stats(),
+    }, ensure_ascii=False))
+
+
+def run_backend(backend, urls, args, navigation=None, labelled=False):
+    """在子行程中執行一個後端的基準測試
+    :param labelled: 結果名稱是否加上頁面切換方式（同時測試多種切換方式時）
+    """
+    label = f'{backend}({navigation})' if labelled else backend
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--backend', backend, '--label', label,
+               '--rate', str(args.rate), '--log-level', args.log_level, '--urls', *urls]
+    if args.no_photo_inventory:
+        command.append('--no-photo-inventory')
+    if navigation:
+        command += ['--navigation', navigation]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'backend': label, 'skipped': f'子行程失敗: {completed.stderr.strip()[-500:]}'}
+
+
+def print_report(results):
+    for result in results:
+        print('=' * 72)
+        if 'skipped' in result:
+            print(f"[{result['backend']}] 略過: {result['skipped']}")
+            continue
+        print(f"[{result['backend']}] {result['restaurants']} 間餐廳，耗時 {result['elapsed']:.1f}s")
+        print(f"  吞吐量: {result['restaurants_per_minute']:.1f} 間/分鐘")
+        print(f"  峰值RSS: {result['peak_rss_mb']:.1f} MB（worker行程 {result['worker_peak_rss_mb']:.1f} MB）")
+        if result.get('rss_growth_mb') is not None:
+            print(f"  RSS增長（第一間之後到最後一間之後）: {result['rss_growth_mb']:+.1f} MB")
+        print(f"  狀態分布: {result['statuses']}")
+        navigation = result.get('navigation') or {}
+        if navigation.get('spa') or navigation.get('spa_fallback'):
+            print(f"  頁面切換: 分頁內 {navigation['spa']} 次，driver.get {navigation['cold']} 次"
+                  f"（無法分頁內切換 {navigation['spa_fallback']} 次）")
+        inventory = result.get('inventory') or {}
+        if inventory.get('answered') or inventory.get('fallback'):
+            print(f"  照片總覽: {inventory['answered']} 個項目由分類數量判斷，{inventory['fallback']} 個項目載入分類頁面")
+        routes = result.get('routes') or {}
+        if routes:
+            print('  後端路由: ' + ', '.join(f"{page_type}→{state['route']}（{state['samples']} 個樣本，一致率 "
+                                          f"{state['agreement']:.0%}）" for page_type, state in routes.items()))
+        lazy_load = result.get('lazy_load') or {}
+        if lazy_load.get('pages'):
+            print(f"  懶加載: {lazy_load['pages']} 個頁面中 {lazy_load['scrolled']} 個需要滾動"
+                  f"（{lazy_load['found_after_scroll']} 個滾動後出現照片/影片）")
+        print(f"  {'階段/後端':<24}{'次數':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'總計(s)':>10}")
+        for stage, stats in result['stages'].items():
+            print(f"  {stage:<24}{stats['count']:>6}{stats['p50'] * 1000:>10.1f}"
+                  f"{stats['p95'] * 1000:>10.1f}{stats['total']:>10.2f}")
+    print('=' * 72)
+
+
+def compare_baseline(results, baseline_file, tolerance):
+    """與基準結果比較，回傳退化項目的說明"""
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = {item['backend']: item for item in json.load(f)['results']}
+    regressions = []
+    for result in results:
+        base = baseline.get(result['backend'])
+        if 'skipped' in result or not base or 'skipped' in base:
+            continue
+        if result['restaurants_per_minute'] < base['restaurants_per_minute'] * (1 - tolerance):
+            regressions.append(f"[{result['backend']}] 吞吐量 {base['restaurants_per_minute']:.1f} -> "
+                               f"{result['restaurants_per_minute']:.1f} 間/分鐘")
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"[{result['backend']}] 峰值RSS {base['peak_rss_mb']:.1f} -> "
+                               f"{result['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def check_rss_bound(results, max_rss_mb):
+    """worker行程的峰值RSS超過上限的後端"""
+    return [f"[{result['backend']}] worker峰值RSS {result['worker_peak_rss_mb']:.1f} MB 超過上限 {max_rss_mb:.0f} MB"
+            for result in results
+            if 'skipped' not in result and result['worker_peak_rss_mb'] > max_rss_mb]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenRiceChecker 端到端基準測試（本地替身伺服器）')
+    parser.add_argument('--restaurants', type=int, default=30, help='餐廳數量')
+    parser.add_argument('--backends', default='requests,selenium',
+                        help='要測試的後端（逗號分隔：requests / selenium / playwright）')
+    parser.add_argument('--navigation', default='spa', help='瀏覽器後端的頁面切換方式（逗號分隔，例如 spa,cold）')
+    parser.add_argument('--short-ratio', type=float, default=0.3, help='使用縮短URL的比例')
+    parser.add_argument('--latency', type=float, default=0.02, help='伺服器每個請求的延遲（秒）')
+    parser.add_argument('--jitter', type=float, default=0.01, help='伺服器額外隨機延遲上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='伺服器注入錯誤的機率')
+    parser.add_argument('--error-status', type=int, default=503, help='注入錯誤的狀態碼')
+    parser.add_argument('--retry-after', type=float, default=None, help='注入錯誤時的Retry-After（秒）')
+    parser.add_argument('--compression', choices=['br', 'gzip', 'none'], default='gzip', help='伺服器回應的壓縮方式')
+    parser.add_argument('--rate', type=float, default=50.0, help='限速器初始速率（每秒請求數）')
+    parser.add_argument('--photos-per-page', type=int, default=24, help='照片/菜單頁的圖片數量（頁面大小）')
+    parser.add_argument('--no-photo-inventory', action='store_true',
+                        help='不使用照片總覽的分類數量（每間餐廳都載入所有分類頁面）')
+    parser.add_argument('--max-rss-mb', type=float, help='worker行程峰值RSS的上限（MB），超過時以非零狀態碼結束')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--output', help='將結果寫入JSON檔（可作為之後的 --baseline）')
+    parser.add_argument('--baseline', help='基準結果JSON檔')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允許的退化比例')
+    # 子行程參數
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--label', help=argparse.SUPPRESS)
+    parser.add_argument('--urls', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    config = StubConfig(latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate,
+                        error_status=args.error_status, retry_after=args.retry_after,
+                        photos_per_page=args.photos_per_page, compression=None if args.compression == 'none' else args.compression)
+    with OpenRiceStubServer(config) as server:
+        short_every = int(1 / args.short_ratio) if args.short_ratio > 0 else 0
+        urls = [
+            server.short_url(i) if short_every and i % short_every == 0 else server.restaurant_url(i)
+            for i in range(1, args.restaurants + 1)
+        ]
+        results = []
+        for backend in [name.strip() for name in args.backends.split(',') if name.strip()]:
+            if backend in ('selenium', 'playwright'):
+                modes = [mode.strip() for mode in args.navigation.split(',') if mode.strip()]
+                for navigation in modes:
+                    results.append(run_backend(backend, urls, args, navigation, labelled=len(modes) > 1))
+            else:
+                results.append(run_backend(backend, urls, args))
+        request_count = server.request_count
+
+    print_report(results)
+    print(f"替身伺服器共處理 {request_count} 個請求")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'args': vars(args) | {'urls': None},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+
+    regressions = compare_baseline(results, args.baseline, args.tolerance) if args.baseline else []
+    if args.max_rss_mb:
+        regressions += check_rss_bound(results, args.max_rss_mb)
+    if regressions:
+        print('效能退化:')
+        for line in regressions:
+            print(f'  {line}')
+        sys.exit(1)
+    if args.baseline:
+        print('與基準相比沒有效能退化')
+    if args.max_rss_mb:
+        print(f'worker峰值RSS都在上限 {args.max_rss_mb:.0f} MB 以內')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""本地的OpenRice替身伺服器（基準測試用）
+
+提供與OpenRice相同路徑結構的頁面，不需要連線到真實網站：
+- /zh/taipei/r-bench-<id>            餐廳主頁
+- /zh/taipei/r-bench-<id>/photos       照片總覽頁（分類連結上有各分類的數量）
+- /zh/taipei/r-bench-<id>/photos/<分類>  照片分類頁（decor / food / menu / videos）
+- /zh/taipei/r-bench-<id>/menus      菜單頁
+- /s/<id>                            模擬 s.openrice.com 縮短URL（302重新導向到主頁）
+- /userphoto/...                     1x1 圖片
+
+頁面回應帶有ETag，並支援 If-None-Match 條件請求（304）；
+設定 compression 時依 Accept-Encoding 回傳 br 或 gzip 壓縮的內容。
+
+可設定每個請求的延遲與錯誤注入（回傳指定狀態碼與 Retry-After）。
+每 EMPTY_VIDEO_EVERY 間餐廳的影片頁為空狀態，用來覆蓋不合格的路徑。
+"""
+import gzip
+import hashlib
+import os
+import random
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+EMPTY_VIDEO_EVERY = 3
+RESTAURANT_PREFIX = '/zh/taipei/r-bench-'
+
+# 1x1 透明GIF
+PIXEL_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00'
+             b'\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class StubConfig:
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0, error_status=503, retry_after=None,
+                 photos_per_page=24, compression='gzip'):
+        """
+        :param latency: 每個請求的固定延遲（秒）
+        :param latency_jitter: 額外的隨機延遲上限（秒）
+        :param error_rate: 回傳錯誤的機率（0~1）
+        :param error_status: 注入錯誤時的狀態碼
+        :param retry_after: 注入錯誤時的Retry-After標頭（秒），None表示不送
+        :param photos_per_page: 照片/菜單頁的圖片數量
+        :param compression: 優先使用的壓縮方式（'br' / 'gzip' / None）
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.photos_per_page = photos_per_page
+        self.compression = compression
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'OpenRiceStub/1.0'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body):
+        stub = self.server.stub
+        config = stub.config
+        stub.count_request()
+
+        delay = config.latency + random.uniform(0, config.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        path = self.path.split('?', 1)[0]
+        if config.error_rate and random.random() < config.error_rate and not path.startswith('/userphoto/'):
+            headers = {}
+            if config.retry_after is not None:
+                headers['Retry-After'] = str(config.retry_after)
+            return self._send(config.error_status, b'', 'text/plain', headers, send_body)
+
+        if path.startswith('/s/'):
+            restaurant_id = path[3:].strip('/')
+            location = f"{stub.base_url}{RESTAURANT_PREFIX}{restaurant_id}?_sUrl=bench"
+            return self._send(302, b'', 'text/plain', {'Location': location}, send_body)
+
+        if path.startswith('/userphoto/'):
+            return self._send(200, PIXEL_GIF, 'image/gif', {'Cache-Control': 'max-age=86400'}, send_body)
+
+        if path.startswith('/static/'):
+            return self._send(200, b'', 'text/plain', {'Cache-Control': 'max-age=86400'}, send_body)
+
+        if path.startswith(RESTAURANT_PREFIX):
+            html = stub.render(path)
+            if html is not None:
+                body = html.encode('utf-8')
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, b'', 'text/html; charset=utf-8', {'ETag': etag}, send_body)
+                headers = {'ETag': etag}
+                encoding = self._negotiate_encoding(config.compression)
+                if encoding == 'br':
+                    body = brotli.compress(body)
+                elif encoding == 'gzip':
+                    body = gzip.compress(body)
+                if encoding:
+                    headers['Content-Encoding'] = encoding
+                return self._send(200, body, 'text/html; charset=utf-8', headers, send_body)
+
+        return self._send(404, b'not found', 'text/plain', {}, send_body)
+
+    def _negotiate_encoding(self, preferred):
+        accepted = [e.split(';')[0].strip() for e in self.headers.get('Accept-Encoding', '').split(',')]
+        if preferred == 'br' and brotli is not None and 'br' in accepted:
+            return 'br'
+        if preferred in ('br', 'gzip') and 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def _send(self, status, body, content_type, headers, send_body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+
+class OpenRiceStubServer:
+    """在背景執行緒中執行的替身伺服器"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or StubConfig()
+        self.fixtures = {
+            'main': _load_fixture('main.html'),
+            'photos': _load_fixture('photos_category.html'),
+            'empty': _load_fixture('photos_empty.html'),
+            'menus': _load_fixture('menus.html'),
+        }
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+        self._count_lock = threading.Lock()
+        self.request_count = 0
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    @property
+    def short_base_url(self):
+        """縮短URL使用不同的主機名稱（localhost），讓檢查器把它當成 s.openrice.com"""
+        return f'http://localhost:{self.port}'
+
+    def restaurant_url(self, restaurant_id):
+        return f'{self.base_url}{RESTAURANT_PREFIX}{restaurant_id}'
+
+    def short_url(self, restaurant_id):
+        return f'{self.short_base_url}/s/{restaurant_id}'
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def render(self, path):
+        """依路徑渲染對應的fixture，無法對應時回傳None"""
+        rest = path[len(RESTAURANT_PREFIX):].rstrip('/')
+        restaurant_id, _, sub_path = rest.partition('/')
+        if not restaurant_id.isdigit():
+            return None
+        restaurant_path = RESTAURANT_PREFIX + restaurant_id
+        values = {
+            '{{BASE}}': self.base_url,
+            '{{PATH}}': restaurant_path,
+            '{{ID}}': restaurant_id,
+            '{{NAME_ZH}}': f'測試餐廳{restaurant_id}號店',
+            '{{NAME_EN}}': f'Bench Restaurant No {restaurant_id}',
+        }
+
+        if not sub_path:
+            template = self.fixtures['main']
+        elif sub_path == 'menus':
+            template = self.fixtures['menus']
+            values['{{ITEMS}}'] = self._items(restaurant_id, 'menu')
+        elif sub_path == 'photos' or sub_path.startswith('photos/'):
+            category = sub_path.split('/', 1)[1] if '/' in sub_path else 'all'
+            values['{{CATEGORY}}'] = category
+            has_videos = int(restaurant_id) % EMPTY_VIDEO_EVERY != 0
+            values.update({
+                '{{COUNT_DECOR}}': str(self.config.photos_per_page),
+                '{{COUNT_FOOD}}': str(self.config.photos_per_page),
+                '{{COUNT_MENU}}': str(self.config.photos_per_page),
+                '{{COUNT_VIDEOS}}': str(3 if has_videos else 0),
+            })
+            if category == 'videos':
+                if not has_videos:
+                    template = self.fixtures['empty']
+                else:
+                    template = self.fixtures['photos']
+                    values['{{ITEMS}}'] = '\n'.join(
+                        f'    <div class="video-item"><video src="{self.base_url}/userphoto/video/{restaurant_id}/{i}.mp4"></video></div>'
+                        for i in range(3)
+                    )
+            else:
+                template = self.fixtures['photos']
+                values['{{ITEMS}}'] = self._items(restaurant_id, 'food' if category == 'all' else category)
+        else:
+            return None
+
+        for key, value in values.items():
+            template = template.replace(key, value)
+        return template
+
+    def _items(self, restaurant_id, category):
+        return '\n'.join(
+            f'    <div class="photo-item"><img src="{self.base_url}/userphoto/photo/{restaurant_id}/{category}-{i}.jpg" alt="{category} {i}"></div>'
+            for i in range(self.config.photos_per_page)
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='openrice-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='啟動本地OpenRice替身伺服器')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = OpenRiceStubServer(StubConfig(latency=args.latency, error_rate=args.error_rate), port=args.port)
+    print(f'OpenRice替身伺服器: {server.base_url}{RESTAURANT_PREFIX}1 （縮短URL: {server.short_url(1)}）')
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
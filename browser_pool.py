@@ -0,0 +1,208 @@
+"""共用一個無頭Chromium的瀏覽器後端（Playwright）
+
+每個 OpenRiceChecker 使用 webdriver.Chrome 時各自啟動一個完整的Chrome行程，記憶體隨worker數倍增。
+這裡整個行程只啟動一個Chromium（透過CDP控制），每個worker拿到自己的 browser context（獨立的
+Cookie/快取/儲存空間）與分頁，context之間互不影響但共用瀏覽器行程、GPU/網路服務等。
+
+Playwright的async API在一個背景執行緒的事件迴圈中執行，各worker執行緒以同步方式呼叫，
+不同context的頁面載入可以同時進行。
+"""
+import asyncio
+import importlib.util
+import os
+import threading
+
+from log_config import logger
+from metrics import BROWSER_RESTARTS
+
+# Playwright（可選）：只檢查是否已安裝，第一次啟動Chromium時才匯入
+PLAYWRIGHT_AVAILABLE = importlib.util.find_spec('playwright') is not None
+
+# Chromium啟動參數（與Selenium後端相同的容器環境需求）
+LAUNCH_ARGS = [
+    '--no-sandbox',  # Docker環境需要
+    '--disable-dev-shm-usage',  # 避免共享內存問題
+    '--disable-gpu',
+    '--disable-setuid-sandbox',
+    '--disable-extensions',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+]
+
+# 呼叫端等待結果時，在Playwright自己的逾時之外多等的秒數
+_RESULT_MARGIN = 5
+
+
+def _as_function(script):
+    """把Selenium風格的腳本（arguments[0]、頂層return）包成Playwright evaluate可用的函式"""
+    return f"(arg) => (function() {{ {script} }}).apply(null, [arg])"
+
+
+def _as_async_function(script):
+    """把Selenium execute_async_script 風格的腳本（最後一個參數是完成回呼）包成回傳Promise的函式"""
+    return f"(arg) => new Promise(resolve => (function() {{ {script} }}).apply(null, [arg, resolve]))"
+
+
+class SharedBrowser:
+    """整個行程共用的無頭Chromium（執行緒安全）"""
+
+    def __init__(self, launch_args=None, executable_path=None):
+        """
+        :param launch_args: Chromium啟動參數，None時使用LAUNCH_ARGS
+        :param executable_path: Chromium執行檔，None時使用環境變量CHROMIUM_PATH（存在時）或Playwright內建的Chromium
+        """
+        if not PLAYWRIGHT_AVAILABLE:
+            raise RuntimeError("Playwright未安裝（pip install playwright && playwright install chromium）")
+        self.launch_args = launch_args or LAUNCH_ARGS
+        if executable_path is None:
+            candidate = os.environ.get('CHROMIUM_PATH')
+            executable_path = candidate if candidate and os.path.exists(candidate) else None
+        self.executable_path = executable_path
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='shared-browser', daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self.sessions_opened = 0
+
+    def run(self, coro, timeout=None):
+        """在瀏覽器的事件迴圈中執行coroutine並等待結果"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        return future.result(None if timeout is None else timeout + _RESULT_MARGIN)
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        if self._browser is not None:
+            logger.warning("共用Chromium已斷線，重新啟動")
+            BROWSER_RESTARTS.inc(backend='playwright')
+        logger.info("啟動共用的無頭Chromium...")
+        self._browser = await self._playwright.chromium.launch(
+            headless=True, args=self.launch_args, executable_path=self.executable_path)
+        return self._browser
+
+    def new_session(self, user_agent=None, viewport=None):
+        """建立一個worker用的browser context與分頁（瀏覽器已關閉或崩潰時重新啟動）"""
+        async def create():
+            browser = await self._ensure_browser()
+            context = await browser.new_context(
+                user_agent=user_agent,
+                viewport=viewport or {'width': 1920, 'height': 1080},
+                locale='zh-TW',
+            )
+            page = await context.new_page()
+            return context, page
+
+        with self._lock:
+            context, page = self.run(create(), timeout=60)
+            self.sessions_opened += 1
+        return BrowserSession(self, context, page)
+
+    def close(self):
+        async def shutdown():
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+
+        with self._lock:
+            try:
+                self.run(shutdown(), timeout=30)
+            except Exception as e:
+                logger.debug(f"關閉共用Chromium失敗: {e}")
+            self._browser = None
+            self._playwright = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class BrowserSession:
+    """一個worker的browser context與分頁（同步介面）"""
+
+    def __init__(self, browser, context, page):
+        self._browser = browser
+        self._context = context
+        self._page = page
+        self.closed = False
+
+    def _run(self, coro, timeout=None):
+        return self._browser.run(coro, timeout)
+
+    @property
+    def current_url(self):
+        """目前分頁的URL（瀏覽器已斷線時拋出例外）"""
+        if not self._context.browser or not self._context.browser.is_connected():
+            raise RuntimeError("共用Chromium已斷線")
+        return self._page.url
+
+    def goto(self, url, timeout):
+        """載入頁面（等到DOMContentLoaded），回傳HTTP狀態碼（沒有回應時為None）
+        :param timeout: 上限秒數
+        """
+        async def navigate():
+            response = await self._page.goto(url, wait_until='domcontentloaded', timeout=timeout * 1000)
+            return response.status if response is not None else None
+        return self._run(navigate(), timeout)
+
+    def wait_for_load(self, timeout):
+        """等待頁面load事件與網路閒置（逾時不拋出例外，動態內容可能仍在載入）"""
+        async def wait():
+            try:
+                await self._page.wait_for_load_state('load', timeout=timeout * 1000)
+                await self._page.wait_for_load_state('networkidle', timeout=timeout * 1000)
+            except Exception as e:
+                logger.debug(f"  等待頁面載入逾時: {e}，繼續執行")
+        self._run(wait(), timeout * 2)
+
+    def click_link(self, script, target_path, timeout):
+        """在分頁內執行點擊連結的腳本，並等待網址切換到目標路徑
+        :return: 找不到連結時回傳False
+        """
+        async def click():
+            if not await self._page.evaluate(_as_function(script), target_path):
+                return False
+            await self._page.wait_for_function(
+                "(target) => location.pathname.replace(/\\/$/, '') === target && document.readyState === 'complete'",
+                arg=target_path, timeout=timeout * 1000)
+            return True
+        return self._run(click(), timeout)
+
+    def evaluate(self, script, arg=None, timeout=30):
+        """執行Selenium execute_script 風格的腳本"""
+        return self._run(self._page.evaluate(_as_function(script), arg), timeout)
+
+    def evaluate_async(self, script, arg=None, timeout=30):
+        """執行Selenium execute_async_script 風格的腳本（超過timeout秒拋出例外）"""
+        async def evaluate():
+            return await asyncio.wait_for(self._page.evaluate(_as_async_function(script), arg), timeout)
+        return self._run(evaluate(), timeout)
+
+    def content(self, timeout=30):
+        """目前頁面序列化後的HTML"""
+        return self._run(self._page.content(), timeout)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._run(self._context.close(), timeout=10)
+        except Exception as e:
+            logger.debug(f"關閉browser context失敗: {e}")
+
+
+_shared_browser = None
+_shared_browser_lock = threading.Lock()
+
+
+def get_shared_browser():
+    """整個行程共用的SharedBrowser（第一次使用時建立）"""
+    global _shared_browser
+    with _shared_browser_lock:
+        if _shared_browser is None:
+            _shared_browser = SharedBrowser()
+        return _shared_browser
@@ -1,46 +1,317 @@
-import pandas as pd
+import importlib.util
 import requests
-from bs4 import BeautifulSoup
 import time
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 import json
 from datetime import datetime
-import sys
 import os
+import threading
 
-# 嘗試匯入brotli（可選，用於解壓Brotli壓縮的回應）
-try:
-    import brotli
-    BROTLI_AVAILABLE = True
-except ImportError:
-    BROTLI_AVAILABLE = False
+from log_config import logger, summary_logger, setup_logging, flush_logs
+from rate_limiter import get_rate_limiter, request_with_retry
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import (BROWSER_RESTARTS, CACHE_LOOKUPS, CHECK_RESULTS, RESTAURANT_SECONDS, RESTAURANTS_CHECKED,
+                     StageTimer, page_type_of, start_metrics_server)
+from page_store import PageStore, RECORD, REPLAY
+from content_decoding import accept_encoding, read_decoded
+from batch_scheduler import Checkpoint, RULE_FAILED_FIRST, build_work_queue, load_previous_results
+from time_budget import TIMEOUT_MARK, UNLIMITED, BudgetExceeded, Deadline
+from backend_router import ROUTE_REQUESTS, get_backend_router
+from page_facts import (CHINESE_NAME_SELECTORS, ENGLISH_NAME_SELECTORS, FACTS_SCRIPT, MENU_EMPTY_KEYWORDS,
+                        PHOTO_CATEGORIES, VIDEO_EMPTY_KEYWORDS, PageFacts, extract_facts, script_arguments)
+
+# Selenium（可選）：只檢查是否已安裝，真正要啟動Chrome時才匯入（requests或重播模式完全不載入）
+SELENIUM_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('selenium', 'webdriver_manager'))
+
+# 表示OpenRice封鎖或伺服器不健康的HTTP狀態碼（計入斷路器失敗）
+UNHEALTHY_STATUS = frozenset([403, 429, 500, 502, 503, 504])
+
+# Selenium的頁面切換方式：cold 每頁都 driver.get；spa 同一間餐廳的子頁面點擊分頁連結（SPA不重新啟動）
+NAV_COLD = 'cold'
+NAV_SPA = 'spa'
+
+# 檢查項目標記對應的指標結果
+ITEM_OUTCOMES = {'✓': 'passed', '✗': 'failed', TIMEOUT_MARK: 'timeout'}
+
+# 照片分類頁對應的檢查項目（媒體連結驗證用）
+CATEGORY_ITEMS = {'decor': '門面照片', 'menu': '菜單', 'food': '餐點照片', 'videos': '相關影片'}
+
+# 瀏覽器後端：chrome 每個檢查器一個webdriver.Chrome行程；playwright 整個行程共用一個Chromium，每個檢查器一個browser context
+BROWSER_CHROME = 'chrome'
+BROWSER_PLAYWRIGHT = 'playwright'
+BROWSER_USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/120.0.0.0 Safari/537.36')
+
+# Selenium頁面資料的擷取方式：script 在頁面中執行FACTS_SCRIPT；dom 傳回page_source再用BeautifulSoup解析
+EXTRACT_SCRIPT = 'script'
+EXTRACT_DOM = 'dom'
+
+# 在頁面中找到指向目標路徑的連結並點擊，找不到時回傳false
+_CLICK_LINK_SCRIPT = """
+const target = arguments[0];
+const link = Array.from(document.querySelectorAll('a[href]')).find(a => {
+    try { return new URL(a.href, location.href).pathname.replace(/\\/$/, '') === target; }
+    catch (e) { return false; }
+});
+if (!link) { return false; }
+link.scrollIntoView({block: 'center'});
+link.click();
+return true;
+"""
+
+# 觸發懶加載：已經有符合條件的照片/影片就不滾動；否則分段往下滾動，
+# 用MutationObserver監看新增的節點與src變化，出現第一個符合條件的媒體就停止，
+# 到底後媒體節點數連續幾段不再變化也停止。回傳 {scrolled, steps, found}
+_LAZY_LOAD_SCRIPT = """
+const args = arguments[0];
+const done = arguments[arguments.length - 1];
+const imageSrc = (img) => img.getAttribute('src') || img.getAttribute('data-src') || img.getAttribute('data-lazy-src')
+    || img.getAttribute('data-original') || img.getAttribute('data-lazy') || '';
+const isPhoto = (src) => {
+    const lower = src.toLowerCase();
+    return !args.excludedWords.some(word => lower.includes(word)) && (src.includes('http') || src.startsWith('//'));
+};
+const found = () => document.querySelector('video, iframe[src]') !== null
+    || Array.from(document.images).some(img => isPhoto(imageSrc(img)));
+const mediaCount = () => document.querySelectorAll('img, video, iframe').length;
+if (found()) { done({scrolled: false, steps: 0, found: true}); return; }
+
+let steps = 0, stable = 0, changed = false, finished = false, timer = null;
+let lastCount = mediaCount();
+const finish = (result) => {
+    if (finished) { return; }
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    window.scrollTo(0, 0);
+    done({scrolled: steps > 0, steps: steps, found: result});
+};
+const observer = new MutationObserver(() => {
+    changed = true;
+    if (found()) { finish(true); }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true,
+                                            attributeFilter: ['src', 'data-src', 'srcset']});
+const step = () => {
+    if (finished) { return; }
+    const count = mediaCount();
+    const atBottom = window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2;
+    stable = (atBottom && !changed && count === lastCount) ? stable + 1 : 0;
+    if (stable >= args.stableSteps || steps >= args.maxSteps) { finish(false); return; }
+    changed = false;
+    lastCount = count;
+    steps += 1;
+    window.scrollBy(0, window.innerHeight);
+    timer = setTimeout(step, args.stepMs);
+};
+step();
+"""
+
+
+def _has_chinese(text):
+    return any('\u4e00' <= char <= '\u9fff' for char in text)
+
+
+# 圖片src含有這些字時不是餐廳照片
+NON_PHOTO_WORDS = ('placeholder', 'logo', 'avatar')
+
+
+def _is_photo_src(src):
+    """排除placeholder、logo、avatar等非照片圖片，且必須是完整的URL"""
+    lower = src.lower()
+    return (not any(word in lower for word in NON_PHOTO_WORDS) and
+            ('http' in src or src.startswith('//')))
+
+
+def _is_door_alt(alt):
+    alt = alt.lower()
+    return 'door' in alt or '門面' in alt or '门面' in alt
+
+
+def _is_door_or_menu_alt(alt):
+    alt = alt.lower()
+    return _is_door_alt(alt) or 'menu' in alt or '菜單' in alt or '菜单' in alt
+
+
+def parse_html(html):
+    """以BeautifulSoup解析HTML（第一次解析時才匯入bs4）"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+
+def release_tree(soup):
+    """拆開解析樹節點之間的引用，讓整棵樹立即由引用計數釋放
+    BeautifulSoup的節點互相引用（parent/next_element），離開作用域後要等循環垃圾回收才會釋放，
+    一間餐廳的多個頁面樹可能同時留在記憶體中。新版bs4的根節點沒有next_element，
+    只對根節點呼叫decompose()不會走訪子節點，因此逐一拆除最上層的節點
+    """
+    for element in list(soup.contents):
+        element.decompose()
+    soup.decompose()
+
+
+def facts_from_html(html, url='', html_length=None):
+    """解析HTML並只保留檢查需要的資料（PageFacts），解析樹隨即釋放"""
+    soup = parse_html(html)
+    try:
+        return extract_facts(soup, url, len(html) if html_length is None else html_length)
+    finally:
+        release_tree(soup)
+
+
+def restaurant_base_url(url):
+    """餐廳主頁URL（去掉查詢參數與 /photos/...、/menus 子路徑）"""
+    url = url.split('?', 1)[0].split('#', 1)[0].rstrip('/')
+    for marker in ('/photos', '/menus'):
+        if marker in url:
+            url = url.rsplit(marker, 1)[0]
+    return url
+
+
+def load_restaurant_sheet(excel_file):
+    """從Excel載入餐廳資料（統一「餐廳名稱」與「URL」欄位名稱），失敗時回傳None"""
+    import pandas as pd
+    try:
+        df = pd.read_excel(excel_file)
+        # 檢查必要的欄位是否存在
+        if 'URL' not in df.columns:
+            # 嘗試其他可能的欄位名稱
+            possible_url_cols = ['網址', '網址', 'url', '連結', '連結']
+            url_col = None
+            for col in possible_url_cols:
+                if col in df.columns:
+                    url_col = col
+                    break
+            if url_col:
+                df['URL'] = df[url_col]
+            else:
+                raise ValueError("Excel檔案必須包含'URL'欄位（或'網址'等）")
+        
+        if '餐廳名稱' not in df.columns:
+            # 嘗試其他可能的欄位名稱
+            possible_name_cols = ['餐廳名稱', '餐厅名称', '名稱', '名称', 'name', 'Name']
+            name_col = None
+            for col in possible_name_cols:
+                if col in df.columns:
+                    name_col = col
+                    break
+            if name_col:
+                df['餐廳名稱'] = df[name_col]
+            else:
+                raise ValueError("Excel檔案必須包含'餐廳名稱'欄位（或'名稱'等）")
+        
+        return df
+    except Exception as e:
+        logger.error(f"讀取Excel檔案錯誤: {e}")
+        return None
 
-# 嘗試匯入Selenium（可選）
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.chrome.service import Service
-    from selenium.webdriver.common.by import By
-    from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except ImportError:
-    SELENIUM_AVAILABLE = False
-    print("警告: Selenium未安裝，將使用requests（可能無法處理JavaScript動態內容）")
 
 class OpenRiceChecker:
-    def __init__(self, excel_file, use_selenium=True):
+    # 縮短URL的主機（需要先解析重新導向）
+    SHORT_URL_HOSTS = ('s.openrice.com',)
+    
+    # Chrome的頁面載入上限（秒）
+    PAGE_LOAD_TIMEOUT = 30
+    # 懶加載：每段滾動後最多等待的毫秒數、最多滾動段數、到底後媒體數不變幾段就停止
+    LAZY_LOAD_STEP_MS = 300
+    LAZY_LOAD_MAX_STEPS = 15
+    LAZY_LOAD_STABLE_STEPS = 2
+    
+    def __init__(self, excel_file, use_selenium=True, rate_limiter=None, page_store=None, restaurant_budget=None,
+                 navigation=None, extraction=None, photo_inventory=None, browser=None, history=None,
+                 backend_router=None, media_verifier=None):
         """
         初始化檢查器
         :param excel_file: Excel檔案路徑，應包含餐廳名稱和URL欄位
         :param use_selenium: 是否使用Selenium（推薦True，可處理JavaScript動態內容）
+        :param rate_limiter: 限速器，預設使用整個行程共用的限速器（所有檢查器和抓取方式共用）
+        :param page_store: 頁面存檔（PageStore），錄製模式保存抓取的頁面，重播模式完全不連網
+        :param restaurant_budget: 每間餐廳的時間上限（秒），超過時其餘項目標記為「逾時」；
+                                  None時使用環境變量CHECKER_RESTAURANT_BUDGET（預設不限時）
+        :param navigation: Selenium的頁面切換方式 'spa'（同一間餐廳的子頁面在同一分頁內點擊連結切換）
+                           或 'cold'（每頁 driver.get）；None時使用環境變量CHECKER_NAVIGATION（預設spa）
+        :param extraction: Selenium頁面資料的擷取方式 'script'（在頁面中擷取檢查需要的資料）
+                           或 'dom'（page_source + BeautifulSoup）；None時使用環境變量CHECKER_EXTRACTION（預設script）
+        :param photo_inventory: 是否先從照片總覽頁的分類數量判斷門面/菜單/餐點/影片（取不到數量的分類才載入分類頁面）；
+                                None時使用環境變量CHECKER_PHOTO_INVENTORY（預設1）
+        :param browser: 瀏覽器後端 'chrome'（每個檢查器一個webdriver.Chrome）或 'playwright'
+                        （共用一個Chromium，每個檢查器一個browser context，記憶體較少）；
+                        None時使用環境變量CHECKER_BROWSER（預設chrome）
+        :param history: 歷史紀錄（HistoryStore），每間餐廳的結果都會保存，報告中加上「與上次比較」工作表
+        :param backend_router: 依頁面類型選擇瀏覽器或requests的路由（BackendRouter），
+                               預設使用整個行程共用的路由（有瀏覽器時才有作用）
+        :param media_verifier: 媒體連結驗證（MediaVerifier），通過檢查的照片/影片URL會在背景抽樣驗證，
+                               結果在 run_check 結束時加入報告；重播模式不驗證
         """
         self.excel_file = excel_file
         self.results = []
-        self.use_selenium = use_selenium and SELENIUM_AVAILABLE
+        self.page_store = page_store
+        # 歷史紀錄：第一間餐廳檢查完成時開始一次執行
+        self.history = history
+        self.history_run_id = None
+        self.replaying = page_store is not None and page_store.replaying
+        self.browser = browser or os.environ.get('CHECKER_BROWSER', BROWSER_CHROME)
+        self.browser_session = None
+        # 重播模式不需要瀏覽器；使用共用Chromium時不另外啟動webdriver.Chrome
+        wants_browser = use_selenium and not self.replaying
+        if wants_browser and self.browser == BROWSER_PLAYWRIGHT:
+            self._open_browser_session()
+        if wants_browser and self.browser_session is None and not SELENIUM_AVAILABLE:
+            logger.warning("警告: Selenium未安裝，將使用requests（可能無法處理JavaScript動態內容）")
+        self.use_selenium = wants_browser and SELENIUM_AVAILABLE and self.browser_session is None
         self.driver = None  # 初始化driver屬性，避免__del__時出錯
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.backend_router = backend_router or get_backend_router()
+        self.media_verifier = None if self.replaying else media_verifier
+        # 本間餐廳通過檢查的媒體URL {項目: [URL]}（媒體連結驗證用）
+        self._media_urls = {}
+        self._driver_lock = threading.RLock()
+        self._last_requests_url = None
+        # 各頁面類型/後端的耗時統計
+        self.stage_timer = StageTimer()
+        # 條件請求（ETag/Last-Modified）的統計：送出數、304數、節省的位元組
+        self.conditional_stats = {'sent': 0, 'not_modified': 0, 'bytes_saved': 0}
+        # 時間上限：每間餐廳一個Deadline（受整批的Deadline限制）
+        if restaurant_budget is None:
+            restaurant_budget = float(os.environ.get('CHECKER_RESTAURANT_BUDGET', '0'))
+        self.restaurant_budget = restaurant_budget or None
+        self._deadline = UNLIMITED
+        self._batch_deadline = None
+        self._page_load_timeout = self.PAGE_LOAD_TIMEOUT
+        # 頁面切換方式與統計（cold: driver.get，spa: 分頁內點擊切換，spa_fallback: 無法點擊改用driver.get）
+        self.navigation = navigation or os.environ.get('CHECKER_NAVIGATION', NAV_SPA)
+        self.navigation_stats = {'cold': 0, 'spa': 0, 'spa_fallback': 0}
+        self._last_navigation = NAV_COLD
+        self.extraction = extraction or os.environ.get('CHECKER_EXTRACTION', EXTRACT_SCRIPT)
+        if photo_inventory is None:
+            photo_inventory = os.environ.get('CHECKER_PHOTO_INVENTORY', '1') != '0'
+        self.photo_inventory = photo_inventory
+        # 照片總覽統計（answered: 由分類數量判斷的項目，fallback: 仍需載入分類頁面的項目）
+        self.inventory_stats = {'answered': 0, 'fallback': 0}
+        # 懶加載統計（pages: 檢查過的頁面，scrolled: 需要滾動的頁面，found_after_scroll: 滾動後才出現照片/影片）
+        self.lazy_load_stats = {'pages': 0, 'scrolled': 0, 'found_after_scroll': 0}
+        
+        # 每個抓取後端一個斷路器，狀態變化記錄在circuit_events（會寫入報告）
+        self.circuit_events = []
+        self.breakers = {
+            'selenium': CircuitBreaker('selenium', failure_threshold=3, recovery_timeout=60,
+                                       probe=self._probe_selenium, events=self.circuit_events),
+            'requests': CircuitBreaker('requests', failure_threshold=5, recovery_timeout=30,
+                                       probe=self._probe_requests, events=self.circuit_events),
+            'playwright': CircuitBreaker('playwright', failure_threshold=3, recovery_timeout=60,
+                                         probe=self._probe_playwright, events=self.circuit_events),
+        }
         
+        if self.use_selenium:
+            # 第一次需要Chrome時才匯入Selenium（已安裝但無法匯入時改用requests）
+            try:
+                from selenium import webdriver
+                from selenium.webdriver.chrome.options import Options
+                from selenium.webdriver.chrome.service import Service
+                from webdriver_manager.chrome import ChromeDriverManager
+            except ImportError as e:
+                logger.warning(f"警告: Selenium無法匯入（{e}），將使用requests（可能無法處理JavaScript動態內容）")
+                self.use_selenium = False
         if self.use_selenium:
             # 設定Chrome選項（Railway/Docker環境需要特殊配置）
             chrome_options = Options()
@@ -54,10 +325,13 @@ class OpenRiceChecker:
             chrome_options.add_argument('--disable-web-security')  # 允許跨域請求
             chrome_options.add_argument('--disable-features=VizDisplayCompositor')  # 禁用某些功能
             chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--remote-debugging-port=9222')  # 遠程調試端口
+            # 遠程調試端口由系統分配：分片、worker池與佇列worker同一台機器上有多個Chrome，固定端口會互相衝突
+            chrome_options.add_argument('--remote-debugging-port=0')
             chrome_options.add_argument('--disable-background-timer-throttling')
             chrome_options.add_argument('--disable-backgrounding-occluded-windows')
             chrome_options.add_argument('--disable-renderer-backgrounding')
+            # 保留HTTP快取與Service Worker：整個worker共用一個分頁，OpenRice的JS/CSS只下載一次
+            chrome_options.add_argument('--disk-cache-size=104857600')
             chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
             
             # 禁用某些可能導致問題的功能
@@ -66,78 +340,66 @@ class OpenRiceChecker:
             
             try:
                 # 檢查是否在Railway/Docker環境中
-                # os 和 sys 已在文件頂部導入
+                # os 已在文件頂部導入
                 
                 # 確保輸出立即刷新（Railway環境需要）
-                sys.stdout.flush()
-                sys.stderr.flush()
                 
                 chrome_binary = os.environ.get('CHROMIUM_PATH', '/usr/bin/google-chrome')
                 chromedriver_path = os.environ.get('CHROMEDRIVER_PATH', None)
                 
-                print("=" * 50)
-                print("正在初始化Selenium...")
-                print(f"CHROMIUM_PATH環境變量: {chrome_binary}")
-                print(f"CHROMEDRIVER_PATH環境變量: {chromedriver_path}")
-                print(f"Chrome路徑是否存在: {os.path.exists(chrome_binary) if chrome_binary else False}")
-                sys.stdout.flush()
+                logger.info("=" * 50)
+                logger.info("正在初始化Selenium...")
+                logger.info(f"CHROMIUM_PATH環境變量: {chrome_binary}")
+                logger.info(f"CHROMEDRIVER_PATH環境變量: {chromedriver_path}")
+                logger.info(f"Chrome路徑是否存在: {os.path.exists(chrome_binary) if chrome_binary else False}")
                 
                 # 檢查Chrome是否存在
                 if os.path.exists(chrome_binary):
                     chrome_options.binary_location = chrome_binary
-                    print(f"✓ 找到Chrome: {chrome_binary}")
+                    logger.info(f"✓ 找到Chrome: {chrome_binary}")
                     
                     # 檢查Chrome版本
                     try:
                         import subprocess
                         chrome_version_output = subprocess.check_output([chrome_binary, '--version'], stderr=subprocess.STDOUT, timeout=5).decode('utf-8')
-                        print(f"Chrome版本: {chrome_version_output.strip()}")
+                        logger.info(f"Chrome版本: {chrome_version_output.strip()}")
                     except Exception as e:
-                        print(f"無法獲取Chrome版本: {e}")
+                        logger.debug(f"無法獲取Chrome版本: {e}")
                     
-                    sys.stdout.flush()
                     
                     # 在Railway/Docker環境中，使用webdriver-manager自動下載匹配的ChromeDriver
                     # 這比手動指定路徑更可靠
                     try:
-                        print("正在使用ChromeDriverManager下載ChromeDriver...")
-                        sys.stdout.flush()
+                        logger.debug("正在使用ChromeDriverManager下載ChromeDriver...")
                         
                         # 設置ChromeDriverManager的緩存目錄（避免權限問題）
                         import tempfile
                         cache_dir = os.path.join(tempfile.gettempdir(), 'chromedriver_cache')
                         os.makedirs(cache_dir, exist_ok=True)
-                        print(f"ChromeDriver緩存目錄: {cache_dir}")
-                        sys.stdout.flush()
+                        logger.debug(f"ChromeDriver緩存目錄: {cache_dir}")
                         
                         # 使用ChromeDriverManager自動下載匹配的ChromeDriver
                         # 注意：不使用cache_valid_range參數（某些版本不支持）
                         driver_path = ChromeDriverManager().install()
-                        print(f"✓ ChromeDriver已下載: {driver_path}")
+                        logger.info(f"✓ ChromeDriver已下載: {driver_path}")
                         service = Service(driver_path)
-                        sys.stdout.flush()
                     except Exception as e:
-                        print(f"✗ ChromeDriverManager失敗: {e}")
-                        import traceback
-                        print(traceback.format_exc())
-                        sys.stdout.flush()
+                        logger.warning(f"✗ ChromeDriverManager失敗: {e}")
+                        logger.debug("ChromeDriverManager錯誤堆棧", exc_info=True)
                         
                         # 如果自動下載失敗，嘗試使用環境變量指定的路徑
                         if chromedriver_path and os.path.exists(chromedriver_path):
-                            print(f"嘗試使用環境變量指定的ChromeDriver: {chromedriver_path}")
+                            logger.debug(f"嘗試使用環境變量指定的ChromeDriver: {chromedriver_path}")
                             service = Service(chromedriver_path)
-                            sys.stdout.flush()
                         else:
                             raise Exception(f"無法獲取ChromeDriver: {e}")
                 else:
                     # 本地環境，嘗試自動下載
-                    print(f"本地環境，使用自動下載的Chrome和ChromeDriver")
-                    sys.stdout.flush()
+                    logger.debug(f"本地環境，使用自動下載的Chrome和ChromeDriver")
                     service = Service(ChromeDriverManager().install())
                 
                 # 創建WebDriver實例（添加重試機制）
-                print("正在創建Chrome WebDriver實例...")
-                sys.stdout.flush()
+                logger.info("正在創建Chrome WebDriver實例...")
                 
                 max_retries = 3
                 retry_count = 0
@@ -146,30 +408,26 @@ class OpenRiceChecker:
                 while retry_count < max_retries and not driver_created:
                     try:
                         if retry_count > 0:
-                            print(f"重試創建WebDriver ({retry_count}/{max_retries})...")
+                            logger.debug(f"重試創建WebDriver ({retry_count}/{max_retries})...")
                             time.sleep(2)  # 等待一下再重試
-                            sys.stdout.flush()
                         
                         self.driver = webdriver.Chrome(service=service, options=chrome_options)
                         
                         # 設置超時時間
-                        self.driver.set_page_load_timeout(30)
+                        self.driver.set_page_load_timeout(self.PAGE_LOAD_TIMEOUT)
                         self.driver.implicitly_wait(10)
                         
                         # 測試WebDriver是否正常工作（訪問一個簡單頁面）
-                        print("測試WebDriver連接...")
-                        sys.stdout.flush()
+                        logger.debug("測試WebDriver連接...")
                         self.driver.get("data:text/html,<html><body>Test</body></html>")
                         
                         driver_created = True
-                        print("=" * 50)
-                        print("✓ Selenium初始化成功！已啟用（可處理JavaScript動態內容）")
-                        print("=" * 50)
-                        sys.stdout.flush()
+                        logger.info("=" * 50)
+                        logger.info("✓ Selenium初始化成功！已啟用（可處理JavaScript動態內容）")
+                        logger.info("=" * 50)
                     except Exception as e:
                         retry_count += 1
-                        print(f"創建WebDriver失敗 (嘗試 {retry_count}/{max_retries}): {e}")
-                        sys.stdout.flush()
+                        logger.warning(f"創建WebDriver失敗 (嘗試 {retry_count}/{max_retries}): {e}")
                         
                         if retry_count >= max_retries:
                             raise Exception(f"創建WebDriver失敗，已重試{max_retries}次: {e}")
@@ -182,16 +440,13 @@ class OpenRiceChecker:
                                 pass
                             self.driver = None
             except Exception as e:
-                print("=" * 50)
-                print(f"✗ Selenium初始化失敗: {e}")
-                print("=" * 50)
-                import traceback
-                print("完整錯誤堆棧:")
-                print(traceback.format_exc())
-                print("=" * 50)
-                print("將使用requests（可能無法處理JavaScript動態內容）")
-                print("=" * 50)
-                sys.stdout.flush()
+                logger.warning("=" * 50)
+                logger.warning(f"✗ Selenium初始化失敗: {e}")
+                logger.warning("=" * 50)
+                logger.debug("完整錯誤堆棧:", exc_info=True)
+                logger.warning("=" * 50)
+                logger.warning("將使用requests（可能無法處理JavaScript動態內容）")
+                logger.warning("=" * 50)
                 self.use_selenium = False
                 self.driver = None
         else:
@@ -200,10 +455,11 @@ class OpenRiceChecker:
         # 無論是否使用Selenium，都需要初始化session（用於resolve_short_url等操作）
         self.session = requests.Session()
         # 啟用連接池和keep-alive，提高性能
+        # 重試由request_with_retry處理（限速+退避），adapter本身不重試
         adapter = requests.adapters.HTTPAdapter(
             pool_connections=10,  # 連接池大小
             pool_maxsize=20,      # 最大連接數
-            max_retries=2,        # 重試次數
+            max_retries=0,
             pool_block=False      # 非阻塞
         )
         self.session.mount('http://', adapter)
@@ -212,152 +468,99 @@ class OpenRiceChecker:
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
             'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+            'Accept-Encoding': accept_encoding(),  # 只要求本機能解壓的編碼（沒有brotli庫就不要求br）
             'Connection': 'keep-alive'  # 保持連接
         })
     
     def __del__(self):
         """清理資源"""
-        if hasattr(self, 'driver') and self.driver:
+        try:
+            self.close()
+        except:
+            pass
+    
+    def close(self):
+        """關閉瀏覽器（webdriver.Chrome或共用Chromium中的browser context）"""
+        if getattr(self, 'driver', None):
             try:
                 self.driver.quit()
-            except:
+            except Exception:
                 pass
+            self.driver = None
+        if getattr(self, 'browser_session', None) is not None:
+            self.browser_session.close()
+            self.browser_session = None
     
-    def load_restaurants(self):
-        """從Excel載入餐廳資料"""
+    def _open_browser_session(self):
+        """在共用的Chromium中開啟本檢查器的browser context（失敗時改用webdriver.Chrome）"""
+        from browser_pool import PLAYWRIGHT_AVAILABLE, get_shared_browser
+        if not PLAYWRIGHT_AVAILABLE:
+            logger.warning("Playwright未安裝，改用webdriver.Chrome（pip install playwright && playwright install chromium）")
+            return
         try:
-            df = pd.read_excel(self.excel_file)
-            # 檢查必要的欄位是否存在
-            if 'URL' not in df.columns:
-                # 嘗試其他可能的欄位名稱
-                possible_url_cols = ['網址', '網址', 'url', '連結', '連結']
-                url_col = None
-                for col in possible_url_cols:
-                    if col in df.columns:
-                        url_col = col
-                        break
-                if url_col:
-                    df['URL'] = df[url_col]
-                else:
-                    raise ValueError("Excel檔案必須包含'URL'欄位（或'網址'等）")
-            
-            if '餐廳名稱' not in df.columns:
-                # 嘗試其他可能的欄位名稱
-                possible_name_cols = ['餐廳名稱', '餐厅名称', '名稱', '名称', 'name', 'Name']
-                name_col = None
-                for col in possible_name_cols:
-                    if col in df.columns:
-                        name_col = col
-                        break
-                if name_col:
-                    df['餐廳名稱'] = df[name_col]
-                else:
-                    raise ValueError("Excel檔案必須包含'餐廳名稱'欄位（或'名稱'等）")
-            
-            return df
+            self.browser_session = get_shared_browser().new_session(user_agent=BROWSER_USER_AGENT)
+            logger.info("✓ 已在共用的Chromium中開啟browser context（Playwright）")
         except Exception as e:
-            print(f"讀取Excel檔案錯誤: {e}")
-            return None
+            logger.warning(f"✗ 開啟Playwright browser context失敗: {e}，改用webdriver.Chrome")
+            logger.debug("完整錯誤堆棧:", exc_info=True)
+            self.browser_session = None
     
-    def check_chinese_name(self, soup):
-        """檢查中文餐廳名稱"""
-        # OpenRice通常使用特定的class或id來顯示中文名稱
-        selectors = [
-            'h1[class*="name"]',
-            '.restaurant-name',
-            'h1',
-            '[class*="中文"]',
-            '[data-name]',
-            '.poi-name',
-            '[class*="poi-name"]',
-            '[class*="poi"] h1',  # 更廣泛的選擇器
-            'h1.poi-name',  # 組合選擇器
-            '[class*="title"] h1',  # 標題區域的h1
-        ]
-        
-        print("  檢查中文名稱...")
-        sys.stdout.flush()
+    def load_restaurants(self):
+        """從Excel載入餐廳資料"""
+        return load_restaurant_sheet(self.excel_file)
+    
+    def check_chinese_name(self, facts):
+        """檢查中文餐廳名稱
+        :param facts: 主頁面的PageFacts
+        """
+        # OpenRice通常使用特定的class或id來顯示中文名稱（選擇器見 CHINESE_NAME_SELECTORS）
+        logger.debug("  檢查中文名稱...")
         
-        for selector in selectors:
-            try:
-                element = soup.select_one(selector)
-                if element:
-                    text = element.get_text(strip=True)
-                    print(f"    找到元素 ({selector}): {text[:50]}...")
-                    sys.stdout.flush()
-                    # 檢查是否包含中文字元
-                    if text and any('\u4e00' <= char <= '\u9fff' for char in text):
-                        print(f"  ✓ 找到中文名稱: {text}")
-                        sys.stdout.flush()
-                        return True, text
-            except Exception as e:
-                print(f"    選擇器 {selector} 檢查失敗: {e}")
-                sys.stdout.flush()
+        for selector in CHINESE_NAME_SELECTORS:
+            text = facts.first_text.get(selector)
+            if text is None:
                 continue
+            logger.debug(f"    找到元素 ({selector}): {text[:50]}...")
+            # 檢查是否包含中文字元
+            if text and _has_chinese(text):
+                logger.debug(f"  ✓ 找到中文名稱: {text}")
+                return True, text
         
         # 如果所有選擇器都失敗，嘗試查找所有h1標籤
-        try:
-            all_h1 = soup.find_all('h1')
-            for h1 in all_h1:
-                text = h1.get_text(strip=True)
-                if text and any('\u4e00' <= char <= '\u9fff' for char in text):
-                    print(f"  ✓ 在h1標籤中找到中文名稱: {text}")
-                    sys.stdout.flush()
-                    return True, text
-        except Exception as e:
-            print(f"  查找h1標籤失敗: {e}")
-            sys.stdout.flush()
+        for text in facts.h1_texts:
+            if text and _has_chinese(text):
+                logger.debug(f"  ✓ 在h1標籤中找到中文名稱: {text}")
+                return True, text
         
-        print("  ✗ 未找到中文名稱")
-        sys.stdout.flush()
+        logger.debug("  ✗ 未找到中文名稱")
         return False, None
     
-    def check_english_name(self, soup):
-        """檢查英文餐廳名稱"""
-        # 查找英文名稱，通常在中文名稱附近或特定位置
-        selectors = [
-            '.pdhs-en-section',  # OpenRice特定的英文名稱類
-            '[class*="pdhs-en-section"]',
-            '[class*="english"]',
-            '[class*="en-name"]',
-            '[class*="english-name"]',
-            'h2',
-            '.restaurant-name-en',
-            '[class*="name-en"]',
-            '[class*="poi"] h2',  # 更廣泛的選擇器
-            'h2.poi-name-en',  # 組合選擇器
-        ]
-        
-        print("  檢查英文名稱...")
-        sys.stdout.flush()
+    def check_english_name(self, facts):
+        """檢查英文餐廳名稱
+        :param facts: 主頁面的PageFacts
+        """
+        # 查找英文名稱，通常在中文名稱附近或特定位置（選擇器見 ENGLISH_NAME_SELECTORS）
+        logger.debug("  檢查英文名稱...")
         
-        for selector in selectors:
-            try:
-                element = soup.select_one(selector)
-                if element:
-                    text = element.get_text(strip=True)
-                    print(f"    找到元素 ({selector}): {text[:50]}...")
-                    sys.stdout.flush()
-                    if text:
-                        # 檢查是否主要是英文字元（至少50%是英文字母）
-                        english_chars = sum(1 for c in text if c.isalpha() and ord(c) < 128)
-                        chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
-                        total_chars = len([c for c in text if c.isalnum()])
-                        
-                        # 必須主要是英文（英文字元數 > 中文字元數，且至少3個英文字元）
-                        if total_chars > 0 and english_chars >= 3 and english_chars > chinese_chars:
-                            print(f"  ✓ 找到英文名稱: {text}")
-                            sys.stdout.flush()
-                            return True, text
-            except Exception as e:
-                print(f"    選擇器 {selector} 檢查失敗: {e}")
-                sys.stdout.flush()
+        for selector in ENGLISH_NAME_SELECTORS:
+            text = facts.first_text.get(selector)
+            if text is None:
                 continue
+            logger.debug(f"    找到元素 ({selector}): {text[:50]}...")
+            if text:
+                # 檢查是否主要是英文字元（至少50%是英文字母）
+                english_chars = sum(1 for c in text if c.isalpha() and ord(c) < 128)
+                chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+                total_chars = len([c for c in text if c.isalnum()])
+                
+                # 必須主要是英文（英文字元數 > 中文字元數，且至少3個英文字元）
+                if total_chars > 0 and english_chars >= 3 and english_chars > chinese_chars:
+                    logger.debug(f"  ✓ 找到英文名稱: {text}")
+                    return True, text
         
         # 檢查h1標籤中是否同時包含中英文
-        h1 = soup.select_one('h1')
-        if h1:
-            text = h1.get_text(strip=True)
+        if facts.h1_texts:
+            text = facts.h1_texts[0]
             if text:
                 # 檢查英文和中文的比例
                 english_chars = sum(1 for c in text if c.isalpha() and ord(c) < 128)
@@ -373,10 +576,59 @@ class OpenRiceChecker:
         
         return False, None
     
-    def check_category_page(self, base_url, category_path):
+    def get_photo_inventory(self, facts, base_url):
+        """一次取得各照片分類的數量 {分類: 數量}
+        先使用主頁面分類連結上的數量，不完整時載入一次 /photos 照片總覽頁；
+        取不到數量的分類不在結果中（由各項檢查載入分類頁面判斷）
+        :param facts: 主頁面的PageFacts
+        :param base_url: 餐廳的實際URL
+        """
+        inventory = dict(facts.category_counts)
+        if all(category in inventory for category in PHOTO_CATEGORIES):
+            return inventory
+        photos_url = restaurant_base_url(base_url) + '/photos'
+        try:
+            photos_facts = self.get_page_facts(photos_url, fast_mode=True)
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            logger.debug(f"  載入照片總覽頁失敗: {e}，改為逐一載入分類頁面")
+            return inventory
+        for category, count in photos_facts.category_counts.items():
+            inventory.setdefault(category, count)
+        logger.debug(f"  照片總覽: {inventory}")
+        return inventory
+    
+    def _inventory_answer(self, inventory, category):
+        """由分類數量判斷是否有照片/影片，沒有該分類的數量時回傳None（需要載入分類頁面）"""
+        count = inventory.get(category) if inventory else None
+        if count is None:
+            if inventory is not None:
+                self.inventory_stats['fallback'] += 1
+                CACHE_LOOKUPS.inc(cache='photo_inventory', result='miss')
+            return None
+        self.inventory_stats['answered'] += 1
+        CACHE_LOOKUPS.inc(cache='photo_inventory', result='hit')
+        logger.debug(f"  照片總覽: {category} 分類有 {count} 個項目")
+        return count > 0
+    
+    def _note_media(self, item, src):
+        """記錄通過檢查的媒體URL（每個項目只保留驗證需要的數量）"""
+        if self.media_verifier is None:
+            return
+        urls = self._media_urls.setdefault(item, [])
+        url = 'https:' + src if src.startswith('//') else src
+        if len(urls) < self.media_verifier.sample_size and url.startswith('http') and url not in urls:
+            urls.append(url)
+    
+    def check_category_page(self, base_url, category_path, inventory=None):
         """檢查特定分類頁面是否有實際照片或影片
         category_path: 'decor', 'menu', 'food', 'videos'
+        :param inventory: 照片總覽的分類數量（get_photo_inventory），有該分類的數量時不載入分類頁面
         """
+        answer = self._inventory_answer(inventory, category_path)
+        if answer is not None:
+            return answer
         try:
             # 構建分類頁面URL
             if '/photos' in base_url:
@@ -388,234 +640,140 @@ class OpenRiceChecker:
             # 優化：對於非videos分類，使用更快的檢查方式
             if category_path != 'videos':
                 # 對於照片分類，可以減少等待時間
-                soup = self.get_page_soup(category_url, fast_mode=True)
+                facts = self.get_page_facts(category_url, fast_mode=True)
             else:
-                soup = self.get_page_soup(category_url, fast_mode=False)
+                facts = self.get_page_facts(category_url, fast_mode=False)
             
             # 對於videos分類，檢查是否有實際的影片
             if category_path == 'videos':
-                print(f"  檢查影片頁面: {category_url}")
-                sys.stdout.flush()
+                logger.debug(f"  檢查影片頁面: {category_url}")
                 
-                # 先檢查是否有"沒有影片"的提示
-                page_text = soup.get_text()
-                empty_keywords = [
-                    '此餐廳暫時沒有影片',
-                    '此餐厅暂时没有视频',
-                    '暫無影片',
-                    '暂无视频',
-                    '沒有影片',
-                    '没有视频',
-                    '尚無影片',
-                    '尚无视频',
-                    'no video',
-                    'no videos',
-                    '暫時沒有',
-                    '暂时没有',
-                    '尚無相關',
-                    '暂无相关'
-                ]
-                for keyword in empty_keywords:
-                    if keyword in page_text:
-                        print(f"  ✗ 找到空狀態關鍵字: {keyword}")
-                        sys.stdout.flush()
-                        return False
-                
-                # 檢查是否有空狀態的class或id
-                empty_selectors = [
-                    '[class*="empty"]',
-                    '[class*="no-video"]',
-                    '[class*="no_video"]',
-                    '[id*="empty"]',
-                    '[id*="no-video"]'
-                ]
-                for selector in empty_selectors:
-                    empty_elements = soup.select(selector)
-                    if empty_elements:
-                        for elem in empty_elements:
-                            elem_text = elem.get_text()
-                            if any(keyword in elem_text for keyword in empty_keywords):
-                                print(f"  ✗ 找到空狀態元素: {selector}")
-                                sys.stdout.flush()
-                                return False
+                # 先檢查是否有"沒有影片"的提示（空狀態元素的文字也包含在整頁文字中）
+                keyword = facts.has_empty_keyword(VIDEO_EMPTY_KEYWORDS)
+                if keyword:
+                    logger.debug(f"  ✗ 找到空狀態關鍵字: {keyword}")
+                    return False
                 
                 # 檢查video標籤
-                videos = soup.find_all('video')
-                if len(videos) > 0:
-                    print(f"  ✓ 找到 {len(videos)} 個video標籤")
-                    sys.stdout.flush()
+                if facts.video_count > 0:
+                    logger.debug(f"  ✓ 找到 {facts.video_count} 個video標籤")
                     return True
                 
                 # 檢查iframe是否有有效的影片來源
-                iframes = soup.find_all('iframe')
                 valid_iframe_count = 0
-                for iframe in iframes:
-                    src = iframe.get('src', '')
+                for src in facts.iframe_srcs:
                     if src and any(platform in src.lower() for platform in ['youtube.com', 'youtu.be', 'vimeo.com', 'video', 'youku.com', 'tiktok.com', 'instagram.com']):
                         # 進一步驗證：確保是有效的影片URL
                         if not any(exclude in src.lower() for exclude in ['placeholder', 'logo', 'avatar']):
                             valid_iframe_count += 1
-                            print(f"  ✓ 找到有效的影片iframe: {src[:80]}...")
-                            sys.stdout.flush()
+                            logger.debug(f"  ✓ 找到有效的影片iframe: {src[:80]}...")
                 
                 if valid_iframe_count > 0:
                     return True
                 
                 # 檢查影片容器中是否有影片縮圖（更嚴格的檢查）
-                video_containers = soup.select('[class*="video"], [class*="reel"], [class*="media"]')
                 video_thumbnail_count = 0
-                all_found_imgs = []
+                # 只保留圖片數量與前3個URL（除錯日誌用）
+                found_img_count = 0
+                sample_imgs = []
                 
-                for container in video_containers:
-                    imgs = container.find_all('img')
-                    for img in imgs:
-                        src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original')
-                        if src:
-                            all_found_imgs.append(src)
-                            # 排除placeholder、logo、avatar和門面照片
-                            if ('placeholder' not in src.lower() and 
-                                'logo' not in src.lower() and
-                                'avatar' not in src.lower() and
-                                'doorphoto' not in src.lower() and  # 排除門面照片
-                                ('http' in src or src.startswith('//'))):
-                                # 更嚴格的檢查：必須是明確的影片CDN或包含video/reel關鍵字
-                                if ('c-vod.orstatic.com' in src or  # 影片CDN（最可靠）
-                                    ('orstatic.com' in src and '/video/' in src.lower()) or
-                                    ('orstatic.com' in src and '/reel/' in src.lower())):
-                                    # 進一步檢查alt屬性，排除門面照片和其他非影片內容
-                                    alt = img.get('alt', '').lower()
-                                    if ('door' not in alt and 
-                                        '門面' not in alt and 
-                                        '门面' not in alt and
-                                        'menu' not in alt and
-                                        '菜單' not in alt and
-                                        '菜单' not in alt):
-                                        video_thumbnail_count += 1
-                                        print(f"  ✓ 找到影片縮圖 ({video_thumbnail_count}): {src[:80]}...")
-                                        sys.stdout.flush()
+                for img in facts.images_in('video'):
+                    src = img['src']
+                    if src:
+                        found_img_count += 1
+                        if len(sample_imgs) < 3:
+                            sample_imgs.append(src)
+                        # 排除placeholder、logo、avatar和門面照片
+                        if ('placeholder' not in src.lower() and 
+                            'logo' not in src.lower() and
+                            'avatar' not in src.lower() and
+                            'doorphoto' not in src.lower() and  # 排除門面照片
+                            ('http' in src or src.startswith('//'))):
+                            # 更嚴格的檢查：必須是明確的影片CDN或包含video/reel關鍵字
+                            if ('c-vod.orstatic.com' in src or  # 影片CDN（最可靠）
+                                ('orstatic.com' in src and '/video/' in src.lower()) or
+                                ('orstatic.com' in src and '/reel/' in src.lower())):
+                                # 進一步檢查alt屬性，排除門面照片和其他非影片內容
+                                if not _is_door_or_menu_alt(img['alt']):
+                                    video_thumbnail_count += 1
+                                    self._note_media('相關影片', src)
+                                    logger.debug(f"  ✓ 找到影片縮圖 ({video_thumbnail_count}): {src[:80]}...")
                 
                 # 如果沒有在容器中找到，檢查所有圖片（但更嚴格）
                 if video_thumbnail_count == 0:
-                    print("  影片容器中未找到，檢查所有圖片...")
-                    sys.stdout.flush()
-                    all_imgs = soup.find_all('img')
-                    for img in all_imgs:
-                        src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original')
-                        if src:
-                            # 只檢查明確的影片CDN
-                            if 'c-vod.orstatic.com' in src:  # 最可靠的影片CDN
-                                alt = img.get('alt', '').lower()
-                                if ('door' not in alt and 
-                                    '門面' not in alt and 
-                                    '门面' not in alt and
-                                    'menu' not in alt and
-                                    '菜單' not in alt and
-                                    '菜单' not in alt):
-                                    video_thumbnail_count += 1
-                                    print(f"  ✓ 找到影片縮圖 ({video_thumbnail_count}): {src[:80]}...")
-                                    sys.stdout.flush()
+                    logger.debug("  影片容器中未找到，檢查所有圖片...")
+                    for img in facts.images:
+                        src = img['src']
+                        # 只檢查明確的影片CDN
+                        if src and 'c-vod.orstatic.com' in src:  # 最可靠的影片CDN
+                            if not _is_door_or_menu_alt(img['alt']):
+                                video_thumbnail_count += 1
+                                self._note_media('相關影片', src)
+                                logger.debug(f"  ✓ 找到影片縮圖 ({video_thumbnail_count}): {src[:80]}...")
                 
                 if video_thumbnail_count > 0:
-                    print(f"  ✓ 影片檢查通過，找到 {video_thumbnail_count} 個影片縮圖")
-                    sys.stdout.flush()
+                    logger.debug(f"  ✓ 影片檢查通過，找到 {video_thumbnail_count} 個影片縮圖")
                     return True
                 else:
-                    print(f"  ✗ 影片檢查失敗，未找到有效影片")
-                    print(f"  找到的圖片URL數量: {len(all_found_imgs)}")
-                    if len(all_found_imgs) > 0:
-                        print(f"  前3個圖片URL示例:")
-                        for i, img_url in enumerate(all_found_imgs[:3]):
-                            print(f"    {i+1}. {img_url[:100]}")
-                    sys.stdout.flush()
+                    logger.debug(f"  ✗ 影片檢查失敗，未找到有效影片")
+                    logger.debug(f"  找到的圖片URL數量: {found_img_count}")
+                    if sample_imgs:
+                        logger.debug(f"  前3個圖片URL示例:")
+                        for i, img_url in enumerate(sample_imgs):
+                            logger.debug(f"    {i+1}. {img_url[:100]}")
                     return False
             
             # 對於照片分類（decor, menu, food），檢查是否有實際照片
-            # 檢查是否有實際的照片（不是placeholder）
-            photo_list_selectors = [
-                '[class*="media-list"]',
-                '[class*="photo-list"]',
-                '[class*="image-list"]',
-                '[class*="gallery"]',
-                '[class*="photo-grid"]'
-            ]
-            
+            # 方法1: 檢查照片列表容器中的圖片（容器選擇器見 PHOTO_LIST_SELECTORS）
             photo_count = 0
-            
-            # 方法1: 檢查照片列表容器中的圖片
-            for selector in photo_list_selectors:
-                containers = soup.select(selector)
-                for container in containers:
-                    imgs = container.find_all('img')
-                    for img in imgs:
-                        src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original')
-                        if src:
-                            # 排除placeholder圖片
-                            if ('placeholder' not in src.lower() and 
-                                'logo' not in src.lower() and
-                                'avatar' not in src.lower() and
-                                ('http' in src or src.startswith('//'))):
-                                # 檢查是否是OpenRice的圖片URL
-                                if ('orstatic.com' in src or 
-                                    '/photo/' in src or
-                                    'userphoto' in src):
-                                    photo_count += 1
+            for img in facts.images_in('photo_list'):
+                src = img['src']
+                # 排除placeholder圖片，並檢查是否是OpenRice的圖片URL
+                if src and _is_photo_src(src) and ('orstatic.com' in src or '/photo/' in src or 'userphoto' in src):
+                    photo_count += 1
+                    self._note_media(CATEGORY_ITEMS[category_path], src)
             
             # 方法2: 如果照片列表容器中沒有找到，檢查所有圖片
             if photo_count == 0:
-                all_imgs = soup.find_all('img')
-                for img in all_imgs:
-                    src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original')
-                    if src:
-                        # 排除placeholder和logo等非照片圖片
-                        if ('placeholder' not in src.lower() and 
-                            'logo' not in src.lower() and
-                            'avatar' not in src.lower() and
-                            ('http' in src or src.startswith('//'))):
-                            # 檢查是否是使用者上傳的照片
-                            if ('userphoto' in src or 
-                                '/photo/' in src or
-                                'orstatic.com/userphoto' in src):
-                                photo_count += 1
+                for img in facts.images:
+                    src = img['src']
+                    # 排除placeholder和logo等非照片圖片，檢查是否是使用者上傳的照片
+                    if src and _is_photo_src(src) and ('userphoto' in src or '/photo/' in src):
+                        photo_count += 1
+                        self._note_media(CATEGORY_ITEMS[category_path], src)
             
             # 至少需要1張實際照片才算有照片
             return photo_count > 0
             
+        except BudgetExceeded:
+            raise
         except Exception as e:
-            print(f"  檢查分類頁面 '/photos/{category_path}' 時出錯: {e}")
+            logger.warning(f"  檢查分類頁面 '/photos/{category_path}' 時出錯: {e}")
             return False
     
-    def check_facade_photo(self, soup, base_url=None):
-        """檢查門面照片（透過檢查 /photos/decor 頁面）"""
+    def check_facade_photo(self, facts, base_url=None, inventory=None):
+        """檢查門面照片（透過照片總覽的分類數量或 /photos/decor 頁面）"""
         if base_url:
             # 檢查 /photos/decor 頁面是否有照片
-            return self.check_category_page(base_url, 'decor')
-        
-        # 備用方法：在主頁面查找
-        img_selectors = [
-            'img[class*="facade"]',
-            'img[class*="exterior"]',
-            'img[alt*="門面"]',
-            'img[alt*="外觀"]',
-            'img[alt*="外觀"]',
-            'img[alt*="環境"]',
-            '.restaurant-photo img',
-            '.main-photo img',
-            '[class*="main-photo"] img',
-            '[class*="cover-photo"] img'
-        ]
+            return self.check_category_page(base_url, 'decor', inventory)
         
-        for selector in img_selectors:
-            img = soup.select_one(selector)
-            if img:
-                src = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if src and 'http' in src:
+        # 備用方法：在主頁面查找門面/外觀/環境圖片或主照片區域的圖片
+        for img in facts.images:
+            class_name = img['class'].lower()
+            if ('facade' in class_name or 'exterior' in class_name or
+                    any(keyword in img['alt'] for keyword in ['門面', '外觀', '環境']) or
+                    'main_photo' in img['containers']):
+                if img['src'] and 'http' in img['src']:
                     return True
         
         return False
     
-    def check_menu(self, soup, base_url=None):
-        """檢查菜單照片（透過檢查 /menus 頁面）"""
+    def check_menu(self, facts, base_url=None, inventory=None):
+        """檢查菜單照片（透過照片總覽的分類數量或 /menus 頁面）"""
         if base_url:
+            answer = self._inventory_answer(inventory, 'menu')
+            if answer is not None:
+                return answer
             try:
                 # 構建菜單頁面URL
                 if '/photos' in base_url:
@@ -624,180 +782,94 @@ class OpenRiceChecker:
                 else:
                     menu_url = base_url.rstrip('/') + '/menus'
                 
-                print(f"  檢查菜單頁面: {menu_url}")
-                sys.stdout.flush()
-                
-                menu_soup = self.get_page_soup(menu_url)
-                
-                # 先檢查是否有"沒有菜單"的提示
-                menu_text = menu_soup.get_text()
-                empty_keywords = [
-                    '此餐廳暫時沒有菜單',
-                    '此餐厅暂时没有菜单',
-                    '暫無菜單',
-                    '暂无菜单',
-                    '沒有菜單',
-                    '没有菜单',
-                    '尚無菜單',
-                    '尚无菜单',
-                    'no menu',
-                    '暫時沒有',
-                    '暂时没有'
-                ]
-                for keyword in empty_keywords:
-                    if keyword in menu_text:
-                        print(f"  ✗ 找到空狀態關鍵字: {keyword}")
-                        sys.stdout.flush()
-                        return False  # 明確提示沒有菜單
+                logger.debug(f"  檢查菜單頁面: {menu_url}")
                 
-                # 檢查是否有空狀態的class或id
-                empty_selectors = [
-                    '[class*="empty"]',
-                    '[class*="no-menu"]',
-                    '[class*="no_menu"]',
-                    '[id*="empty"]',
-                    '[id*="no-menu"]'
-                ]
-                for selector in empty_selectors:
-                    empty_elements = menu_soup.select(selector)
-                    if empty_elements:
-                        # 檢查這些元素中是否包含"沒有菜單"的文字
-                        for elem in empty_elements:
-                            elem_text = elem.get_text()
-                            if any(keyword in elem_text for keyword in empty_keywords):
-                                print(f"  ✗ 找到空狀態元素: {selector}")
-                                sys.stdout.flush()
-                                return False
+                menu_facts = self.get_page_facts(menu_url)
                 
-                # 檢查是否有實際的照片（不是placeholder）
-                photo_list_selectors = [
-                    '[class*="media-list"]',
-                    '[class*="photo-list"]',
-                    '[class*="image-list"]',
-                    '[class*="gallery"]',
-                    '[class*="photo-grid"]',
-                    '[class*="menu"]',  # 菜單相關的容器
-                    '[class*="menu-photo"]',  # 菜單照片容器
-                    '[class*="menu-item"]',  # 菜單項目
-                ]
+                # 先檢查是否有"沒有菜單"的提示（空狀態元素的文字也包含在整頁文字中）
+                keyword = menu_facts.has_empty_keyword(MENU_EMPTY_KEYWORDS)
+                if keyword:
+                    logger.debug(f"  ✗ 找到空狀態關鍵字: {keyword}")
+                    return False  # 明確提示沒有菜單
                 
                 photo_count = 0
-                all_found_imgs = []
+                # 只保留圖片數量與前3個URL（除錯日誌用）
+                found_img_count = 0
+                sample_imgs = []
                 
-                # 方法1: 檢查照片列表容器中的圖片
-                for selector in photo_list_selectors:
-                    containers = menu_soup.select(selector)
-                    for container in containers:
-                        imgs = container.find_all('img')
-                        for img in imgs:
-                            src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original') or img.get('data-lazy')
-                            if src:
-                                all_found_imgs.append(src)
-                                # 排除placeholder圖片、logo、avatar
-                                if ('placeholder' not in src.lower() and 
-                                    'logo' not in src.lower() and
-                                    'avatar' not in src.lower() and
-                                    ('http' in src or src.startswith('//'))):
-                                    # 更寬鬆的檢查：只要是有效的圖片URL，且不是門面照片
-                                    if 'doorphoto' not in src.lower():
-                                        alt = img.get('alt', '').lower()
-                                        if 'door' not in alt and '門面' not in alt and '门面' not in alt:
-                                            # 優先檢查OpenRice的圖片URL
-                                            if ('orstatic.com' in src or 
-                                                '/photo/' in src or
-                                                'userphoto' in src or
-                                                'openrice' in src.lower()):
-                                                photo_count += 1
-                                                print(f"  ✓ 找到菜單照片 ({photo_count}): {src[:80]}...")
-                                                sys.stdout.flush()
+                # 方法1: 檢查照片列表容器與菜單容器中的圖片
+                for img in menu_facts.images_in('menu_list'):
+                    src = img['src']
+                    if src:
+                        found_img_count += 1
+                        if len(sample_imgs) < 3:
+                            sample_imgs.append(src)
+                        # 排除placeholder圖片、logo、avatar與門面照片
+                        if _is_photo_src(src) and 'doorphoto' not in src.lower() and not _is_door_alt(img['alt']):
+                            # 優先檢查OpenRice的圖片URL
+                            if ('orstatic.com' in src or 
+                                '/photo/' in src or
+                                'userphoto' in src or
+                                'openrice' in src.lower()):
+                                photo_count += 1
+                                self._note_media('菜單', src)
+                                logger.debug(f"  ✓ 找到菜單照片 ({photo_count}): {src[:80]}...")
                 
                 # 方法2: 如果照片列表容器中沒有找到，檢查所有圖片（更寬鬆的條件）
                 if photo_count == 0:
-                    print("  照片列表容器中未找到，檢查所有圖片...")
-                    sys.stdout.flush()
-                    all_imgs = menu_soup.find_all('img')
-                    print(f"  找到 {len(all_imgs)} 張圖片")
-                    sys.stdout.flush()
+                    logger.debug("  照片列表容器中未找到，檢查所有圖片...")
+                    logger.debug(f"  找到 {len(menu_facts.images)} 張圖片")
                     
-                    for img in all_imgs:
-                        src = img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original') or img.get('data-lazy')
-                        if src:
-                            # 排除placeholder和logo等非照片圖片
-                            if ('placeholder' not in src.lower() and 
-                                'logo' not in src.lower() and
-                                'avatar' not in src.lower() and
-                                ('http' in src or src.startswith('//'))):
-                                # 排除門面照片（doorphoto）
-                                if 'doorphoto' not in src.lower():
-                                    alt = img.get('alt', '').lower()
-                                    if 'door' not in alt and '門面' not in alt and '门面' not in alt:
-                                        # 更寬鬆的條件：只要是OpenRice相關的圖片URL
-                                        if ('orstatic.com' in src or 
-                                            '/photo/' in src or
-                                            'userphoto' in src or
-                                            'openrice' in src.lower() or
-                                            'menu' in src.lower()):  # 包含menu關鍵字的圖片
-                                            photo_count += 1
-                                            print(f"  ✓ 找到菜單照片 ({photo_count}): {src[:80]}...")
-                                            sys.stdout.flush()
+                    for img in menu_facts.images:
+                        src = img['src']
+                        if src and _is_photo_src(src) and 'doorphoto' not in src.lower() and not _is_door_alt(img['alt']):
+                            # 更寬鬆的條件：只要是OpenRice相關的圖片URL
+                            if ('orstatic.com' in src or 
+                                '/photo/' in src or
+                                'userphoto' in src or
+                                'openrice' in src.lower() or
+                                'menu' in src.lower()):  # 包含menu關鍵字的圖片
+                                photo_count += 1
+                                self._note_media('菜單', src)
+                                logger.debug(f"  ✓ 找到菜單照片 ({photo_count}): {src[:80]}...")
                 
                 if photo_count > 0:
-                    print(f"  ✓ 菜單檢查通過，找到 {photo_count} 張菜單照片")
-                    sys.stdout.flush()
+                    logger.debug(f"  ✓ 菜單檢查通過，找到 {photo_count} 張菜單照片")
                 else:
-                    print(f"  ✗ 菜單檢查失敗，未找到有效照片")
-                    print(f"  找到的圖片URL數量: {len(all_found_imgs)}")
-                    if len(all_found_imgs) > 0:
-                        print(f"  前3個圖片URL示例:")
-                        for i, img_url in enumerate(all_found_imgs[:3]):
-                            print(f"    {i+1}. {img_url[:100]}")
-                    sys.stdout.flush()
+                    logger.debug(f"  ✗ 菜單檢查失敗，未找到有效照片")
+                    logger.debug(f"  找到的圖片URL數量: {found_img_count}")
+                    if sample_imgs:
+                        logger.debug(f"  前3個圖片URL示例:")
+                        for i, img_url in enumerate(sample_imgs):
+                            logger.debug(f"    {i+1}. {img_url[:100]}")
                 
                 # 至少需要1張實際照片才算有照片
                 return photo_count > 0
                 
+            except BudgetExceeded:
+                raise
             except Exception as e:
-                print(f"  檢查菜單頁面 '/menus' 時出錯: {e}")
-                import traceback
-                print(traceback.format_exc())
-                sys.stdout.flush()
+                logger.warning(f"  檢查菜單頁面 '/menus' 時出錯: {e}")
+                logger.debug("錯誤堆棧", exc_info=True)
                 return False
         
-        # 備用方法：在主頁面查找（僅作為最後手段）
-        menu_keywords = ['menu', '菜單', '菜单', '餐牌', '菜譜', '菜谱']
-        menu_selectors = [
-            '[class*="menu"]',
-            '[id*="menu"]',
-            'a[href*="menu"]',
-            '[class*="菜單"]',
-            '[class*="菜谱"]'
-        ]
-        
-        for selector in menu_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                text = element.get_text(strip=True).lower()
-                if any(keyword in text for keyword in menu_keywords):
-                    # 注意：主頁面找到菜單關鍵字不能保證有菜單照片，返回False
-                    return False
-        
+        # 備用方法：主頁面上的菜單關鍵字不能保證有菜單照片，一律視為沒有
         return False
     
-    def check_food_photos(self, soup, base_url=None):
-        """檢查餐點照片（透過檢查 /photos/food 頁面）"""
+    def check_food_photos(self, facts, base_url=None, inventory=None):
+        """檢查餐點照片（透過照片總覽的分類數量或 /photos/food 頁面）"""
         if base_url:
             # 檢查 /photos/food 頁面是否有照片
-            return self.check_category_page(base_url, 'food')
+            return self.check_category_page(base_url, 'food', inventory)
         
         # 備用方法：在主頁面查找
         food_keywords = ['food', 'dish', '餐點', '餐点', '美食', '菜式', '菜品', '料理', '食物']
-        imgs = soup.find_all('img')
         
         food_photo_count = 0
-        for img in imgs:
-            src = img.get('src', '') or img.get('data-src', '') or img.get('data-lazy-src', '')
-            alt = img.get('alt', '').lower()
-            class_name = ' '.join(img.get('class', [])).lower()
+        for img in facts.images:
+            src = img['src']
+            alt = img['alt'].lower()
+            class_name = img['class'].lower()
             
             if src and 'http' in src:
                 if (any(keyword in alt for keyword in food_keywords) or 
@@ -807,43 +879,19 @@ class OpenRiceChecker:
         # 如果有多個餐點照片，認為有餐點照片
         return food_photo_count >= 2
     
-    def check_videos(self, soup, base_url=None):
-        """檢查相關影片（透過檢查 /photos/videos 頁面）"""
+    def check_videos(self, facts, base_url=None, inventory=None):
+        """檢查相關影片（透過照片總覽的分類數量或 /photos/videos 頁面）"""
         if base_url:
             # 檢查 /photos/videos 頁面是否有實際影片
-            return self.check_category_page(base_url, 'videos')
+            return self.check_category_page(base_url, 'videos', inventory)
         
-        # 備用方法：在主頁面查找
-        # 查找影片元素
-        video_selectors = [
-            'video',
-            'iframe[src*="youtube"]',
-            'iframe[src*="vimeo"]',
-            'iframe[src*="video"]',
-            '[class*="video"]',
-            '[id*="video"]',
-            '[class*="youtube"]'
-        ]
+        # 備用方法：在主頁面查找影片元素或影片平台連結（見 VIDEO_MARKUP_SELECTORS）
+        if facts.video_markup:
+            return True
         
-        for selector in video_selectors:
-            elements = soup.select(selector)
-            if elements:
-                return True
-        
-        # 檢查是否有影片相關的連結
-        links = soup.find_all('a', href=True)
-        for link in links:
-            href = link.get('href', '').lower()
-            if any(platform in href for platform in ['youtube', 'vimeo', 'video', 'youku']):
-                return True
-        
-        # 檢查是否有影片相關的文字
-        video_keywords = ['影片', '视频', 'video', 'youtube']
-        all_text = soup.get_text().lower()
-        if any(keyword in all_text for keyword in video_keywords):
-            # 進一步檢查是否有實際的影片元素
-            if soup.find('video') or soup.find('iframe'):
-                return True
+        # 頁面提到影片時，進一步檢查是否有實際的影片元素
+        if facts.mentions_video and (facts.video_count or facts.iframe_srcs):
+            return True
         
         return False
     
@@ -852,15 +900,17 @@ class OpenRiceChecker:
         例如: https://s.openrice.com/cHRSmW2pOW700 -> https://tw.openrice.com/zh/taichung/r-...
         """
         # 檢查是否為縮短URL
-        if 's.openrice.com' in url:
+        if urlsplit(url).hostname in self.SHORT_URL_HOSTS:
+            if self.replaying:
+                return self.page_store.load_redirect(url) or url
             try:
                 # 先嘗試HEAD請求（更輕量）
                 try:
-                    response = self.session.head(url, timeout=8, allow_redirects=True)
+                    response = self._http_request('HEAD', url, timeout=8, allow_redirects=True)
                     actual_url = response.url
                 except:
                     # 如果HEAD失敗，使用GET請求
-                    response = self.session.get(url, timeout=8, allow_redirects=True, stream=True)
+                    response = self._http_request('GET', url, timeout=8, allow_redirects=True, stream=True)
                     actual_url = response.url
                     response.close()  # 關閉連接，不讀取內容
                 
@@ -870,243 +920,660 @@ class OpenRiceChecker:
                 
                 # 確保URL以/結尾（如果需要的話）
                 if actual_url != url:
-                    print(f"  縮短URL已解析: {url} -> {actual_url}")
+                    logger.debug(f"  縮短URL已解析: {url} -> {actual_url}")
+                
+                if self.page_store is not None:
+                    self.page_store.save_redirect(url, actual_url)
                 
                 return actual_url
             except Exception as e:
-                print(f"  解析縮短URL失敗: {e}，使用原始URL")
+                logger.warning(f"  解析縮短URL失敗: {e}，使用原始URL")
                 return url
         
         return url
     
+    def _http_request(self, method, url, **kwargs):
+        """經過共用限速器發出HTTP請求（可重試的失敗會自動退避重試）"""
+        return request_with_retry(self.session, method, url, limiter=self.rate_limiter,
+                                  deadline=self._deadline, **kwargs)
+    
+    def _set_page_load_timeout(self, seconds):
+        """調整Chrome的頁面載入上限（只在數值改變時送出WebDriver指令）"""
+        if abs(seconds - self._page_load_timeout) >= 0.5:
+            self.driver.set_page_load_timeout(seconds)
+            self._page_load_timeout = seconds
+    
+    def _raise_if_out_of_time(self, page_type, error):
+        """抓取失敗時若時間上限已到，改拋出BudgetExceeded（不回退、不計入斷路器）"""
+        if self._deadline.expired():
+            raise BudgetExceeded(f"抓取{page_type}頁面時超過時間上限") from error
+    
+    def _restart_driver(self):
+        """重新初始化失效的WebDriver"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+        
+        if self.driver:
+            try:
+                self.driver.quit()
+            except:
+                pass
+            self.driver = None
+        
+        chrome_options = Options()
+        chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-setuid-sandbox')
+        chrome_options.add_argument('--disable-web-security')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument('--disk-cache-size=104857600')
+        chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        
+        chrome_binary = os.environ.get('CHROMIUM_PATH', '/usr/bin/google-chrome')
+        if os.path.exists(chrome_binary):
+            chrome_options.binary_location = chrome_binary
+        
+        service = Service(ChromeDriverManager().install())
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.driver.set_page_load_timeout(self.PAGE_LOAD_TIMEOUT)
+        self._page_load_timeout = self.PAGE_LOAD_TIMEOUT
+        BROWSER_RESTARTS.inc(backend='selenium')
+        logger.info("  WebDriver重新初始化成功")
+    
+    def _probe_selenium(self):
+        """斷路器背景探測：WebDriver是否仍可使用（失效時嘗試重新初始化）"""
+        with self._driver_lock:
+            try:
+                self.driver.current_url
+                return True
+            except Exception:
+                pass
+            self._restart_driver()
+            return True
+    
+    def _probe_playwright(self):
+        """斷路器背景探測：browser context是否仍可使用（共用Chromium崩潰時重新開啟）"""
+        from browser_pool import get_shared_browser
+        with self._driver_lock:
+            try:
+                self.browser_session.current_url
+                return True
+            except Exception:
+                pass
+            self.browser_session.close()
+            self.browser_session = get_shared_browser().new_session(user_agent=BROWSER_USER_AGENT)
+            return True
+    
+    def _probe_requests(self):
+        """斷路器背景探測：最近失敗的主機是否恢復回應"""
+        url = self._last_requests_url
+        if not url:
+            return True
+        parts = urlsplit(url)
+        response = self.session.head(f"{parts.scheme}://{parts.netloc}/", timeout=5, allow_redirects=True)
+        return response.status_code not in UNHEALTHY_STATUS
+    
+    def _fetch_with_selenium(self, url, fast_mode=False, facts=False):
+        """使用Selenium獲取頁面
+        :param facts: 回傳PageFacts；script模式下在頁面中執行FACTS_SCRIPT，不傳回整個DOM
+        :return: facts為True時回傳PageFacts，否則回傳BeautifulSoup
+        """
+        logger.debug(f"  使用Selenium獲取頁面: {url}")
+        
+        # 檢查driver是否仍然有效
+        try:
+            self.driver.current_url
+        except Exception as e:
+            logger.warning(f"  WebDriver已失效: {e}，重新初始化...")
+            # 嘗試重新初始化driver
+            try:
+                self._restart_driver()
+            except Exception as init_error:
+                logger.error(f"  WebDriver重新初始化失敗: {init_error}")
+                raise Exception("WebDriver失效且無法重新初始化")
+        
+        # 訪問頁面（頁面載入上限不超過剩餘時間）
+        logger.debug("  正在訪問頁面...")
+        deadline = self._deadline
+        self._set_page_load_timeout(deadline.cap(self.PAGE_LOAD_TIMEOUT))
+        # 等待頁面載入（優化：根據模式調整等待時間）
+        wait_time = 1 if fast_mode else 2
+        timeout = 5 if fast_mode else 10
+        
+        self.rate_limiter.acquire(url, deadline)
+        load_start = time.monotonic()
+        # 同一間餐廳的子頁面優先在分頁內點擊連結切換（SPA不重新啟動，不重新下載JS/CSS）
+        if self.navigation == NAV_SPA and self._navigate_in_app(url, deadline.cap(timeout)):
+            self._last_navigation = NAV_SPA
+        else:
+            self.driver.get(url)
+            self._last_navigation = NAV_COLD
+        self.navigation_stats[self._last_navigation] += 1
+        self.rate_limiter.record(url, latency=time.monotonic() - load_start)
+        
+        logger.debug("  等待頁面載入...")
+        time.sleep(deadline.cap(wait_time))
+        
+        # 嘗試等待特定元素載入
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        try:
+            logger.debug("  等待body元素載入...")
+            WebDriverWait(self.driver, deadline.cap(timeout)).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
+            # 額外等待，確保動態內容載入
+            logger.debug("  body元素已載入，等待動態內容...")
+            time.sleep(deadline.cap(wait_time))
+        except Exception as e:
+            logger.debug(f"  警告: 等待body元素超時: {e}，繼續執行")
+            time.sleep(deadline.cap(wait_time))
+        
+        # 觸發懶加載（快速模式或時間已到時跳過）
+        if not fast_mode and not deadline.expired():
+            self._trigger_lazy_load(deadline)
+        
+        return self._browser_page_result(url, facts, self.driver.execute_script, lambda: self.driver.page_source)
+    
+    def _fetch_with_playwright(self, url, fast_mode=False, facts=False):
+        """使用共用Chromium中本檢查器的browser context獲取頁面（回傳值與 _fetch_with_selenium 相同）"""
+        logger.debug(f"  使用Playwright獲取頁面: {url}")
+        session = self.browser_session
+        deadline = self._deadline
+        timeout = 5 if fast_mode else 10
+        
+        self.rate_limiter.acquire(url, deadline)
+        load_start = time.monotonic()
+        status = None
+        # 同一間餐廳的子頁面優先在分頁內點擊連結切換
+        if self.navigation == NAV_SPA and self._navigate_in_app(url, deadline.cap(timeout)):
+            self._last_navigation = NAV_SPA
+        else:
+            status = session.goto(url, deadline.cap(self.PAGE_LOAD_TIMEOUT))
+            self._last_navigation = NAV_COLD
+        self.navigation_stats[self._last_navigation] += 1
+        self.rate_limiter.record(url, status=status, latency=time.monotonic() - load_start)
+        if status in UNHEALTHY_STATUS:
+            raise Exception(f"Playwright載入頁面回應HTTP {status}")
+        
+        # 等待load事件與網路閒置（取代固定的等待時間）
+        session.wait_for_load(deadline.cap(timeout))
+        
+        # 觸發懶加載（快速模式或時間已到時跳過）
+        if not fast_mode and not deadline.expired():
+            self._trigger_lazy_load(deadline)
+        
+        return self._browser_page_result(url, facts, session.evaluate, session.content)
+    
+    def _browser_page_result(self, url, facts, run_script, page_source):
+        """從已載入的瀏覽器頁面取得結果
+        :param run_script: 執行Selenium風格腳本的函式 (script, arg) -> 回傳值
+        :param page_source: 回傳整頁HTML的函式
+        :return: facts為True時回傳PageFacts，否則回傳BeautifulSoup
+        """
+        # 只取檢查需要的資料（錄製模式需要完整HTML存檔，仍使用page_source）
+        if facts and self.extraction == EXTRACT_SCRIPT and self.page_store is None:
+            page_facts = PageFacts.from_dict(run_script(FACTS_SCRIPT, script_arguments()), url=url)
+            logger.debug(f"  瀏覽器擷取頁面資料成功，頁面長度: {page_facts.html_length} 字元，"
+                         f"{len(page_facts.images)} 張圖片")
+            if page_facts.html_length < 1000:
+                logger.warning(f"  警告: 頁面內容可能不完整（僅{page_facts.html_length}字元）")
+                # 如果內容太短，拋出異常以回退到requests
+                raise Exception(f"瀏覽器獲取的頁面內容過短（{page_facts.html_length}字元），可能未正確載入")
+            return page_facts
+        
+        html = page_source()
+        page_length = len(html)
+        logger.debug(f"  瀏覽器獲取頁面成功，內容長度: {page_length} 字元")
+        
+        # 檢查頁面是否包含OpenRice的關鍵字
+        if 'openrice' not in html.lower() and 'openrice' not in url.lower():
+            logger.debug(f"  警告: 頁面可能不是OpenRice頁面")
+        
+        # 檢查是否包含餐廳名稱相關的元素
+        if 'poi-name' in html or 'restaurant-name' in html or 'pdhs-en-section' in html:
+            logger.debug(f"  ✓ 頁面包含餐廳名稱相關元素")
+        else:
+            logger.debug(f"  ⚠️ 頁面可能缺少餐廳名稱元素")
+        
+        # 檢查頁面內容長度
+        if page_length < 1000:
+            logger.warning(f"  警告: 頁面內容可能不完整（僅{page_length}字元）")
+            logger.debug(f"  頁面前500字元: {html[:500]}")
+            # 如果內容太短，拋出異常以回退到requests
+            raise Exception(f"瀏覽器獲取的頁面內容過短（{page_length}字元），可能未正確載入")
+        
+        if self.page_store is not None:
+            self.page_store.save_page(url, 'playwright' if self.browser_session is not None else 'selenium', html)
+        
+        return facts_from_html(html, url, page_length) if facts else parse_html(html)
+    
+    def _trigger_lazy_load(self, deadline):
+        """分段滾動直到出現第一個照片/影片或媒體節點數不再變化（已有照片時不滾動）"""
+        self.lazy_load_stats['pages'] += 1
+        max_seconds = self.LAZY_LOAD_STEP_MS * (self.LAZY_LOAD_MAX_STEPS + 1) / 1000 + 1
+        arguments = {
+            'excludedWords': list(NON_PHOTO_WORDS),
+            'stepMs': self.LAZY_LOAD_STEP_MS,
+            'maxSteps': self.LAZY_LOAD_MAX_STEPS,
+            'stableSteps': self.LAZY_LOAD_STABLE_STEPS,
+        }
+        try:
+            if self.browser_session is not None:
+                result = self.browser_session.evaluate_async(_LAZY_LOAD_SCRIPT, arguments,
+                                                             timeout=deadline.cap(max_seconds))
+            else:
+                self.driver.set_script_timeout(deadline.cap(max_seconds))
+                result = self.driver.execute_async_script(_LAZY_LOAD_SCRIPT, arguments)
+        except Exception as e:
+            logger.debug(f"  觸發懶加載失敗: {e}")
+            return
+        if result.get('scrolled'):
+            self.lazy_load_stats['scrolled'] += 1
+            if result.get('found'):
+                self.lazy_load_stats['found_after_scroll'] += 1
+            logger.debug(f"  滾動 {result.get('steps')} 段觸發懶加載，"
+                         f"{'已出現照片/影片' if result.get('found') else '沒有出現照片/影片'}")
+    
+    def _navigate_in_app(self, url, timeout=5):
+        """在目前分頁點擊指向url的連結切換子頁面，無法切換時回傳False（改用driver.get）"""
+        try:
+            current_url = (self.browser_session or self.driver).current_url
+        except Exception:
+            return False
+        # 只在同一間餐廳的頁面之間切換
+        if restaurant_base_url(current_url) != restaurant_base_url(url):
+            return False
+        target_path = urlsplit(url).path.rstrip('/')
+        if urlsplit(current_url).path.rstrip('/') == target_path:
+            return False
+        try:
+            if self.browser_session is not None:
+                clicked = self.browser_session.click_link(_CLICK_LINK_SCRIPT, target_path, timeout)
+            else:
+                clicked = self.driver.execute_script(_CLICK_LINK_SCRIPT, target_path)
+            if not clicked:
+                logger.debug(f"  頁面中沒有指向 {target_path} 的連結，改用driver.get")
+                self.navigation_stats['spa_fallback'] += 1
+                return False
+            if self.browser_session is None:
+                from selenium.webdriver.support.ui import WebDriverWait
+                WebDriverWait(self.driver, timeout).until(
+                    lambda driver: driver.execute_script(
+                        "return location.pathname.replace(/\\/$/, '') === arguments[0]"
+                        " && document.readyState === 'complete';", target_path)
+                )
+            logger.debug(f"  已在分頁內切換到 {target_path}")
+            return True
+        except Exception as e:
+            logger.debug(f"  分頁內切換失敗: {e}，改用driver.get")
+            self.navigation_stats['spa_fallback'] += 1
+            return False
+    
+    def _conditional_headers(self, url):
+        """依存檔中的ETag/Last-Modified產生條件請求標頭，回傳 (headers, 存檔大小)"""
+        if self.page_store is None or not self.page_store.recording:
+            return {}, 0
+        validators = self.page_store.load_validators(url)
+        if not validators:
+            return {}, 0
+        etag, last_modified, size = validators
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers, size
+    
+    def _save_response(self, url, response, content):
+        """將requests回應保存到存檔（包含條件請求用的標頭）"""
+        if self.page_store is not None:
+            self.page_store.save_page(url, 'requests', content, status=response.status_code,
+                                      etag=response.headers.get('ETag'),
+                                      last_modified=response.headers.get('Last-Modified'))
+    
+    def _fetch_with_requests(self, url, facts=False):
+        """使用requests獲取頁面（串流讀取並逐塊解壓，始終使用連接池的session）
+        :return: facts為True時回傳PageFacts（解析樹已釋放），否則回傳BeautifulSoup
+        """
+        conditional_headers, stored_size = self._conditional_headers(url)
+        if conditional_headers:
+            self.conditional_stats['sent'] += 1
+        
+        # 減少超時時間（從15秒減少到10秒，加快失敗響應）
+        response = self._http_request('GET', url, headers=conditional_headers or None, timeout=10, stream=True)
+        
+        # 304：頁面未變更，重用存檔中的內容
+        if response.status_code == 304 and conditional_headers:
+            response.close()
+            html, _ = self.page_store.load_page(url, backend='requests')
+            self.page_store.touch(url)
+            self.conditional_stats['not_modified'] += 1
+            self.conditional_stats['bytes_saved'] += stored_size
+            CACHE_LOOKUPS.inc(cache='conditional', result='hit')
+            logger.debug(f"  頁面未變更（304），重用存檔: {url}")
+            return facts_from_html(html, url) if facts else parse_html(html)
+        if conditional_headers:
+            CACHE_LOOKUPS.inc(cache='conditional', result='miss')
+        
+        if response.status_code >= 400:
+            response.close()
+        response.raise_for_status()
+        
+        # 依Content-Encoding（br / gzip / deflate）逐塊解壓
+        decode_start = time.perf_counter()
+        content, wire_bytes = read_decoded(response)
+        self.stage_timer.record('decode', time.perf_counter() - decode_start, 'requests')
+        logger.debug(f"  下載 {wire_bytes} 位元組（{response.headers.get('Content-Encoding') or 'identity'}），"
+                     f"解壓後 {len(content)} 位元組")
+        
+        if facts:
+            page = facts_from_html(content, url)
+            text_length = page.text_length
+        else:
+            page = parse_html(content)
+            text_length = len(page.get_text())
+        
+        # 檢查頁面內容是否有效
+        if text_length < 100:
+            raise Exception(f"頁面內容過短 ({text_length} 字元)，可能是JavaScript動態加載的頁面。Streamlit Cloud環境可能無法訪問OpenRice網站。")
+        
+        self._save_response(url, response, content)
+        
+        return page
+    
+    def _load_from_archive(self, url, facts=False):
+        """重播模式：從存檔讀取頁面，不連網"""
+        start = time.perf_counter()
+        html, backend = self.page_store.load_page(url)
+        page = facts_from_html(html, url) if facts else parse_html(html)
+        self.stage_timer.record(page_type_of(url), time.perf_counter() - start, f'replay:{backend}')
+        return page
+    
     def get_page_soup(self, url, fast_mode=False):
         """獲取頁面的BeautifulSoup物件
         :param url: 頁面URL
         :param fast_mode: 快速模式，減少等待時間（用於照片分類頁面）
         """
+        return self._get_page(url, fast_mode, facts=False)
+    
+    def get_page_facts(self, url, fast_mode=False):
+        """獲取頁面中檢查需要的資料（PageFacts）
+        Selenium模式下直接在頁面中擷取，不把整個DOM傳回Python解析
+        :param url: 頁面URL
+        :param fast_mode: 快速模式，減少等待時間（用於照片分類頁面）
+        """
+        return self._get_page(url, fast_mode, facts=True)
+    
+    def _fetch_with_browser(self, backend, page_type, fetch):
+        """用瀏覽器後端（selenium / playwright）抓取頁面，失敗或斷路器開啟時回傳None（改用requests）"""
+        breaker = self.breakers[backend]
+        name = backend.capitalize()
+        if not breaker.allow():
+            logger.debug(f"  {name}斷路器開啟，直接使用requests")
+            return None
+        start = time.perf_counter()
+        try:
+            with self._driver_lock:
+                page = fetch()
+            breaker.record_success()
+            # 分頁內切換與冷載入分開統計，方便比較
+            label = backend if self._last_navigation == NAV_COLD else f'{backend}_spa'
+            self.stage_timer.record(page_type, time.perf_counter() - start, label)
+            return page
+        except BudgetExceeded:
+            # 等待限速器會超過時間上限：不是後端故障，不計入斷路器也不回退
+            self.stage_timer.record(page_type, time.perf_counter() - start, f'{backend}_error')
+            raise
+        except Exception as e:
+            self.stage_timer.record(page_type, time.perf_counter() - start, f'{backend}_error')
+            self._raise_if_out_of_time(page_type, e)
+            breaker.record_failure(str(e)[:200])
+            logger.warning(f"  {name}獲取頁面失敗: {e}，嘗試使用requests")
+            logger.debug("錯誤堆棧", exc_info=True)
+            # 如果瀏覽器失敗，回退到requests
+            return None
+    
+    def _get_page(self, url, fast_mode, facts):
+        if self.replaying:
+            return self._load_from_archive(url, facts)
+        
+        page_type = page_type_of(url)
+        # 時間上限已到：剩下的頁面不再抓取
+        self._deadline.check(page_type)
+        if facts and self.backend_router.enabled and self._has_browser():
+            return self._get_routed_page(url, fast_mode, page_type)
+        page = self._fetch_browser_page(url, fast_mode, facts, page_type)
+        if page is not None:
+            return page
+        return self._fetch_requests_page(url, facts, page_type)
+    
+    def _has_browser(self):
+        return self.browser_session is not None or bool(self.use_selenium and self.driver)
+    
+    def _fetch_browser_page(self, url, fast_mode, facts, page_type):
+        """依序嘗試共用Chromium與Selenium，都無法使用或失敗時回傳None"""
+        if self.browser_session is not None:
+            page = self._fetch_with_browser('playwright', page_type,
+                                            lambda: self._fetch_with_playwright(url, fast_mode, facts))
+            if page is not None:
+                return page
         if self.use_selenium and self.driver:
+            return self._fetch_with_browser('selenium', page_type,
+                                            lambda: self._fetch_with_selenium(url, fast_mode, facts))
+        return None
+    
+    def _get_routed_page(self, url, fast_mode, page_type):
+        """依頁面類型目前的路由取得PageFacts；抽樣的頁面另外用另一個後端取得並比較摘要
+        抽樣時以瀏覽器的結果為準（兩者不一致時檢查結果仍正確）
+        """
+        router = self.backend_router
+        sample = router.should_sample(page_type)
+        if router.route(page_type) == ROUTE_REQUESTS:
             try:
-                print(f"  使用Selenium獲取頁面: {url}")
-                sys.stdout.flush()
-                
-                # 檢查driver是否仍然有效
-                try:
-                    self.driver.current_url
-                except Exception as e:
-                    print(f"  WebDriver已失效: {e}，重新初始化...")
-                    sys.stdout.flush()
-                    # 嘗試重新初始化driver
-                    try:
-                        from selenium import webdriver
-                        from selenium.webdriver.chrome.options import Options
-                        from selenium.webdriver.chrome.service import Service
-                        from webdriver_manager.chrome import ChromeDriverManager
-                        import os
-                        
-                        chrome_options = Options()
-                        chrome_options.add_argument('--headless=new')
-                        chrome_options.add_argument('--no-sandbox')
-                        chrome_options.add_argument('--disable-dev-shm-usage')
-                        chrome_options.add_argument('--disable-gpu')
-                        chrome_options.add_argument('--disable-setuid-sandbox')
-                        chrome_options.add_argument('--disable-web-security')
-                        chrome_options.add_argument('--window-size=1920,1080')
-                        chrome_options.add_argument('user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-                        
-                        chrome_binary = os.environ.get('CHROMIUM_PATH', '/usr/bin/google-chrome')
-                        if os.path.exists(chrome_binary):
-                            chrome_options.binary_location = chrome_binary
-                        
-                        service = Service(ChromeDriverManager().install())
-                        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                        self.driver.set_page_load_timeout(30)
-                        print("  WebDriver重新初始化成功")
-                        sys.stdout.flush()
-                    except Exception as init_error:
-                        print(f"  WebDriver重新初始化失敗: {init_error}")
-                        sys.stdout.flush()
-                        raise Exception("WebDriver失效且無法重新初始化")
-                
-                # 訪問頁面
-                print("  正在訪問頁面...")
-                sys.stdout.flush()
-                self.driver.get(url)
-                
-                # 等待頁面載入（優化：根據模式調整等待時間）
-                wait_time = 1 if fast_mode else 2
-                timeout = 5 if fast_mode else 10
-                
-                print("  等待頁面載入...")
-                sys.stdout.flush()
-                time.sleep(wait_time)
-                
-                # 嘗試等待特定元素載入
-                try:
-                    print("  等待body元素載入...")
-                    sys.stdout.flush()
-                    WebDriverWait(self.driver, timeout).until(
-                        EC.presence_of_element_located((By.TAG_NAME, "body"))
-                    )
-                    # 額外等待，確保動態內容載入
-                    print("  body元素已載入，等待動態內容...")
-                    sys.stdout.flush()
-                    time.sleep(wait_time)
-                except Exception as e:
-                    print(f"  警告: 等待body元素超時: {e}，繼續執行")
-                    sys.stdout.flush()
-                    time.sleep(wait_time)
-                
-                # 滾動頁面以觸發懶加載（快速模式跳過滾動）
-                if not fast_mode:
-                    try:
-                        print("  滾動頁面以觸發懶加載...")
-                        sys.stdout.flush()
-                        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(1)
-                        self.driver.execute_script("window.scrollTo(0, 0);")
-                        time.sleep(0.5)
-                    except Exception as e:
-                        print(f"  滾動頁面失敗: {e}")
-                        sys.stdout.flush()
-                
-                html = self.driver.page_source
-                page_length = len(html)
-                print(f"  Selenium獲取頁面成功，內容長度: {page_length} 字元")
-                sys.stdout.flush()
-                
-                # 檢查頁面是否包含OpenRice的關鍵字
-                if 'openrice' not in html.lower() and 'openrice' not in url.lower():
-                    print(f"  警告: 頁面可能不是OpenRice頁面")
-                    sys.stdout.flush()
-                
-                # 檢查是否包含餐廳名稱相關的元素
-                if 'poi-name' in html or 'restaurant-name' in html or 'pdhs-en-section' in html:
-                    print(f"  ✓ 頁面包含餐廳名稱相關元素")
-                    sys.stdout.flush()
-                else:
-                    print(f"  ⚠️ 頁面可能缺少餐廳名稱元素")
-                    sys.stdout.flush()
-                
-                # 檢查頁面內容長度
-                if page_length < 1000:
-                    print(f"  警告: 頁面內容可能不完整（僅{page_length}字元）")
-                    print(f"  頁面前500字元: {html[:500]}")
-                    sys.stdout.flush()
-                    # 如果內容太短，拋出異常以回退到requests
-                    raise Exception(f"Selenium獲取的頁面內容過短（{page_length}字元），可能未正確載入")
-                
-                return BeautifulSoup(html, 'html.parser')
+                page = self._fetch_requests_page(url, True, page_type)
+            except BudgetExceeded:
+                raise
             except Exception as e:
-                print(f"  Selenium獲取頁面失敗: {e}，嘗試使用requests")
-                import traceback
-                print(traceback.format_exc())
-                sys.stdout.flush()
-                # 如果Selenium失敗，回退到requests
-                pass
+                # requests取得失敗（例如內容過短）：這個頁面類型可能又需要瀏覽器
+                router.record(page_type, False)
+                logger.debug(f"  requests取得 {page_type} 頁面失敗: {e}，改用瀏覽器")
+                page = self._fetch_browser_page(url, fast_mode, True, page_type)
+                if page is None:
+                    raise
+                return page
+            if sample:
+                try:
+                    reference = self._fetch_browser_page(url, fast_mode, True, page_type)
+                except BudgetExceeded:
+                    return page
+                if reference is not None:
+                    router.record(page_type, page.summary() == reference.summary())
+                    return reference
+            return page
         
-        # 使用requests作為備選
+        page = self._fetch_browser_page(url, fast_mode, True, page_type)
+        if page is None:
+            return self._fetch_requests_page(url, True, page_type)
+        if sample:
+            try:
+                candidate = self._fetch_requests_page(url, True, page_type)
+            except BudgetExceeded:
+                return page
+            except Exception as e:
+                logger.debug(f"  抽樣比較: requests取得 {page_type} 頁面失敗: {e}")
+                candidate = None
+            router.record(page_type, candidate is not None and candidate.summary() == page.summary())
+        return page
+    
+    def _fetch_requests_page(self, url, facts, page_type):
+        """使用requests取得頁面（經過requests斷路器，錯誤轉成說明訊息）"""
+        requests_breaker = self.breakers['requests']
+        if not requests_breaker.allow():
+            raise CircuitOpenError(f"requests斷路器開啟（最近錯誤: {requests_breaker.last_failure}），快速失敗")
+        self._last_requests_url = url
+        start = time.perf_counter()
         try:
-            # 減少超時時間（從15秒減少到10秒，加快失敗響應）
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # 檢查Content-Encoding，如果是br (Brotli)，嘗試解壓
-            content_encoding = response.headers.get('Content-Encoding', '').lower()
-            if content_encoding == 'br':
-                # 嘗試使用brotli解壓
-                if BROTLI_AVAILABLE:
-                    try:
-                        content = brotli.decompress(response.content)
-                        return BeautifulSoup(content.decode('utf-8', errors='ignore'), 'html.parser')
-                    except Exception as e:
-                        # 如果解壓失敗，重新請求不使用br壓縮
-                        pass
-                
-                # 如果沒有brotli庫或解壓失敗，重新請求不使用br壓縮
-                headers = self.session.headers.copy()
-                headers['Accept-Encoding'] = 'gzip, deflate'
-                no_br_response = requests.get(url, headers=headers, timeout=10)
-                no_br_response.raise_for_status()
-                soup = BeautifulSoup(no_br_response.content, 'html.parser')
-                
-                # 檢查頁面內容是否有效
-                page_text = soup.get_text() if soup else ""
-                if len(page_text) < 100:
-                    raise Exception(f"頁面內容過短 ({len(page_text)} 字元)，可能是JavaScript動態加載的頁面。Streamlit Cloud環境可能無法訪問OpenRice網站。")
-                
-                return soup
-            
-            # 正常情況（gzip或其他）
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # 檢查頁面內容是否有效
-            page_text = soup.get_text() if soup else ""
-            if len(page_text) < 100:
-                raise Exception(f"頁面內容過短 ({len(page_text)} 字元)，可能是JavaScript動態加載的頁面。Streamlit Cloud環境可能無法訪問OpenRice網站。")
-            
-            return soup
-        except requests.exceptions.Timeout:
+            page = self._fetch_with_requests(url, facts)
+        except BudgetExceeded:
+            raise
+        except requests.exceptions.Timeout as e:
+            self._raise_if_out_of_time(page_type, e)
+            requests_breaker.record_failure('請求超時')
             raise Exception(f"請求超時（超過10秒），可能是網絡問題或Streamlit Cloud無法訪問OpenRice")
         except requests.exceptions.ConnectionError:
+            requests_breaker.record_failure('連接錯誤')
             raise Exception(f"連接錯誤，Streamlit Cloud可能無法訪問OpenRice網站")
+        except requests.exceptions.HTTPError as e:
+            self._raise_if_out_of_time(page_type, e)
+            if e.response is not None and e.response.status_code in UNHEALTHY_STATUS:
+                requests_breaker.record_failure(f"HTTP {e.response.status_code}")
+            raise Exception(f"無法獲取頁面: {e}")
         except Exception as e:
+            self._raise_if_out_of_time(page_type, e)
             raise Exception(f"無法獲取頁面: {e}")
+        finally:
+            self.stage_timer.record(page_type, time.perf_counter() - start, 'requests')
+        requests_breaker.record_success()
+        return page
+    
+    def check_restaurant(self, url, restaurant_name, budget=None):
+        """檢查單個餐廳的所有要素，並輸出一行摘要日誌
+        :param budget: 本次檢查的時間上限（秒），與restaurant_budget取較短者
+        """
+        start_time = time.monotonic()
+        self._media_urls = {}
+        result = self._check_restaurant(url, restaurant_name, budget)
+        if self.media_verifier is not None and self._media_urls:
+            self.media_verifier.submit(result, self._media_urls)
+        elapsed = time.monotonic() - start_time
+        self._log_summary(result, elapsed)
+        self._record_metrics(result, elapsed)
+        self._record_history(result)
+        return result
     
-    def check_restaurant(self, url, restaurant_name):
-        """檢查單個餐廳的所有要素"""
-        print(f"正在檢查: {restaurant_name} - {url}")
+    def _record_metrics(self, result, elapsed):
+        """累計行程內的指標（/metrics 端點）"""
+        from report import CHECK_ITEMS, status_category
+        RESTAURANTS_CHECKED.inc(category=status_category(result.get('狀態')))
+        RESTAURANT_SECONDS.observe(elapsed)
+        for item in CHECK_ITEMS:
+            outcome = ITEM_OUTCOMES.get(result.get(item))
+            if outcome:
+                CHECK_RESULTS.inc(item=item, result=outcome)
+    
+    def _record_history(self, result):
+        """把結果保存到歷史紀錄（沒有設定歷史紀錄時不做任何事）"""
+        if self.history is None:
+            return
+        if self.history_run_id is None:
+            self.history_run_id = self.history.start_run(source='cli', label=os.path.basename(self.excel_file))
+        self.history.record(self.history_run_id, result)
+    
+    def _log_summary(self, result, elapsed):
+        """每間餐廳只輸出一行摘要（細節在DEBUG等級）"""
+        status = result.get('狀態', '未知')
+        status_icon = '✓' if status == '合格' else '✗'
+        summary_logger.info(
+            f"{status_icon} {result.get('餐廳名稱')} - {status} ({result.get('通過率', '')}, {elapsed:.1f}s)",
+            extra={
+                'restaurant': result.get('餐廳名稱'),
+                'url': result.get('URL'),
+                'status': status,
+                'passed': result.get('通過率'),
+                'elapsed': round(elapsed, 3),
+                'rate': round(self.rate_limiter.current_rate(result.get('URL') or ''), 3),
+            }
+        )
+    
+    def _check_restaurant(self, url, restaurant_name, budget=None):
+        """檢查單個餐廳的所有要素（有時間上限時，超過上限的項目標記為「逾時」）"""
+        self._deadline = Deadline(budget, parent=Deadline(self.restaurant_budget, parent=self._batch_deadline))
+        try:
+            return self._check_restaurant_within_budget(url, restaurant_name)
+        finally:
+            self._deadline = UNLIMITED
+    
+    def _check_restaurant_within_budget(self, url, restaurant_name):
+        logger.debug(f"正在檢查: {restaurant_name} - {url}")
         
         try:
             # 解析縮短URL，獲取實際URL
-            actual_url = self.resolve_short_url(url)
-            print(f"  實際URL: {actual_url}")
+            with self.stage_timer.time('resolve'):
+                actual_url = self.resolve_short_url(url)
+            logger.debug(f"  實際URL: {actual_url}")
             
-            # 使用實際URL獲取頁面
-            soup = self.get_page_soup(actual_url)
+            # 使用實際URL獲取頁面（只取檢查需要的資料）
+            facts = self.get_page_facts(actual_url)
             
             # 檢查是否成功獲取頁面
-            if soup is None:
-                raise Exception("無法獲取頁面內容（soup為None）")
+            if facts is None:
+                raise Exception("無法獲取頁面內容（facts為None）")
             
             # 檢查頁面是否有內容
-            page_text = soup.get_text() if soup else ""
-            page_text_length = len(page_text)
-            print(f"  頁面內容長度: {page_text_length} 字元")
+            page_text_length = facts.text_length
+            logger.debug(f"  頁面內容長度: {page_text_length} 字元")
             
             # 如果頁面內容過短，可能是錯誤頁面或JavaScript未執行
             if page_text_length < 500:
                 error_msg = f"頁面內容過短 ({page_text_length} 字元)，可能是：1) 網絡限制無法訪問 2) JavaScript未執行 3) 錯誤頁面"
-                print(f"  錯誤: {error_msg}")
+                logger.debug(f"  錯誤: {error_msg}")
                 raise Exception(error_msg)
             
             # 檢查是否包含OpenRice的關鍵字
-            if 'openrice' not in page_text.lower() and 'openrice' not in actual_url.lower():
-                print(f"  警告: 頁面可能不是OpenRice頁面")
+            if not facts.mentions_openrice and 'openrice' not in actual_url.lower():
+                logger.debug(f"  警告: 頁面可能不是OpenRice頁面")
             
             # 檢查是否有body標籤
-            body = soup.find('body')
-            if not body:
+            if not facts.has_body:
                 raise Exception("頁面缺少body標籤，可能是錯誤頁面")
             
+            # 照片總覽（第一個照片項目檢查時才載入，之後的項目共用）
+            inventory_cache = {}
+            
+            def inventory():
+                if not self.photo_inventory:
+                    return None
+                if 'counts' not in inventory_cache:
+                    inventory_cache['counts'] = self.get_photo_inventory(facts, actual_url)
+                return inventory_cache['counts']
+            
             # 使用實際URL構建子頁面URL
-            checks = {
-                '中文名稱': self.check_chinese_name(soup),
-                '英文名稱': self.check_english_name(soup),
-                '門面照片': self.check_facade_photo(soup, base_url=actual_url),
-                '菜單': self.check_menu(soup, base_url=actual_url),
-                '餐點照片': self.check_food_photos(soup, base_url=actual_url),
-                '相關影片': self.check_videos(soup, base_url=actual_url)
+            check_functions = {
+                '中文名稱': lambda: self.check_chinese_name(facts),
+                '英文名稱': lambda: self.check_english_name(facts),
+                '門面照片': lambda: self.check_facade_photo(facts, base_url=actual_url, inventory=inventory()),
+                '菜單': lambda: self.check_menu(facts, base_url=actual_url, inventory=inventory()),
+                '餐點照片': lambda: self.check_food_photos(facts, base_url=actual_url, inventory=inventory()),
+                '相關影片': lambda: self.check_videos(facts, base_url=actual_url, inventory=inventory())
             }
+            checks = {}
+            timed_out = []
+            for key, check in check_functions.items():
+                if timed_out:
+                    # 時間上限已到，剩下的項目不再檢查
+                    timed_out.append(key)
+                    continue
+                try:
+                    checks[key] = check()
+                except BudgetExceeded as e:
+                    logger.debug(f"  {key}: {e}")
+                    timed_out.append(key)
             
             # 打印每個檢查項目的結果（調試用）
             for key, value in checks.items():
                 if isinstance(value, tuple):
                     status = "✓" if value[0] else "✗"
                     detail = value[1] if len(value) > 1 else ""
-                    print(f"  {key}: {status} {detail}")
+                    logger.debug(f"  {key}: {status} {detail}")
                 else:
                     status = "✓" if value else "✗"
-                    print(f"  {key}: {status}")
+                    logger.debug(f"  {key}: {status}")
             
             # 統計通過和失敗的檢查項目
             def is_passed(check_result):
@@ -1117,7 +1584,7 @@ class OpenRiceChecker:
                     return bool(check_result)  # 布林值直接判斷
             
             passed = sum(1 for result in checks.values() if is_passed(result))
-            total = len(checks)
+            total = len(check_functions)
             
             # 收集不合格項目
             failed_items = []
@@ -1125,6 +1592,21 @@ class OpenRiceChecker:
                 if not is_passed(value):
                     failed_items.append(key)
             
+            if timed_out:
+                # 逾時：已完成的項目保留結果，其餘標記為逾時
+                status_with_items = f'逾時 - 未完成：{", ".join(timed_out)}'
+                if failed_items:
+                    status_with_items += f'；缺少：{", ".join(failed_items)}'
+                return {
+                    '餐廳名稱': restaurant_name,
+                    'URL': url,
+                    '檢查時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    '通過率': f"{passed}/{total}",
+                    '狀態': status_with_items,
+                    **{key: (TIMEOUT_MARK if key in timed_out else ('✓' if is_passed(checks[key]) else '✗'))
+                        for key in check_functions}
+                }
+            
             # 判斷狀態：如果只有"相關影片"不符合，顯示特殊狀態
             videos_passed = is_passed(checks['相關影片'])
             other_checks_passed = all(is_passed(checks[key]) for key in ['中文名稱', '英文名稱', '門面照片', '菜單', '餐點照片'])
@@ -1151,8 +1633,24 @@ class OpenRiceChecker:
             
             return result
             
+        except BudgetExceeded as e:
+            logger.warning(f"超過時間上限: {restaurant_name}")
+            return {
+                '餐廳名稱': restaurant_name,
+                'URL': url,
+                '檢查時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                '通過率': '0/6',
+                '狀態': '逾時',
+                '錯誤資訊': str(e),
+                '中文名稱': TIMEOUT_MARK,
+                '英文名稱': TIMEOUT_MARK,
+                '門面照片': TIMEOUT_MARK,
+                '菜單': TIMEOUT_MARK,
+                '餐點照片': TIMEOUT_MARK,
+                '相關影片': TIMEOUT_MARK
+            }
         except requests.exceptions.Timeout:
-            print(f"請求超時: {restaurant_name}")
+            logger.warning(f"請求超時: {restaurant_name}")
             return {
                 '餐廳名稱': restaurant_name,
                 'URL': url,
@@ -1168,7 +1666,7 @@ class OpenRiceChecker:
                 '相關影片': '✗'
             }
         except requests.exceptions.RequestException as e:
-            print(f"請求錯誤 {restaurant_name}: {e}")
+            logger.warning(f"請求錯誤 {restaurant_name}: {e}")
             return {
                 '餐廳名稱': restaurant_name,
                 'URL': url,
@@ -1184,7 +1682,7 @@ class OpenRiceChecker:
                 '相關影片': '✗'
             }
         except Exception as e:
-            print(f"檢查 {restaurant_name} 時出錯: {e}")
+            logger.warning(f"檢查 {restaurant_name} 時出錯: {e}")
             return {
                 '餐廳名稱': restaurant_name,
                 'URL': url,
@@ -1200,88 +1698,227 @@ class OpenRiceChecker:
                 '相關影片': '✗'
             }
     
-    def run_check(self, delay=1):
-        """執行所有檢查"""
+    def backends_available(self):
+        """是否還有可用的抓取後端（所有斷路器都開啟時回傳False）"""
+        if self.browser_session is not None and self.breakers['playwright'].allow():
+            return True
+        if self.use_selenium and self.driver and self.breakers['selenium'].allow():
+            return True
+        return self.breakers['requests'].allow()
+    
+    def wait_for_backends(self, max_pause=300):
+        """所有後端的斷路器都開啟時暫停佇列，等待背景探測恢復
+        :return: 是否已恢復
+        """
+        if self.backends_available():
+            return True
+        logger.warning(f"所有抓取後端的斷路器都已開啟，暫停佇列（最多{max_pause}秒）等待恢復...")
+        deadline = time.monotonic() + max_pause
+        while time.monotonic() < deadline:
+            self.breakers['requests'].wait_for_recovery(min(5, deadline - time.monotonic()))
+            if self.backends_available():
+                logger.info("抓取後端已恢復，繼續檢查")
+                return True
+        return False
+    
+    def run_check(self, delay=0, max_pause=300, priority_column=None, priority_rule=None,
+                  previous_results=None, checkpoint=None, on_result=None, shard=None, batch_budget=None):
+        """執行所有檢查
+        :param delay: 每間餐廳之間的額外延遲（秒），請求速率已由共用限速器控制
+        :param max_pause: 所有後端都不健康時，暫停佇列等待恢復的最長時間（秒）
+        :param priority_column: 優先級欄位（例如「重點poi」），None時自動尋找
+        :param priority_rule: 排序規則，RULE_FAILED_FIRST 表示上次不合格的先檢查
+        :param previous_results: 上次的檢查結果（配合priority_rule使用）
+        :param checkpoint: Checkpoint物件，每完成一間就寫入；已完成的餐廳會略過
+        :param on_result: 每完成一間餐廳時呼叫 on_result(work_item, result)
+        :param shard: (分片編號, 分片數)，只檢查屬於該分片的餐廳
+        :param batch_budget: 整批的時間上限（秒），時間到時停止並只輸出已完成的結果
+        """
         df = self.load_restaurants()
         if df is None:
             return
         
-        print(f"開始檢查 {len(df)} 間餐廳...")
-        print("-" * 60)
+        # 依優先級與預估成本排序，重要的和快的先出結果
+        queue = build_work_queue(df, priority_column=priority_column, rule=priority_rule,
+                                 previous_results=previous_results, short_url_hosts=self.SHORT_URL_HOSTS,
+                                 shard=shard)
+        results_by_index = checkpoint.load() if checkpoint is not None else {}
         
-        for idx, row in df.iterrows():
-            restaurant_name = row['餐廳名稱']
-            url = row['URL']
-            
-            # 確保URL是完整的
-            if not url.startswith('http'):
-                url = 'https://' + url
-            
-            result = self.check_restaurant(url, restaurant_name)
-            self.results.append(result)
-            
-            # 延遲以避免請求過快
-            time.sleep(delay)
-            
-            status_icon = '✓' if result.get('狀態') == '合格' else '✗'
-            print(f"{status_icon} {restaurant_name} - {result.get('狀態', '未知')}")
+        logger.info(f"開始檢查 {len(queue)} 間餐廳..." if shard is None else
+                    f"開始檢查分片 {shard[0]}/{shard[1]}：{len(queue)}/{len(df)} 間餐廳...")
+        if results_by_index:
+            logger.info(f"從檢查點繼續：已完成 {len(results_by_index)} 間")
+            # 檢查點中的結果也屬於這次執行
+            for result in results_by_index.values():
+                self._record_history(result)
+        logger.info("-" * 60)
         
-        print("-" * 60)
-        print("\n檢查完成！")
+        self._batch_deadline = Deadline(batch_budget) if batch_budget else None
+        # 中斷（Ctrl+C / SIGTERM / 例外）時不等待尚未完成的媒體連結驗證
+        interrupted = True
+        try:
+            for position, item in enumerate(queue):
+                if item.index in results_by_index:
+                    continue
+                if self._batch_deadline is not None and self._batch_deadline.expired():
+                    remaining = sum(1 for rest in queue[position:] if rest.index not in results_by_index)
+                    logger.warning(f"已達整批時間上限，尚有 {remaining} 間餐廳未檢查")
+                    break
+                
+                # 所有後端都不健康時先暫停，避免整批餐廳都慢慢失敗
+                self.wait_for_backends(max_pause)
+                
+                result = self.check_restaurant(item.url, item.name)
+                results_by_index[item.index] = result
+                if checkpoint is not None:
+                    checkpoint.append(item.index, result)
+                if on_result is not None:
+                    on_result(item, result)
+                
+                # 額外延遲（可選），請求速率由限速器控制
+                if delay:
+                    time.sleep(delay)
+            interrupted = False
+        finally:
+            self._batch_deadline = None
+            if self.media_verifier is not None:
+                self._apply_media_verification(results_by_index, checkpoint, interrupted)
+            # 報告依原始順序輸出（中斷時也保留已完成的結果）
+            self.results.extend(results_by_index[index] for index in sorted(results_by_index))
+            if self.history_run_id is not None:
+                self.history.finish_run(self.history_run_id)
+        
+        logger.info("-" * 60)
+        logger.info("檢查完成！")
+        if self.navigation_stats['spa'] or self.navigation_stats['spa_fallback']:
+            logger.info(f"頁面切換: 分頁內切換 {self.navigation_stats['spa']} 次，"
+                        f"driver.get {self.navigation_stats['cold']} 次"
+                        f"（其中 {self.navigation_stats['spa_fallback']} 次無法分頁內切換）")
+        if self.inventory_stats['answered'] or self.inventory_stats['fallback']:
+            logger.info(f"照片總覽: {self.inventory_stats['answered']} 個項目由分類數量判斷，"
+                        f"{self.inventory_stats['fallback']} 個項目載入分類頁面")
+        if self.lazy_load_stats['pages']:
+            logger.info(f"懶加載: {self.lazy_load_stats['pages']} 個頁面中 {self.lazy_load_stats['scrolled']} 個需要滾動"
+                        f"（其中 {self.lazy_load_stats['found_after_scroll']} 個滾動後出現照片/影片）")
+        if self.media_verifier is not None:
+            stats = self.media_verifier.stats
+            logger.info(f"媒體連結驗證: 有效 {stats['live']} 個，失效 {stats['dead']} 個，無法連線 {stats['error']} 個")
+        if self.conditional_stats['sent']:
+            logger.info(f"條件請求: 送出 {self.conditional_stats['sent']} 個，"
+                        f"{self.conditional_stats['not_modified']} 個未變更（304），"
+                        f"節省約 {self.conditional_stats['bytes_saved'] / 1024:.0f} KB")
+        flush_logs()
+    
+    def _apply_media_verification(self, results_by_index, checkpoint, interrupted):
+        """等待背景的媒體連結驗證並寫入結果，再重新保存更新過的結果（檢查點以最後一行為準）
+        驗證出錯時只記錄警告，不影響整批的結果與歷史紀錄
+        :param interrupted: 整批被中斷時不等待尚未完成的驗證，否則最多等待APPLY_TIMEOUT秒
+        """
+        from media_verifier import APPLY_TIMEOUT
+        try:
+            verified = {id(result) for result in self.media_verifier.apply(0 if interrupted else APPLY_TIMEOUT)}
+            for index, result in results_by_index.items():
+                if id(result) in verified:
+                    if checkpoint is not None:
+                        checkpoint.append(index, result)
+                    self._record_history(result)
+        except Exception as e:
+            logger.warning(f"寫入媒體連結驗證結果時出錯: {e}")
     
     def generate_report(self, output_file='restaurant_check_report.xlsx'):
-        """產生檢查報告"""
-        if not self.results:
-            print("沒有檢查結果可產生報告")
-            return
-        
-        df_results = pd.DataFrame(self.results)
-        
-        # 分離合格和不合格的餐廳
-        failed_restaurants = df_results[df_results['狀態'] != '合格']
-        
-        # 儲存完整報告
-        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            df_results.to_excel(writer, sheet_name='完整報告', index=False)
-            if len(failed_restaurants) > 0:
-                failed_restaurants.to_excel(writer, sheet_name='不合格餐廳', index=False)
-        
-        print(f"\n報告已產生: {output_file}")
-        print(f"總餐廳數: {len(df_results)}")
-        print(f"合格餐廳: {len(df_results[df_results['狀態'] == '合格'])}")
-        print(f"不合格餐廳: {len(failed_restaurants)}")
-        
-        # 列印不合格餐廳清單
-        if len(failed_restaurants) > 0:
-            print("\n不合格餐廳清單:")
-            print("=" * 60)
-            for idx, row in failed_restaurants.iterrows():
-                print(f"\n{idx + 1}. {row['餐廳名稱']}")
-                print(f"   URL: {row['URL']}")
-                print(f"   狀態: {row['狀態']}")
-                if '通過率' in row:
-                    print(f"   通過率: {row['通過率']}")
-                if '錯誤資訊' in row and pd.notna(row['錯誤資訊']):
-                    print(f"   錯誤: {row['錯誤資訊']}")
-            print("=" * 60)
+        """產生檢查報告（有歷史紀錄時加上「與上次比較」工作表）"""
+        from report import write_report
+        delta = self.history.delta_rows(self.history_run_id) if self.history_run_id is not None else None
+        write_report(self.results, output_file, self.circuit_events, delta=delta)
 
 
-def main():
-    # 使用範例
-    excel_file = 'restaurants.xlsx'  # 請替換為您的Excel檔案路徑
-    use_selenium = True  # 設定為True使用Selenium（需要Chrome瀏覽器），False使用requests
+def parse_args(argv=None):
+    import argparse
+    from history_store import DEFAULT_HISTORY_FILE
+    parser = argparse.ArgumentParser(description='OpenRice 餐廳要素檢查程式')
+    parser.add_argument('excel_file', nargs='?', default='restaurants.xlsx', help='包含餐廳名稱和URL的Excel檔案')
+    parser.add_argument('-o', '--output', default='restaurant_check_report.xlsx', help='報告輸出路徑')
+    parser.add_argument('--no-selenium', action='store_true', help='只使用requests（不啟動Chrome）')
+    parser.add_argument('--browser', choices=[BROWSER_CHROME, BROWSER_PLAYWRIGHT],
+                        help='瀏覽器後端（預設chrome；playwright共用一個Chromium，每個檢查器一個browser context）')
+    parser.add_argument('--navigation', choices=[NAV_SPA, NAV_COLD], help='Selenium的頁面切換方式（預設spa）')
+    parser.add_argument('--extraction', choices=[EXTRACT_SCRIPT, EXTRACT_DOM],
+                        help='Selenium頁面資料的擷取方式（預設script：在頁面中擷取，不傳回整個DOM）')
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument('--record', metavar='ARCHIVE', help='將抓取的頁面錄製到存檔')
+    archive.add_argument('--replay', metavar='ARCHIVE', help='從存檔重播頁面重新執行所有檢查（不連網）')
+    parser.add_argument('--priority-column', help='優先級欄位名稱（預設自動尋找「優先級」「重點poi」等欄位）')
+    parser.add_argument('--failed-first', metavar='PREVIOUS', help='上次的報告(xlsx)、檢查點(jsonl)或歷史紀錄(db)，上次不合格的餐廳先檢查')
+    parser.add_argument('--checkpoint', help='檢查點檔(jsonl)，每完成一間就寫入，中斷後可從此繼續')
+    parser.add_argument('--restaurant-budget', type=float, help='每間餐廳的時間上限（秒），超過時其餘項目標記為「逾時」')
+    parser.add_argument('--batch-budget', type=float, help='整批的時間上限（秒），時間到時只輸出已完成的結果')
+    parser.add_argument('--no-photo-inventory', action='store_true',
+                        help='不使用照片總覽頁的分類數量，每個照片項目都載入自己的分類頁面')
+    history = parser.add_mutually_exclusive_group()
+    history.add_argument('--history', default=os.environ.get('CHECKER_HISTORY', DEFAULT_HISTORY_FILE),
+                         help=f'歷史紀錄檔(SQLite)，保存每次的結果並在報告中比較上次（預設{DEFAULT_HISTORY_FILE}）')
+    history.add_argument('--no-history', action='store_true', help='不保存歷史紀錄')
+    parser.add_argument('--verify-media', action='store_true',
+                        default=os.environ.get('CHECKER_VERIFY_MEDIA', '0') == '1',
+                        help='在背景抽樣驗證通過檢查的照片/影片URL是否仍然有效，結果加入報告（可用環境變量CHECKER_VERIFY_MEDIA=1）')
+    parser.add_argument('--verify-sample', type=int, default=3, help='每間餐廳每個項目最多驗證的URL數')
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('METRICS_PORT', '0')),
+                        help='在 127.0.0.1:埠/metrics 提供Prometheus格式的指標（預設0：不啟動，可用環境變量METRICS_PORT）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(argv)
+    
+    use_selenium = not args.no_selenium  # True使用Selenium（需要Chrome瀏覽器），False使用requests
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, host=os.environ.get('METRICS_HOST', '127.0.0.1'))
+    page_store = None
+    if args.record:
+        page_store = PageStore(args.record, mode=RECORD)
+    elif args.replay:
+        page_store = PageStore(args.replay, mode=REPLAY)
     
     print("=" * 60)
     print("OpenRice 餐廳要素檢查程式")
     print("=" * 60)
     
-    checker = OpenRiceChecker(excel_file, use_selenium=use_selenium)
-    checker.run_check(delay=2 if use_selenium else 1)  # Selenium模式需要更長的延遲
-    checker.generate_report('restaurant_check_report.xlsx')
+    previous_results = load_previous_results(args.failed_first) if args.failed_first else None
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    # 重播只是重新評估存檔中的頁面，不算一次新的檢查
+    history = None
+    if not args.no_history and not args.replay:
+        from history_store import HistoryStore
+        history = HistoryStore(args.history)
+    media_verifier = None
+    if args.verify_media:
+        from media_verifier import MediaVerifier
+        media_verifier = MediaVerifier(sample_size=args.verify_sample)
+    
+    checker = OpenRiceChecker(args.excel_file, use_selenium=use_selenium, page_store=page_store,
+                              restaurant_budget=args.restaurant_budget, navigation=args.navigation,
+                              extraction=args.extraction,
+                              photo_inventory=False if args.no_photo_inventory else None, browser=args.browser,
+                              history=history, media_verifier=media_verifier)
+    # 請求速率由共用限速器自動調整
+    checker.run_check(priority_column=args.priority_column,
+                      priority_rule=RULE_FAILED_FIRST if previous_results else None,
+                      previous_results=previous_results, checkpoint=checkpoint,
+                      batch_budget=args.batch_budget)
+    checker.generate_report(args.output)
     
     # 清理資源
-    if checker.driver:
-        checker.driver.quit()
+    checker.close()
+    if page_store is not None:
+        stats = page_store.stats()
+        print(f"頁面存檔 {page_store.path}: {stats['pages']} 頁，"
+              f"原始 {stats['raw_bytes'] / 1024:.0f} KB，壓縮後 {stats['compressed_bytes'] / 1024:.0f} KB")
+        page_store.close()
+    if history is not None:
+        history.close()
+    if media_verifier is not None:
+        media_verifier.close()
 
 
 if __name__ == '__main__':
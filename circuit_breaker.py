@@ -0,0 +1,132 @@
+"""抓取後端的斷路器
+
+當OpenRice封鎖請求或Chrome已失效時，連續失敗達到門檻後斷路器開啟：
+- 開啟期間直接跳過該後端（快速失敗），不再每間餐廳都等待完整的逾時
+- 背景執行緒定期探測後端是否恢復，恢復後進入半開狀態，允許一次實際請求
+- 半開狀態下請求成功則關閉，失敗則重新開啟
+- 所有狀態變化都記錄在 events 中，可寫入報告
+"""
+import threading
+import time
+from datetime import datetime
+
+from log_config import logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 報告中顯示的狀態名稱
+STATE_LABELS = {CLOSED: '關閉', OPEN: '開啟', HALF_OPEN: '半開'}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟，請求被直接拒絕"""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, recovery_timeout=30.0, probe=None,
+                 probe_interval=None, events=None):
+        """
+        :param name: 後端名稱（例如 'selenium'、'requests'）
+        :param failure_threshold: 連續失敗幾次後開啟
+        :param recovery_timeout: 開啟後多久允許嘗試恢復（秒）
+        :param probe: 探測後端是否恢復的函式，回傳True表示健康；None時在recovery_timeout後直接進入半開
+        :param probe_interval: 背景探測的間隔（秒），預設等於recovery_timeout
+        :param events: 狀態變化紀錄的list（可與其他斷路器共用）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe = probe
+        self.probe_interval = probe_interval or recovery_timeout
+        self.events = events if events is not None else []
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.last_failure = None
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+        self._recovered = threading.Event()
+        self._probe_thread = None
+
+    def _transition(self, new_state, reason):
+        """切換狀態並記錄（呼叫時需持有鎖）"""
+        old_state = self.state
+        if old_state == new_state:
+            return
+        self.state = new_state
+        self.events.append({
+            '時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            '後端': self.name,
+            '原狀態': STATE_LABELS[old_state],
+            '新狀態': STATE_LABELS[new_state],
+            '原因': reason,
+        })
+        log = logger.warning if new_state == OPEN else logger.info
+        log(f"  斷路器[{self.name}]: {STATE_LABELS[old_state]} -> {STATE_LABELS[new_state]}（{reason}）")
+        if new_state == OPEN:
+            self.opened_at = time.monotonic()
+            self._recovered.clear()
+        else:
+            self._recovered.set()
+
+    def allow(self):
+        """是否允許使用此後端"""
+        with self._lock:
+            if self.state == OPEN and self.probe is None:
+                if time.monotonic() - self.opened_at >= self.recovery_timeout:
+                    self._transition(HALF_OPEN, f"已開啟{self.recovery_timeout:.0f}秒，嘗試恢復")
+            return self.state != OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self._transition(CLOSED, '請求成功')
+
+    def record_failure(self, reason=''):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_failure = reason
+            if self.state == HALF_OPEN:
+                self._transition(OPEN, f"恢復嘗試失敗: {reason}")
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._transition(OPEN, f"連續失敗{self.consecutive_failures}次: {reason}")
+            else:
+                return
+        self._start_probe()
+
+    def _start_probe(self):
+        """開啟後啟動背景探測執行緒"""
+        if self.probe is None:
+            return
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name=f'probe-{self.name}', daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                if self.state != OPEN:
+                    return
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                logger.debug(f"  斷路器[{self.name}]探測失敗: {e}")
+                healthy = False
+            if healthy:
+                with self._lock:
+                    if self.state == OPEN:
+                        self._transition(HALF_OPEN, '背景探測成功')
+                return
+
+    def wait_for_recovery(self, timeout):
+        """等待斷路器離開開啟狀態，回傳是否已恢復"""
+        if self.probe is None:
+            remaining = self.recovery_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                time.sleep(min(remaining, timeout))
+            return self.allow()
+        return self._recovered.wait(timeout)
@@ -0,0 +1,144 @@
+"""HTTP回應內容的串流解壓
+
+取代原本「先讀完整個回應，再用brotli.decompress解壓，失敗就用模組層級的requests.get重新下載」
+的做法：
+- 一開始就依照本機支援的解壓方式送出 Accept-Encoding（沒有brotli庫就不要求br）
+- 從連線讀取原始位元組時逐塊解壓（br / gzip / deflate），不需要在記憶體中同時保留壓縮與解壓後的整個內容
+- 所有請求都留在連接池的session上，不會為了解壓失敗而重新下載
+"""
+import zlib
+
+# 嘗試匯入brotli（可選，用於解壓Brotli壓縮的回應）
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ContentDecodingError(Exception):
+    """回應內容無法解壓"""
+
+
+def accept_encoding():
+    """本機可以解壓的編碼（用於 Accept-Encoding 標頭）"""
+    return 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+
+
+class _DeflateDecoder:
+    """deflate可能是zlib格式或原始deflate，依第一塊資料判斷"""
+
+    def __init__(self):
+        self._obj = None
+
+    def decompress(self, data):
+        if self._obj is None:
+            self._obj = zlib.decompressobj()
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush() if self._obj is not None else b''
+
+
+class _GzipDecoder:
+    def __init__(self):
+        self._obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._obj = brotli.Decompressor()
+
+    def decompress(self, data):
+        # brotli 1.0 使用 process()，1.1 之後也提供 decompress()
+        process = getattr(self._obj, 'process', None) or self._obj.decompress
+        return process(data)
+
+    def flush(self):
+        return b''
+
+
+class _IdentityDecoder:
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b''
+
+
+def make_decoder(content_encoding):
+    """依 Content-Encoding 建立逐塊解壓器（支援多層編碼，例如 'gzip, br'）"""
+    encodings = [e.strip().lower() for e in (content_encoding or '').split(',') if e.strip()]
+    decoders = []
+    # 多層編碼時，最後套用的編碼要最先解開
+    for encoding in reversed(encodings):
+        if encoding in ('identity', ''):
+            continue
+        if encoding in ('gzip', 'x-gzip'):
+            decoders.append(_GzipDecoder())
+        elif encoding == 'deflate':
+            decoders.append(_DeflateDecoder())
+        elif encoding == 'br':
+            if not BROTLI_AVAILABLE:
+                raise ContentDecodingError('伺服器回傳Brotli壓縮內容，但未安裝brotli庫')
+            decoders.append(_BrotliDecoder())
+        else:
+            raise ContentDecodingError(f'不支援的Content-Encoding: {encoding}')
+    if not decoders:
+        return _IdentityDecoder()
+    if len(decoders) == 1:
+        return decoders[0]
+    return _ChainDecoder(decoders)
+
+
+class _ChainDecoder:
+    def __init__(self, decoders):
+        self._decoders = decoders
+
+    def decompress(self, data):
+        for decoder in self._decoders:
+            data = decoder.decompress(data)
+        return data
+
+    def flush(self):
+        data = b''
+        for decoder in self._decoders:
+            if data:
+                data = decoder.decompress(data)
+            data += decoder.flush()
+        return data
+
+
+def read_decoded(response, chunk_size=CHUNK_SIZE):
+    """從串流回應（stream=True）逐塊讀取原始位元組並解壓
+    :return: (解壓後的內容, 線上傳輸的位元組數)
+    """
+    decoder = make_decoder(response.headers.get('Content-Encoding'))
+    body = bytearray()
+    wire_bytes = 0
+    try:
+        for chunk in response.raw.stream(chunk_size, decode_content=False):
+            wire_bytes += len(chunk)
+            body += decoder.decompress(chunk)
+        body += decoder.flush()
+    except (zlib.error, ValueError) as e:
+        raise ContentDecodingError(f'解壓回應內容失敗: {e}') from e
+    except Exception as e:
+        if BROTLI_AVAILABLE and isinstance(e, brotli.error):
+            raise ContentDecodingError(f'解壓Brotli內容失敗: {e}') from e
+        raise
+    finally:
+        response.close()
+    return bytes(body), wire_bytes
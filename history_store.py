@@ -0,0 +1,339 @@
+"""檢查結果的歷史紀錄（跨次執行比較）
+
+每次執行是一個 run，每間餐廳的檢查結果以 (run_id, 餐廳ID) 為鍵存入SQLite檔，
+餐廳ID為標準URL（與分片相同，去掉查詢參數與結尾斜線）。各檢查項目存成獨立欄位，
+「狀態與上次不同」「新缺少的項目」「某間餐廳的歷次結果」都是有索引的查詢，
+報告的「與上次比較」工作表直接由此產生，不需要讀取之前的Excel報告。
+
+每間餐廳的「上次」是它在較早的 run 中最後一次有結果的那次（上次沒檢查到的餐廳
+會與更早的結果比較）。
+
+每個結果另存一個行雜湊（row_key：標準化名稱 + 標準URL，見 row_fingerprint），
+重新上傳相同或相近的Excel時，以 fresh_results 取出有效時間內的結果直接使用，只檢查新的或過期的行。
+
+用法:
+    python check_restaurants.py restaurants.xlsx --history restaurant_history.db
+    python history_store.py restaurant_history.db changes
+    python history_store.py restaurant_history.db timeline https://www.openrice.com/zh/hongkong/r-xxx
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from batch_scheduler import canonical_url, row_fingerprint
+from media_verifier import verification_fields
+from report import CATEGORY_ERROR, CATEGORY_PASSED, CATEGORY_TIMEOUT, CHECK_ITEMS, status_category
+
+# 命令列與Web應用預設的歷史紀錄檔
+DEFAULT_HISTORY_FILE = 'restaurant_history.db'
+
+# 檢查項目對應的欄位名稱（依CHECK_ITEMS順序）
+ITEM_COLUMNS = dict(zip(CHECK_ITEMS, ['chinese_name', 'english_name', 'facade_photo', 'menu',
+                                      'food_photos', 'videos']))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    source TEXT,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    restaurant_id TEXT NOT NULL,
+    row_key TEXT,
+    name TEXT,
+    url TEXT,
+    checked_at TEXT,
+    recorded_at REAL NOT NULL,
+    status TEXT,
+    category TEXT,
+    passed TEXT,
+    chinese_name TEXT,
+    english_name TEXT,
+    facade_photo TEXT,
+    menu TEXT,
+    food_photos TEXT,
+    videos TEXT,
+    error TEXT,
+    media_check TEXT,
+    PRIMARY KEY (run_id, restaurant_id)
+);
+CREATE INDEX IF NOT EXISTS idx_results_restaurant ON results (restaurant_id, run_id);
+"""
+
+# 不能當作快取使用的結果（下次應重新檢查）
+_UNCACHEABLE = (CATEGORY_TIMEOUT, CATEGORY_ERROR)
+
+# 每間餐廳在指定run之前最後一次的結果
+_PREVIOUS = """
+previous AS (
+    SELECT r.* FROM results r
+    JOIN (SELECT restaurant_id, MAX(run_id) AS run_id FROM results
+          WHERE run_id < :run_id GROUP BY restaurant_id) last
+      ON r.restaurant_id = last.restaurant_id AND r.run_id = last.run_id
+)
+"""
+
+
+class HistoryStore:
+    def __init__(self, path):
+        """
+        :param path: SQLite歷史紀錄檔路徑（不存在時建立）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self):
+        """舊的歷史紀錄檔沒有row_key / media_check欄位：加上欄位並補上既有結果的雜湊"""
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(results)')}
+        if 'media_check' not in columns:
+            self._conn.execute('ALTER TABLE results ADD COLUMN media_check TEXT')
+        if 'row_key' not in columns:
+            self._conn.execute('ALTER TABLE results ADD COLUMN row_key TEXT')
+            rows = self._conn.execute('SELECT rowid, name, url FROM results').fetchall()
+            self._conn.executemany('UPDATE results SET row_key = ? WHERE rowid = ?',
+                                   [(row_fingerprint(row['name'], row['url'] or ''), row['rowid']) for row in rows])
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_row_key ON results (row_key, recorded_at)')
+
+    def start_run(self, source=None, label=None):
+        """開始一次執行，回傳run_id
+        :param source: 執行來源（例如 'cli'、'web'、'shard'）
+        :param label: 說明（例如Excel檔名）
+        """
+        with self._lock:
+            cursor = self._conn.execute('INSERT INTO runs (started_at, source, label) VALUES (?, ?, ?)',
+                                        (time.time(), source, label))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        with self._lock:
+            self._conn.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), run_id))
+            self._conn.commit()
+
+    def record(self, run_id, result, recorded_at=None):
+        """保存一間餐廳的檢查結果（同一run中同一間餐廳以最後一次為準）
+        :param recorded_at: 實際檢查的時間（time.time()），由快取取得的結果保留原本的時間，不會因此延長有效期
+        """
+        url = result.get('URL') or ''
+        status = result.get('狀態')
+        media_check = verification_fields(result)
+        row = {
+            'run_id': run_id,
+            'restaurant_id': canonical_url(url),
+            'row_key': row_fingerprint(result.get('餐廳名稱'), url),
+            'name': result.get('餐廳名稱'),
+            'url': url,
+            'checked_at': result.get('檢查時間'),
+            'recorded_at': time.time() if recorded_at is None else recorded_at,
+            'status': status,
+            'category': status_category(status),
+            'passed': result.get('通過率'),
+            'error': result.get('錯誤資訊'),
+            # 媒體連結驗證的欄位（JSON，沒有驗證時為NULL）
+            'media_check': json.dumps(media_check, ensure_ascii=False) if media_check else None,
+        }
+        row.update({column: result.get(item) for item, column in ITEM_COLUMNS.items()})
+        columns = ', '.join(row)
+        placeholders = ', '.join(f':{column}' for column in row)
+        with self._lock:
+            self._conn.execute(f'INSERT OR REPLACE INTO results ({columns}) VALUES ({placeholders})', row)
+            self._conn.commit()
+
+    def record_run(self, results, source=None, label=None):
+        """把一整批結果保存為一次執行（例如合併分片的檢查點時），回傳run_id"""
+        run_id = self.start_run(source, label)
+        for result in results:
+            self.record(run_id, result)
+        self.finish_run(run_id)
+        return run_id
+
+    def latest_run_id(self):
+        """最近一次有結果的run_id（沒有紀錄時為None）"""
+        with self._lock:
+            return self._conn.execute('SELECT MAX(run_id) FROM results').fetchone()[0]
+
+    def runs(self):
+        """所有執行與各自的餐廳數、合格數（新到舊）"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT runs.*, COUNT(results.restaurant_id) AS restaurants,
+                          SUM(results.category = ?) AS passed
+                   FROM runs LEFT JOIN results USING (run_id)
+                   GROUP BY runs.run_id ORDER BY runs.run_id DESC""", (CATEGORY_PASSED,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _resolve(self, run_id):
+        return self.latest_run_id() if run_id is None else run_id
+
+    def status_changes(self, run_id=None):
+        """狀態分類與上次不同的餐廳
+        :param run_id: 本次的run_id，None時為最近一次
+        """
+        run_id = self._resolve(run_id)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""WITH {_PREVIOUS}
+                    SELECT cur.restaurant_id, cur.name, cur.url,
+                           previous.run_id AS previous_run_id, previous.checked_at AS previous_checked_at,
+                           previous.status AS previous_status, previous.category AS previous_category,
+                           cur.status, cur.category
+                    FROM results cur JOIN previous USING (restaurant_id)
+                    WHERE cur.run_id = :run_id AND cur.category != previous.category""",
+                {'run_id': run_id}).fetchall()
+        return [dict(row) for row in rows]
+
+    def newly_missing(self, run_id=None):
+        """上次通過（✓）、本次未通過（✗）的項目，每個項目一行（逾時不算缺少）
+        :param run_id: 本次的run_id，None時為最近一次
+        """
+        run_id = self._resolve(run_id)
+        per_item = ' UNION ALL '.join(
+            f"""SELECT cur.restaurant_id, cur.name, cur.url, '{item}' AS item
+                FROM results cur JOIN previous USING (restaurant_id)
+                WHERE cur.run_id = :run_id AND previous.{column} = '✓' AND cur.{column} = '✗'"""
+            for item, column in ITEM_COLUMNS.items())
+        with self._lock:
+            rows = self._conn.execute(f'WITH {_PREVIOUS} {per_item}', {'run_id': run_id}).fetchall()
+        return [dict(row) for row in rows]
+
+    def timeline(self, url):
+        """某間餐廳的歷次結果（舊到新），url可以是任何能對應到同一標準URL的網址"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT results.*, runs.started_at FROM results JOIN runs USING (run_id)
+                   WHERE restaurant_id = ? ORDER BY run_id""", (canonical_url(url),)).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_results(self, run_id=None):
+        """指定run（預設最近一次）的結果，欄位與檢查結果相同（可用於「上次不合格的先檢查」）"""
+        run_id = self._resolve(run_id)
+        with self._lock:
+            rows = self._conn.execute('SELECT * FROM results WHERE run_id = ?', (run_id,)).fetchall()
+        return [_row_result(row) for row in rows]
+
+    def fresh_results(self, row_keys, max_age):
+        """有效時間內的結果（逾時與錯誤的結果不算），每個行雜湊取最近一次
+        :param row_keys: row_fingerprint 的清單
+        :param max_age: 有效時間（秒）
+        :return: {row_key: (結果, recorded_at)}
+        """
+        keys = list(dict.fromkeys(row_keys))
+        cutoff = time.time() - max_age
+        found = {}
+        with self._lock:
+            # SQLite每個查詢的參數數量有限，分批查詢
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"""SELECT * FROM results
+                        WHERE row_key IN ({', '.join('?' * len(chunk))}) AND recorded_at >= ?
+                          AND category NOT IN ({', '.join('?' * len(_UNCACHEABLE))})
+                        ORDER BY recorded_at""", (*chunk, cutoff, *_UNCACHEABLE)).fetchall()
+                for row in rows:
+                    found[row['row_key']] = (_row_result(row), row['recorded_at'])
+        return found
+
+    def delta_rows(self, run_id=None):
+        """與上次相比有變化的餐廳（狀態分類改變，或有項目 ✓→✗ 新缺少、✗→✓ 恢復），作為報告的「與上次比較」工作表
+        :param run_id: 本次的run_id，None時為最近一次
+        """
+        run_id = self._resolve(run_id)
+        item_columns = ', '.join(f'cur.{column} AS cur_{column}, previous.{column} AS previous_{column}'
+                                 for column in ITEM_COLUMNS.values())
+        changed = ' OR '.join(f'cur.{column} IS NOT previous.{column}' for column in ITEM_COLUMNS.values())
+        with self._lock:
+            rows = self._conn.execute(
+                f"""WITH {_PREVIOUS}
+                    SELECT cur.name, cur.url, previous.checked_at AS previous_checked_at,
+                           previous.status AS previous_status, previous.category AS previous_category,
+                           cur.status, cur.category, {item_columns}
+                    FROM results cur JOIN previous USING (restaurant_id)
+                    WHERE cur.run_id = :run_id AND (cur.category != previous.category OR {changed})
+                    ORDER BY cur.name""",
+                {'run_id': run_id}).fetchall()
+
+        delta = []
+        for row in rows:
+            missing = [item for item, column in ITEM_COLUMNS.items()
+                       if row[f'previous_{column}'] == '✓' and row[f'cur_{column}'] == '✗']
+            recovered = [item for item, column in ITEM_COLUMNS.items()
+                         if row[f'previous_{column}'] == '✗' and row[f'cur_{column}'] == '✓']
+            # 只有逾時/錯誤造成的項目差異（分類相同且沒有新缺少或恢復的項目）不列出
+            if row['category'] == row['previous_category'] and not missing and not recovered:
+                continue
+            delta.append({
+                '餐廳名稱': row['name'],
+                'URL': row['url'],
+                '上次檢查時間': row['previous_checked_at'],
+                '上次狀態': row['previous_status'],
+                '本次狀態': row['status'],
+                '狀態變化': (f"{row['previous_category']} → {row['category']}"
+                         if row['category'] != row['previous_category'] else ''),
+                '新缺少項目': '、'.join(missing),
+                '恢復項目': '、'.join(recovered),
+            })
+        return delta
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _row_result(row):
+    """資料表的一行轉回檢查結果的格式"""
+    result = {'餐廳名稱': row['name'], 'URL': row['url'], '檢查時間': row['checked_at'],
+              '通過率': row['passed'], '狀態': row['status']}
+    result.update({item: row[column] for item, column in ITEM_COLUMNS.items()})
+    if row['error']:
+        result['錯誤資訊'] = row['error']
+    if row['media_check']:
+        result.update(json.loads(row['media_check']))
+    return result
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='查詢檢查結果的歷史紀錄')
+    parser.add_argument('database', help='歷史紀錄檔（SQLite）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('runs', help='列出所有執行')
+    changes = subparsers.add_parser('changes', help='與上次相比有變化的餐廳')
+    changes.add_argument('--run', type=int, help='run_id（預設最近一次）')
+    timeline = subparsers.add_parser('timeline', help='某間餐廳的歷次結果')
+    timeline.add_argument('url', help='餐廳URL')
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.database)
+    try:
+        if args.command == 'runs':
+            for run in store.runs():
+                started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started_at']))
+                print(f"#{run['run_id']} {started} {run['source'] or ''} {run['label'] or ''} "
+                      f"{run['passed'] or 0}/{run['restaurants']} 合格")
+        elif args.command == 'changes':
+            rows = store.delta_rows(args.run)
+            for row in rows:
+                details = [text for text in (row['狀態變化'],
+                                             row['新缺少項目'] and f"新缺少：{row['新缺少項目']}",
+                                             row['恢復項目'] and f"恢復：{row['恢復項目']}") if text]
+                print(f"{row['餐廳名稱']} ({row['URL']}): {'；'.join(details)}")
+            print(f"共 {len(rows)} 間餐廳有變化")
+        else:
+            for row in store.timeline(args.url):
+                print(f"#{row['run_id']} {row['checked_at']} {row['status']} ({row['passed']})")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""檢查程式的日誌設定
+
+取代原本在熱路徑中每行都 print + sys.stdout.flush() 的做法：
+- 分級日誌（DEBUG 為逐個選擇器/圖片的細節，INFO 為每間餐廳的摘要）
+- 緩衝輸出，減少 Railway 日誌管線需要處理的阻塞寫入次數
+- 安靜模式（生產環境）只輸出每間餐廳的摘要與警告
+- 每間餐廳的摘要有速率限制，避免大批量時洗版
+- 可選的 JSON 日誌格式
+
+環境變量：
+- LOG_LEVEL: DEBUG / INFO / WARNING（預設 INFO）
+- LOG_FORMAT: text / json（預設 text）
+- CHECKER_QUIET: 設為 1 啟用安靜模式
+- LOG_SUMMARY_RATE: 每秒最多輸出幾筆餐廳摘要（預設 5）
+"""
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+LOGGER_NAME = 'openrice_checker'
+SUMMARY_LOGGER_NAME = LOGGER_NAME + '.summary'
+
+logger = logging.getLogger(LOGGER_NAME)
+summary_logger = logging.getLogger(SUMMARY_LOGGER_NAME)
+
+# 附加在日誌記錄上、需要輸出到JSON的欄位
+_EXTRA_FIELDS = ('restaurant', 'url', 'status', 'passed', 'elapsed', 'rate', 'backend', 'stage')
+
+
+class JsonFormatter(logging.Formatter):
+    """將日誌記錄輸出為單行JSON"""
+
+    def format(self, record):
+        payload = {
+            'ts': _format_time(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in _EXTRA_FIELDS:
+            if hasattr(record, field):
+                payload[field] = getattr(record, field)
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def _format_time(record):
+    """日誌記錄的時間（ISO格式，毫秒精度）"""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + '.%03d' % record.msecs
+
+
+class RateLimitFilter(logging.Filter):
+    """限制每個時間窗口內通過的日誌筆數，超出的筆數會累計在下一筆輸出的訊息中"""
+
+    def __init__(self, max_per_interval=5, interval=1.0):
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self._window_start = time.monotonic()
+        self._count = 0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # 警告以上的記錄不受限制
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.interval:
+                self._window_start = now
+                self._count = 0
+            if self._count >= self.max_per_interval:
+                self._suppressed += 1
+                return False
+            self._count += 1
+            if self._suppressed:
+                record.msg = f"{record.msg}（已省略 {self._suppressed} 筆摘要）"
+                self._suppressed = 0
+        return True
+
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    """緩衝日誌記錄，在緩衝區滿、出現警告以上記錄或超過flush間隔時才寫出"""
+
+    def __init__(self, target, capacity=200, flush_interval=2.0):
+        super().__init__(capacity, flushLevel=logging.WARNING, target=target, flushOnClose=True)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+    def shouldFlush(self, record):
+        return (super().shouldFlush(record) or
+                time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def flush(self):
+        super().flush()
+        self._last_flush = time.monotonic()
+
+
+def _env_flag(name):
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def setup_logging(level=None, json_format=None, quiet=None, buffered=True, stream=None):
+    """設定檢查程式的日誌輸出（可重複呼叫，會替換之前的handler）
+    :param level: 日誌等級（名稱或數值），預設讀取LOG_LEVEL環境變量
+    :param json_format: 是否輸出JSON格式，預設讀取LOG_FORMAT環境變量
+    :param quiet: 安靜模式，只輸出每間餐廳的摘要和警告，預設讀取CHECKER_QUIET環境變量
+    :param buffered: 是否緩衝輸出（False時每筆記錄立即寫出）
+    :param stream: 輸出串流，預設sys.stdout
+    """
+    if level is None:
+        level = os.environ.get('LOG_LEVEL', 'INFO')
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    if json_format is None:
+        json_format = os.environ.get('LOG_FORMAT', 'text').strip().lower() == 'json'
+    if quiet is None:
+        quiet = _env_flag('CHECKER_QUIET')
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    if json_format:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    handler = BufferedHandler(stream_handler) if buffered else stream_handler
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+        old.close()
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    if quiet:
+        logger.setLevel(logging.WARNING)
+        # 安靜模式下仍保留每間餐廳的摘要
+        summary_logger.setLevel(logging.INFO)
+    else:
+        logger.setLevel(level)
+        summary_logger.setLevel(logging.NOTSET)
+
+    for old in list(summary_logger.filters):
+        summary_logger.removeFilter(old)
+    rate = float(os.environ.get('LOG_SUMMARY_RATE', '5'))
+    if rate > 0:
+        summary_logger.addFilter(RateLimitFilter(max_per_interval=max(1, int(rate)), interval=1.0))
+
+    return logger
+
+
+def flush_logs():
+    """立即寫出緩衝中的日誌（例如批次完成或程式結束前）"""
+    for handler in logger.handlers:
+        handler.flush()
@@ -0,0 +1,154 @@
+"""媒體連結驗證（檢查找到的照片/影片URL是否仍然有效）
+
+菜單、相關影片等項目只要頁面中出現一個符合條件的 userphoto / c-vod.orstatic.com URL 就算通過，
+即使該檔案已經回傳404。啟用驗證時，每間餐廳每個項目抽樣最多 sample_size 個通過檢查的URL，
+在背景以 HEAD（伺服器不支援時改用 Range: bytes=0-0 的GET）確認是否存在：
+
+- 所有餐廳的驗證共用一個執行緒池與連線池（requests.Session），不會阻塞檢查流程，
+  檢查下一間餐廳的同時驗證上一間的連結，整批只在最後等待尚未完成的驗證
+- 每個CDN主機有自己的並行上限，不會對單一CDN送出大量請求
+- 同時送出的相同URL只驗證一次（完成的驗證不保留，長時間執行的worker不會持續佔用記憶體）
+
+驗證結果只加入報告（「<項目>連結驗證」欄位為 有效數/已驗證數，以及「媒體連結失效」），
+不改變項目的 ✓/✗ 與狀態。照片總覽的分類數量判斷的項目沒有URL，不會被驗證。
+apply() 回傳被更新的結果，呼叫者再把它們重新寫入檢查點與歷史紀錄（歷史紀錄的 media_check 欄位）。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from log_config import logger
+from metrics import MEDIA_CHECKS
+
+# 可以驗證的項目（其餘項目沒有媒體URL）
+MEDIA_ITEMS = ['門面照片', '菜單', '餐點照片', '相關影片']
+# 報告欄位：每個項目的「有效數/已驗證數」與通過檢查但抽樣連結全部失效的項目
+VERIFY_COLUMN_SUFFIX = '連結驗證'
+DEAD_MEDIA_COLUMN = '媒體連結失效'
+# 不支援HEAD時改用Range GET的狀態碼
+HEAD_UNSUPPORTED = frozenset([403, 405, 501])
+# 整批結束時最多等待尚未完成的驗證幾秒（中斷時不等待）
+APPLY_TIMEOUT = 60
+
+LIVE = 'live'
+DEAD = 'dead'
+ERROR = 'error'
+
+
+class MediaVerifier:
+    def __init__(self, sample_size=3, workers=16, per_host=4, timeout=5.0, user_agent=None):
+        """
+        :param sample_size: 每間餐廳每個項目最多驗證幾個URL
+        :param workers: 驗證執行緒數（也是連線池大小）
+        :param per_host: 每個CDN主機同時進行的驗證數上限
+        :param timeout: 每個請求的超時（秒）
+        :param user_agent: 請求的User-Agent
+        """
+        self.sample_size = sample_size
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-verify')
+        self._host_limits = {}
+        # 進行中的驗證 {URL: Future}（完成時移除）
+        self._futures = {}
+        # 尚未寫入結果的 (結果, {項目: [Future]})
+        self._pending = []
+        self._lock = threading.Lock()
+        self.stats = {LIVE: 0, DEAD: 0, ERROR: 0}
+
+    @contextmanager
+    def _host_slot(self, host):
+        with self._lock:
+            limit = self._host_limits.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        with limit:
+            yield
+
+    def _check(self, url):
+        """回傳 LIVE / DEAD / ERROR（連線失敗、超時或URL無法解析，無法判斷）"""
+        try:
+            host = urlsplit(url).hostname or ''
+        except ValueError:
+            host = ''
+        with self._host_slot(host):
+            try:
+                response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+                if response.status_code in HEAD_UNSUPPORTED:
+                    response = self.session.get(url, headers={'Range': 'bytes=0-0'}, timeout=self.timeout,
+                                                stream=True)
+                    response.close()
+                outcome = LIVE if response.status_code < 400 else DEAD
+            except Exception as e:
+                # 頁面中的URL可能格式錯誤（例如urllib3的LocationParseError），不能讓一個URL影響整批結果
+                logger.debug(f"  媒體連結驗證失敗 {url[:80]}: {e}")
+                outcome = ERROR
+        MEDIA_CHECKS.inc(host=host, result=outcome)
+        with self._lock:
+            self.stats[outcome] += 1
+        return outcome
+
+    def _submit_url(self, url):
+        with self._lock:
+            future = self._futures.get(url)
+            if future is not None:
+                return future
+            future = self._futures[url] = self._executor.submit(self._check, url)
+        # 在鎖外登記：已完成的Future會在本執行緒立刻呼叫callback
+        future.add_done_callback(lambda done: self._forget(url, done))
+        return future
+
+    def _forget(self, url, future):
+        with self._lock:
+            if self._futures.get(url) is future:
+                del self._futures[url]
+
+    def submit(self, result, media_urls):
+        """在背景驗證一間餐廳的媒體URL，結果在 apply() 時寫入result
+        :param result: 檢查結果（dict）
+        :param media_urls: {項目: [URL]}（通過檢查時找到的URL）
+        """
+        futures = {item: [self._submit_url(url) for url in urls[:self.sample_size]]
+                   for item, urls in media_urls.items() if urls}
+        if futures:
+            with self._lock:
+                self._pending.append((result, futures))
+
+    def apply(self, timeout=None):
+        """等待已送出的驗證完成，並把驗證結果寫入各結果的報告欄位
+        :param timeout: 最長等待時間（秒），未完成的URL不計入
+        :return: 寫入了驗證欄位的結果（呼叫者需要重新保存到檢查點與歷史紀錄）
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        wait([future for _, futures in pending for item_futures in futures.values() for future in item_futures],
+             timeout=timeout)
+        for result, futures in pending:
+            dead_items = []
+            for item, item_futures in futures.items():
+                outcomes = [future.result() for future in item_futures if future.done() and not future.cancelled()]
+                checked = [outcome for outcome in outcomes if outcome != ERROR]
+                live = checked.count(LIVE)
+                result[f'{item}{VERIFY_COLUMN_SUFFIX}'] = f'{live}/{len(checked)}' if checked else '無法驗證'
+                if checked and not live and result.get(item) == '✓':
+                    dead_items.append(item)
+            result[DEAD_MEDIA_COLUMN] = '、'.join(dead_items)
+        return [result for result, _ in pending]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+def verification_fields(result):
+    """結果中的媒體連結驗證欄位（保存到歷史紀錄用）"""
+    return {key: value for key, value in result.items()
+            if key == DEAD_MEDIA_COLUMN or key.endswith(VERIFY_COLUMN_SUFFIX)}
@@ -0,0 +1,294 @@
+"""檢查流程的階段耗時統計與Prometheus格式的行程內指標
+
+每個頁面類型（主頁、門面、菜單、餐點、影片）與抓取後端的組合各自累計耗時，
+供基準測試與日誌摘要使用。
+
+長時間執行的部署（Streamlit / Railway）另外累計整個行程的計數器與直方圖：
+檢查的餐廳數、各項目通過/未通過、各頁面類型與後端的抓取延遲、瀏覽器重啟次數、
+快取命中與限速器狀態，由 start_metrics_server 以 /metrics（Prometheus文字格式）提供，
+不需要從日誌中搜尋才能看出變慢或失敗增加。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from log_config import logger
+
+
+def page_type_of(url):
+    """由URL判斷頁面類型：main / photos（照片總覽）/ decor / food / videos / menu"""
+    path = url.split('?', 1)[0].rstrip('/')
+    if path.endswith('/menus'):
+        return 'menu'
+    if path.endswith('/photos'):
+        return 'photos'
+    if '/photos/' in path:
+        return path.rsplit('/photos/', 1)[1].split('/', 1)[0] or 'photos'
+    return 'main'
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class StageTimer:
+    """以 (階段, 後端) 為鍵累計耗時（執行緒安全）"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, backend=None):
+        key = (stage, backend or '-')
+        with self._lock:
+            self._samples.setdefault(key, []).append(seconds)
+        FETCH_SECONDS.observe(seconds, page_type=stage, backend=backend or '-')
+
+    @contextmanager
+    def time(self, stage, backend=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, backend)
+
+    def merge(self, other):
+        """合併另一個StageTimer的樣本（多個檢查器彙總時使用）"""
+        with other._lock:
+            items = [(key, list(values)) for key, values in other._samples.items()]
+        with self._lock:
+            for key, values in items:
+                self._samples.setdefault(key, []).extend(values)
+
+    def summary(self):
+        """各階段的次數、平均、p50、p95與總耗時（秒）"""
+        with self._lock:
+            items = [(key, sorted(values)) for key, values in self._samples.items()]
+        result = {}
+        for (stage, backend), values in sorted(items):
+            result[f'{stage}/{backend}'] = {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p50': _percentile(values, 0.5),
+                'p95': _percentile(values, 0.95),
+                'total': sum(values),
+            }
+        return result
+
+
+# 抓取延遲的直方圖區間（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """只增不減的計數器（執行緒安全）"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                                for key, value in items]
+
+
+class Histogram(_Metric):
+    """累計區間的直方圖（執行緒安全）"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, {"le": _format_value(float(bound))})} '
+                             f'{count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total!r}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}')
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """抓取/metrics時才呼叫callback取值的量表，callback回傳 {標籤值tuple: 數值}"""
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels, callback):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def render(self):
+        try:
+            values = self.callback()
+        except Exception as e:
+            logger.debug(f"讀取指標 {self.name} 失敗: {e}")
+            values = {}
+        return self.header() + [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                                for key, value in sorted(values.items())]
+
+
+class MetricsRegistry:
+    """整個行程的指標（依註冊順序輸出）"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus文字格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _rate_limiter_state(field):
+    """共用限速器各主機的狀態（rate / tokens / blocked_for）"""
+    def collect():
+        from rate_limiter import get_rate_limiter
+        return {(host, ): state[field] for host, state in get_rate_limiter().metrics().items()}
+    return collect
+
+
+def _route_state():
+    """共用後端路由各頁面類型目前的路由"""
+    from backend_router import ROUTE_REQUESTS, get_backend_router
+    return {(page_type, ): int(state['route'] == ROUTE_REQUESTS)
+            for page_type, state in get_backend_router().stats().items()}
+
+
+REGISTRY = MetricsRegistry()
+RESTAURANTS_CHECKED = REGISTRY.register(Counter(
+    'openrice_restaurants_checked_total', '已檢查的餐廳數（依狀態分類）', ('category',)))
+RESTAURANT_SECONDS = REGISTRY.register(Histogram(
+    'openrice_restaurant_seconds', '每間餐廳的檢查耗時（秒）', buckets=(1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180, 300)))
+CHECK_RESULTS = REGISTRY.register(Counter(
+    'openrice_check_results_total', '各檢查項目的結果（passed / failed / timeout）', ('item', 'result')))
+FETCH_SECONDS = REGISTRY.register(Histogram(
+    'openrice_fetch_seconds', '各頁面類型與抓取後端的耗時（秒），後端加上 _error 表示失敗', ('page_type', 'backend')))
+BROWSER_RESTARTS = REGISTRY.register(Counter(
+    'openrice_browser_restarts_total', '瀏覽器失效後重新啟動的次數', ('backend',)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'openrice_cache_lookups_total',
+    '快取查詢結果（archive: 頁面存檔，conditional: 條件請求304，photo_inventory: 照片總覽的分類數量）',
+    ('cache', 'result')))
+QUEUE_EVENTS = REGISTRY.register(Counter(
+    'openrice_queue_events_total', '工作佇列事件（claimed / acked / duplicate / released / gave_up）', ('event',)))
+MEDIA_CHECKS = REGISTRY.register(Counter(
+    'openrice_media_checks_total', '媒體連結驗證結果（live / dead / error）', ('host', 'result')))
+ROUTE_SAMPLES = REGISTRY.register(Counter(
+    'openrice_route_samples_total', '同時以requests與瀏覽器取得同一頁面的抽樣比較結果（agree / disagree）',
+    ('page_type', 'result')))
+REGISTRY.register(CallbackGauge(
+    'openrice_route_uses_requests', '各頁面類型目前是否改用requests（1）或使用瀏覽器（0）', ('page_type',),
+    _route_state))
+REGISTRY.register(CallbackGauge(
+    'openrice_rate_limit_rate', '限速器目前的速率（每秒請求數）', ('host',), _rate_limiter_state('rate')))
+REGISTRY.register(CallbackGauge(
+    'openrice_rate_limit_tokens', '限速器目前可用的令牌數', ('host',), _rate_limiter_state('tokens')))
+REGISTRY.register(CallbackGauge(
+    'openrice_rate_limit_blocked_seconds', '因429/Retry-After暫停請求的剩餘秒數', ('host',),
+    _rate_limiter_state('blocked_for')))
+
+# /metrics 端點的預設埠（環境變量METRICS_PORT，0表示不啟動）
+DEFAULT_METRICS_PORT = 9464
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, host='127.0.0.1', registry=None):
+    """在背景執行緒提供 http://host:port/metrics，埠已被佔用時回傳None（不影響檢查）"""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"無法啟動指標端點 {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    server.registry = registry or REGISTRY
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"指標端點: http://{host}:{server.server_address[1]}/metrics")
+    return server
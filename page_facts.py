@@ -0,0 +1,402 @@
+"""頁面事實（檢查規則實際需要的資料）
+
+check_* 方法只需要頁面中的少量資訊：名稱相關元素的文字、圖片的 src/alt/class、
+iframe來源、video數量與空狀態文字。Selenium模式下在頁面中執行一段JavaScript
+（FACTS_SCRIPT）直接回傳這些資料的精簡JSON，不需要用 driver.page_source 把整個DOM
+傳回Python再用BeautifulSoup解析；requests與重播模式則用 extract_facts(soup)
+從BeautifulSoup取出相同結構的資料。兩種方式的選擇器與關鍵字都來自本模組的常數。
+"""
+import re
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+# 中文/英文名稱的選擇器（依序嘗試，取第一個符合的元素）
+CHINESE_NAME_SELECTORS = [
+    'h1[class*="name"]',
+    '.restaurant-name',
+    'h1',
+    '[class*="中文"]',
+    '[data-name]',
+    '.poi-name',
+    '[class*="poi-name"]',
+    '[class*="poi"] h1',  # 更廣泛的選擇器
+    'h1.poi-name',  # 組合選擇器
+    '[class*="title"] h1',  # 標題區域的h1
+]
+ENGLISH_NAME_SELECTORS = [
+    '.pdhs-en-section',  # OpenRice特定的英文名稱類
+    '[class*="pdhs-en-section"]',
+    '[class*="english"]',
+    '[class*="en-name"]',
+    '[class*="english-name"]',
+    'h2',
+    '.restaurant-name-en',
+    '[class*="name-en"]',
+    '[class*="poi"] h2',  # 更廣泛的選擇器
+    'h2.poi-name-en',  # 組合選擇器
+]
+
+# 圖片所在容器的分組（圖片的 containers 欄位記錄它位於哪些分組的容器中）
+PHOTO_LIST_SELECTORS = [
+    '[class*="media-list"]',
+    '[class*="photo-list"]',
+    '[class*="image-list"]',
+    '[class*="gallery"]',
+    '[class*="photo-grid"]',
+]
+CONTAINER_SELECTORS = {
+    'photo_list': PHOTO_LIST_SELECTORS,
+    'menu_list': PHOTO_LIST_SELECTORS + [
+        '[class*="menu"]',  # 菜單相關的容器
+        '[class*="menu-photo"]',  # 菜單照片容器
+        '[class*="menu-item"]',  # 菜單項目
+    ],
+    'video': ['[class*="video"]', '[class*="reel"]', '[class*="media"]'],
+    'main_photo': ['.restaurant-photo', '.main-photo', '[class*="main-photo"]', '[class*="cover-photo"]'],
+}
+
+# 空狀態關鍵字（在整頁文字中尋找，區分大小寫）
+VIDEO_EMPTY_KEYWORDS = [
+    '此餐廳暫時沒有影片',
+    '此餐厅暂时没有视频',
+    '暫無影片',
+    '暂无视频',
+    '沒有影片',
+    '没有视频',
+    '尚無影片',
+    '尚无视频',
+    'no video',
+    'no videos',
+    '暫時沒有',
+    '暂时没有',
+    '尚無相關',
+    '暂无相关'
+]
+MENU_EMPTY_KEYWORDS = [
+    '此餐廳暫時沒有菜單',
+    '此餐厅暂时没有菜单',
+    '暫無菜單',
+    '暂无菜单',
+    '沒有菜單',
+    '没有菜单',
+    '尚無菜單',
+    '尚无菜单',
+    'no menu',
+    '暫時沒有',
+    '暂时没有'
+]
+EMPTY_KEYWORDS = list(dict.fromkeys(VIDEO_EMPTY_KEYWORDS + MENU_EMPTY_KEYWORDS))
+
+# 主頁面上表示有影片的元素與文字（只在沒有 /photos/videos 頁面時使用）
+VIDEO_MARKUP_SELECTORS = [
+    'video',
+    'iframe[src*="youtube"]',
+    'iframe[src*="vimeo"]',
+    'iframe[src*="video"]',
+    '[class*="video"]',
+    '[id*="video"]',
+    '[class*="youtube"]'
+]
+VIDEO_LINK_PLATFORMS = ['youtube', 'vimeo', 'video', 'youku']
+VIDEO_WORDS = ['影片', '视频', 'video', 'youtube']
+# 不算在頁面文字中的元素（內嵌的SPA狀態、i18n JSON、樣式等；與BeautifulSoup的 get_text 一致）
+HIDDEN_TEXT_TAGS = ['script', 'style', 'noscript', 'template']
+
+# 照片總覽頁的分類（分類連結 /photos/<分類> 的文字或data-count中的數字即該分類的數量）
+PHOTO_CATEGORIES = ['decor', 'food', 'menu', 'videos']
+_CATEGORY_PATH = re.compile(r'/photos/(%s)$' % '|'.join(PHOTO_CATEGORIES))
+_COUNT = re.compile(r'\d[\d,]*')
+
+
+@dataclass
+class PageFacts:
+    url: str = ''
+    html_length: int = 0
+    text_length: int = 0
+    has_body: bool = False
+    mentions_openrice: bool = False
+    # 選擇器 -> 第一個符合元素的文字（get_text(strip=True)）
+    first_text: dict = field(default_factory=dict)
+    h1_texts: list = field(default_factory=list)
+    # 每張圖片: {'src', 'alt', 'class', 'containers'}
+    images: list = field(default_factory=list)
+    iframe_srcs: list = field(default_factory=list)
+    video_count: int = 0
+    # 頁面文字中出現的空狀態關鍵字
+    empty_keywords: list = field(default_factory=list)
+    # 是否有影片相關的元素或連結（主頁面備用檢查）
+    video_markup: bool = False
+    # 頁面文字（小寫）是否提到影片
+    mentions_video: bool = False
+    # 分類連結上的數量 {分類: 數量}（只包含連結上有數字的分類）
+    category_counts: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data, url=''):
+        """由 FACTS_SCRIPT 的回傳值建立（忽略未知欄位）"""
+        return cls(url=url, **{name: data[name] for name in cls.__dataclass_fields__ if name in data and name != 'url'})
+
+    def images_in(self, container):
+        return [image for image in self.images if container in image['containers']]
+
+    def has_empty_keyword(self, keywords):
+        """回傳第一個出現在頁面中的空狀態關鍵字，沒有時回傳None"""
+        for keyword in keywords:
+            if keyword in self.empty_keywords:
+                return keyword
+        return None
+
+    def summary(self):
+        """與檢查結果有關的摘要，用來比較兩個後端取得的同一頁面是否一致
+        （名稱文字、是否有OpenRice照片/影片、空狀態關鍵字、各分類是否有項目；不比較數量與長度）
+        """
+        media = ('userphoto', 'orstatic.com', '/photo/')
+        return (
+            tuple(sorted((selector, text) for selector, text in self.first_text.items() if text)),
+            tuple(text for text in self.h1_texts if text),
+            any(image['src'] and any(marker in image['src'] for marker in media) for image in self.images),
+            bool(self.video_count or self.iframe_srcs or self.video_markup),
+            tuple(sorted(self.empty_keywords)),
+            tuple(sorted((category, count > 0) for category, count in self.category_counts.items())),
+        )
+
+
+def script_arguments():
+    """傳給 FACTS_SCRIPT 的參數（選擇器與關鍵字）"""
+    return {
+        'nameSelectors': list(dict.fromkeys(CHINESE_NAME_SELECTORS + ENGLISH_NAME_SELECTORS)),
+        'containers': CONTAINER_SELECTORS,
+        'emptyKeywords': EMPTY_KEYWORDS,
+        'videoSelectors': VIDEO_MARKUP_SELECTORS,
+        'videoPlatforms': VIDEO_LINK_PLATFORMS,
+        'videoWords': VIDEO_WORDS,
+        'categories': PHOTO_CATEGORIES,
+        'hiddenTextTags': HIDDEN_TEXT_TAGS,
+    }
+
+
+# 在頁面中執行，回傳與 extract_facts 相同結構的資料
+FACTS_SCRIPT = """
+const args = arguments[0];
+const root = document.documentElement;
+// 與BeautifulSoup的 get_text 相同：不包括 script / style / noscript / template 中的文字（見 HIDDEN_TEXT_TAGS）
+const hiddenTags = new Set(args.hiddenTextTags.map(tag => tag.toUpperCase()));
+const textNodes = (el) => {
+    const walker = document.createTreeWalker(el, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+        acceptNode: (node) => {
+            if (node.nodeType === Node.TEXT_NODE) { return NodeFilter.FILTER_ACCEPT; }
+            return hiddenTags.has(node.nodeName) ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_SKIP;
+        }
+    });
+    const nodes = [];
+    while (walker.nextNode()) { nodes.push(walker.currentNode.nodeValue); }
+    return nodes;
+};
+// 與BeautifulSoup的 get_text(strip=True) 相同：每段文字去掉前後空白後直接連接
+const strippedText = (el) => textNodes(el).map(text => text.trim()).filter(text => text).join('');
+const safeQuery = (selector) => {
+    try { return document.querySelector(selector); } catch (e) { return null; }
+};
+const safeMatches = (el, selector) => {
+    try { return el.closest(selector) !== null; } catch (e) { return false; }
+};
+const firstText = {};
+for (const selector of args.nameSelectors) {
+    const el = safeQuery(selector);
+    if (el) { firstText[selector] = strippedText(el); }
+}
+const images = Array.from(document.querySelectorAll('img')).map(img => {
+    const src = img.getAttribute('src') || img.getAttribute('data-src') || img.getAttribute('data-lazy-src')
+        || img.getAttribute('data-original') || img.getAttribute('data-lazy') || '';
+    const containers = [];
+    for (const [name, selectors] of Object.entries(args.containers)) {
+        if (selectors.some(selector => img.parentElement && safeMatches(img.parentElement, selector))) {
+            containers.push(name);
+        }
+    }
+    return {src: src, alt: img.getAttribute('alt') || '', 'class': img.getAttribute('class') || '', containers: containers};
+});
+const categoryCounts = {};
+for (const a of document.querySelectorAll('a[href]')) {
+    let path;
+    try { path = new URL(a.getAttribute('href'), location.href).pathname.replace(/\\/$/, ''); } catch (e) { continue; }
+    const category = args.categories.find(name => path.endsWith('/photos/' + name));
+    if (!category || category in categoryCounts) { continue; }
+    const count = (a.getAttribute('data-count') || strippedText(a)).match(/\\d[\\d,]*/);
+    if (count) { categoryCounts[category] = parseInt(count[0].replace(/,/g, ''), 10); }
+}
+const text = textNodes(root).join('');
+const lowerText = text.toLowerCase();
+const videoMarkup = args.videoSelectors.some(selector => {
+    try { return document.querySelector(selector) !== null; } catch (e) { return false; }
+}) || Array.from(document.querySelectorAll('a[href]')).some(a => {
+    const href = (a.getAttribute('href') || '').toLowerCase();
+    return args.videoPlatforms.some(platform => href.includes(platform));
+});
+return {
+    html_length: root.outerHTML.length,
+    text_length: text.length,
+    has_body: document.body !== null,
+    mentions_openrice: lowerText.includes('openrice'),
+    first_text: firstText,
+    h1_texts: Array.from(document.querySelectorAll('h1')).map(strippedText),
+    images: images,
+    iframe_srcs: Array.from(document.querySelectorAll('iframe')).map(f => f.getAttribute('src') || ''),
+    video_count: document.querySelectorAll('video').length,
+    empty_keywords: args.emptyKeywords.filter(keyword => text.includes(keyword)),
+    video_markup: videoMarkup,
+    mentions_video: args.videoWords.some(word => lowerText.includes(word)),
+    category_counts: categoryCounts
+};
+"""
+
+
+def _image_src(img):
+    return (img.get('src') or img.get('data-src') or img.get('data-lazy-src') or img.get('data-original')
+            or img.get('data-lazy') or '')
+
+
+# 簡單選擇器：可選的標籤名稱，加上一個 .class、[attr] 或 [attr*="value"]
+_SIMPLE_SELECTOR = re.compile(r'^(?P<tag>[a-z0-9]*)(?:\.(?P<cls>[\w-]+)|\[(?P<attr>[\w-]+)(?:\*="(?P<value>[^"]*)")?\])?$')
+
+
+def _simple_matcher(selector):
+    """把簡單選擇器轉成直接比對屬性的函式（比soupsieve逐一比對快很多），複雜選擇器回傳None"""
+    match = _SIMPLE_SELECTOR.match(selector)
+    if not match or not (match['tag'] or match['cls'] or match['attr']):
+        return None
+    tag, cls, attr, value = match['tag'], match['cls'], match['attr'], match['value']
+
+    def matches(element):
+        if tag and element.name != tag:
+            return False
+        if cls:
+            return cls in element.get('class', [])
+        if attr:
+            actual = element.get(attr)
+            if actual is None:
+                return False
+            if value is None:
+                return True
+            if isinstance(actual, list):
+                actual = ' '.join(actual)
+            return value in actual
+        return True
+    return matches
+
+
+def _first_matches(soup, selectors):
+    """每個選擇器第一個符合的元素（文件順序）；簡單選擇器只需走訪一次所有元素"""
+    found = {}
+    simple = {}
+    for selector in selectors:
+        matcher = _simple_matcher(selector)
+        if matcher is None:
+            try:
+                element = soup.select_one(selector)
+            except Exception:
+                continue
+            if element is not None:
+                found[selector] = element
+        else:
+            simple[selector] = matcher
+    if simple:
+        for element in soup.find_all(True):
+            for selector, matcher in list(simple.items()):
+                if matcher(element):
+                    found[selector] = element
+                    del simple[selector]
+            if not simple:
+                break
+    return found
+
+
+def _container_groups(soup, images):
+    """每張圖片位於哪些分組的容器中（沿著祖先元素比對，與 FACTS_SCRIPT 的 closest() 相同）"""
+    matchers = {name: [_simple_matcher(selector) for selector in selectors]
+                for name, selectors in CONTAINER_SELECTORS.items()}
+    complex_members = {}
+    for name, selectors in CONTAINER_SELECTORS.items():
+        for selector, matcher in zip(selectors, matchers[name]):
+            if matcher is None:
+                for container in soup.select(selector):
+                    for img in container.find_all('img'):
+                        complex_members.setdefault(id(img), set()).add(name)
+
+    ancestor_groups = {}
+
+    def groups_of(element):
+        key = id(element)
+        if key not in ancestor_groups:
+            ancestor_groups[key] = {name for name, group in matchers.items()
+                                    if any(matcher is not None and matcher(element) for matcher in group)}
+        return ancestor_groups[key]
+
+    result = []
+    for img in images:
+        groups = set(complex_members.get(id(img), ()))
+        for parent in img.parents:
+            if parent.name == '[document]':
+                break
+            groups |= groups_of(parent)
+        result.append(sorted(groups))
+    return result
+
+
+def _category_counts(soup):
+    """分類連結上的數量（與 FACTS_SCRIPT 相同：每個分類取第一個有數字的連結）"""
+    counts = {}
+    for link in soup.find_all('a', href=True):
+        match = _CATEGORY_PATH.search(urlsplit(link['href']).path.rstrip('/'))
+        if not match or match.group(1) in counts:
+            continue
+        count = _COUNT.search(link.get('data-count') or link.get_text(strip=True))
+        if count:
+            counts[match.group(1)] = int(count.group().replace(',', ''))
+    return counts
+
+
+def _page_text(soup):
+    """整頁文字（get_text 已不包括 script / style / template，另外去掉 noscript 中的文字）"""
+    noscript_strings = {id(string) for element in soup.find_all('noscript') for string in element.strings}
+    if not noscript_strings:
+        return soup.get_text()
+    return ''.join(string for string in soup.strings if id(string) not in noscript_strings)
+
+
+def extract_facts(soup, url='', html_length=0):
+    """從BeautifulSoup取出與 FACTS_SCRIPT 相同結構的頁面事實"""
+    args = script_arguments()
+    first_text = {selector: element.get_text(strip=True)
+                  for selector, element in _first_matches(soup, args['nameSelectors']).items()}
+
+    img_tags = soup.find_all('img')
+    images = [{
+        'src': _image_src(img),
+        'alt': img.get('alt', '') or '',
+        'class': ' '.join(img.get('class', [])),
+        'containers': containers,
+    } for img, containers in zip(img_tags, _container_groups(soup, img_tags))]
+
+    text = _page_text(soup)
+    lower_text = text.lower()
+    video_markup = bool(_first_matches(soup, VIDEO_MARKUP_SELECTORS)) or any(
+        platform in link.get('href', '').lower()
+        for link in soup.find_all('a', href=True) for platform in VIDEO_LINK_PLATFORMS
+    )
+    return PageFacts(
+        url=url,
+        html_length=html_length,
+        text_length=len(text),
+        has_body=soup.find('body') is not None,
+        mentions_openrice='openrice' in lower_text,
+        first_text=first_text,
+        h1_texts=[h1.get_text(strip=True) for h1 in soup.find_all('h1')],
+        images=images,
+        iframe_srcs=[iframe.get('src', '') for iframe in soup.find_all('iframe')],
+        video_count=len(soup.find_all('video')),
+        empty_keywords=[keyword for keyword in EMPTY_KEYWORDS if keyword in text],
+        video_markup=video_markup,
+        mentions_video=any(word in lower_text for word in VIDEO_WORDS),
+        category_counts=_category_counts(soup),
+    )
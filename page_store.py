@@ -0,0 +1,159 @@
+"""抓取頁面的持久化存檔（錄製/重播）
+
+錄製模式：每個成功抓取的頁面（Chrome渲染或requests回應）以zlib壓縮後存入SQLite檔，
+以 (URL, 後端) 為鍵；縮短URL的解析結果也會一併保存。requests回應的ETag/Last-Modified
+也會保存，下次重新檢查時送出條件請求，304時直接重用存檔中的頁面。
+重播模式：所有頁面都從存檔讀取，完全不連網，用於調整檢查規則後快速重新評估整批餐廳。
+
+用法:
+    python check_restaurants.py restaurants.xlsx --record pages.db
+    python check_restaurants.py restaurants.xlsx --replay pages.db
+"""
+import sqlite3
+import threading
+import time
+import zlib
+
+from metrics import CACHE_LOOKUPS
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# 重播時優先使用的後端（Chrome渲染的頁面內容較完整）
+REPLAY_BACKEND_ORDER = ('selenium', 'playwright', 'requests')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    status INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (url, backend)
+);
+CREATE TABLE IF NOT EXISTS redirects (
+    url TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class ArchiveMiss(Exception):
+    """重播模式下存檔中找不到該URL"""
+
+
+class PageStore:
+    def __init__(self, path, mode=RECORD):
+        """
+        :param path: SQLite存檔路徑
+        :param mode: 'record'（錄製）或 'replay'（重播）
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"未知的存檔模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self.hits = 0
+        self.misses = 0
+
+    def _migrate(self):
+        """舊版存檔沒有ETag/Last-Modified欄位時補上"""
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(pages)')}
+        for column in ('etag', 'last_modified'):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE pages ADD COLUMN {column} TEXT')
+        self._conn.commit()
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    def save_page(self, url, backend, html, status=200, etag=None, last_modified=None):
+        """保存一個頁面（html可為str或bytes）
+        :param etag: 回應的ETag標頭（用於之後的條件請求）
+        :param last_modified: 回應的Last-Modified標頭
+        """
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        body = zlib.compress(html, 6)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (url, backend, fetched_at, status, etag, last_modified, body, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, backend, time.time(), status, etag, last_modified, body, len(html))
+            )
+            self._conn.commit()
+
+    def load_validators(self, url, backend='requests'):
+        """讀取條件請求用的 (ETag, Last-Modified, 原始大小)，沒有時回傳None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT etag, last_modified, size FROM pages WHERE url = ? AND backend = ?', (url, backend)
+            ).fetchone()
+        if not row or not (row[0] or row[1]):
+            return None
+        return row
+
+    def touch(self, url, backend='requests'):
+        """伺服器回應304時更新抓取時間"""
+        with self._lock:
+            self._conn.execute('UPDATE pages SET fetched_at = ? WHERE url = ? AND backend = ?',
+                               (time.time(), url, backend))
+            self._conn.commit()
+
+    def load_page(self, url, backend=None):
+        """讀取頁面HTML，回傳 (html, backend)；找不到時拋出ArchiveMiss
+        :param backend: 指定後端，None時依REPLAY_BACKEND_ORDER選擇
+        """
+        backends = (backend,) if backend else REPLAY_BACKEND_ORDER
+        with self._lock:
+            for name in backends:
+                row = self._conn.execute(
+                    'SELECT body FROM pages WHERE url = ? AND backend = ?', (url, name)
+                ).fetchone()
+                if row:
+                    self.hits += 1
+                    CACHE_LOOKUPS.inc(cache='archive', result='hit')
+                    return zlib.decompress(row[0]).decode('utf-8', errors='ignore'), name
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache='archive', result='miss')
+        raise ArchiveMiss(f"存檔中沒有此頁面: {url}")
+
+    def save_redirect(self, url, target):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO redirects (url, target, fetched_at) VALUES (?, ?, ?)',
+                (url, target, time.time())
+            )
+            self._conn.commit()
+
+    def load_redirect(self, url):
+        """讀取縮短URL的解析結果，找不到時回傳None"""
+        with self._lock:
+            row = self._conn.execute('SELECT target FROM redirects WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        """存檔的頁面數、原始大小與壓縮後大小（位元組）"""
+        with self._lock:
+            count, raw, compressed = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM pages'
+            ).fetchone()
+        return {'pages': count, 'raw_bytes': raw, 'compressed_bytes': compressed,
+                'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
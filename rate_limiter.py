@@ -0,0 +1,263 @@
+"""OpenRice請求的自適應限速與重試排程
+
+- 每個主機一個令牌桶（token bucket），所有抓取方式（Selenium / requests）共用
+- AIMD調整：請求成功且延遲正常時緩慢加速，遇到 429/5xx 或延遲過高時倍數降速
+- 支援 Retry-After 標頭（單次等待不超過 max_wait，等待會超過時間上限時拋出 BudgetExceeded）
+- 連線失敗或逾時與 429/5xx 相同視為主機有壓力，降速
+- 可重試的失敗使用帶隨機抖動的指數退避
+
+環境變量：
+- OPENRICE_RATE: 每個主機的初始速率（每秒請求數，預設 2）
+- OPENRICE_MIN_RATE / OPENRICE_MAX_RATE: 速率下限/上限（預設 0.2 / 8）
+- OPENRICE_MAX_WAIT: 每次等待令牌或 Retry-After 的上限（秒，預設 60）
+"""
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from log_config import logger
+from time_budget import BudgetExceeded
+
+# 可重試的HTTP狀態碼
+RETRYABLE_STATUS = frozenset([429, 500, 502, 503, 504])
+# 需要降速的HTTP狀態碼（被限流或伺服器過載）
+THROTTLE_STATUS = frozenset([429, 503])
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """帶完整抖動（full jitter）的指數退避時間
+    :param attempt: 第幾次重試（從0開始）
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 標頭（秒數或HTTP日期），無法解析時回傳None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class TokenBucket:
+    """單一主機的令牌桶，速率可動態調整"""
+
+    def __init__(self, rate, capacity=None, min_rate=0.2, max_rate=8.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def reserve(self):
+        """預留一個令牌，回傳需要等待的秒數"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+            return wait
+
+    def refund(self):
+        """歸還預留但沒有使用的令牌"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def block_for(self, seconds):
+        """在指定時間內暫停此主機的所有請求（Retry-After）"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def increase(self, step):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + step)
+
+    def decrease(self, factor):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * factor)
+
+
+class HostRateLimiter:
+    """以主機為單位的自適應限速器（AIMD）"""
+
+    def __init__(self, initial_rate=None, min_rate=None, max_rate=None,
+                 additive_increase=0.1, multiplicative_decrease=0.5, slow_latency=5.0, max_wait=None):
+        """
+        :param initial_rate: 每個主機的初始速率（每秒請求數）
+        :param additive_increase: 每次成功請求增加的速率
+        :param multiplicative_decrease: 被限流、連線失敗或延遲過高時的速率倍數
+        :param slow_latency: 超過此延遲（秒）視為伺服器壓力過大
+        :param max_wait: acquire每次最長等待的秒數（很長的Retry-After不讓worker睡整段時間）
+        """
+        self.initial_rate = initial_rate or float(os.environ.get('OPENRICE_RATE', '2'))
+        self.min_rate = min_rate or float(os.environ.get('OPENRICE_MIN_RATE', '0.2'))
+        self.max_rate = max_rate or float(os.environ.get('OPENRICE_MAX_RATE', '8'))
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        self.slow_latency = slow_latency
+        self.max_wait = max_wait or float(os.environ.get('OPENRICE_MAX_WAIT', '60'))
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.throttled_count = 0
+
+    @staticmethod
+    def host_of(url):
+        return urlsplit(url).hostname or url
+
+    def bucket(self, url):
+        host = self.host_of(url)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.initial_rate, min_rate=self.min_rate, max_rate=self.max_rate)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url, deadline=None):
+        """等待直到可以對該主機發出請求（最多 max_wait 秒），回傳實際等待的秒數
+        :param deadline: time_budget.Deadline，需要等待的時間超過剩餘時間時不等待，直接拋出 BudgetExceeded
+        """
+        bucket = self.bucket(url)
+        wait = min(bucket.reserve(), self.max_wait)
+        if deadline is not None and deadline.limited and wait > 0 and wait >= deadline.remaining():
+            bucket.refund()
+            raise BudgetExceeded(f"{self.host_of(url)} 需要等待 {wait:.1f}s 才能發出請求，超過剩餘時間")
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, url, status=None, latency=None, retry_after=None, error=None):
+        """回報一次請求的結果，依此調整速率
+        :param status: HTTP狀態碼（Selenium等無狀態碼的後端傳None）
+        :param latency: 請求耗時（秒）
+        :param retry_after: Retry-After 標頭的原始值
+        :param error: 連線失敗或逾時的例外（與 429/5xx 相同降速，快速的連線重置不會被當成成功）
+        """
+        bucket = self.bucket(url)
+        if error is not None:
+            old_rate = bucket.rate
+            bucket.decrease(self.multiplicative_decrease)
+            with self._lock:
+                self.throttled_count += 1
+            logger.info(f"  限速: {self.host_of(url)} 連線失敗（{error.__class__.__name__}），"
+                        f"速率 {old_rate:.2f} -> {bucket.rate:.2f} req/s")
+        elif status in THROTTLE_STATUS or (status is not None and status >= 500):
+            old_rate = bucket.rate
+            bucket.decrease(self.multiplicative_decrease)
+            with self._lock:
+                self.throttled_count += 1
+            logger.info(f"  限速: {self.host_of(url)} 回應 {status}，速率 {old_rate:.2f} -> {bucket.rate:.2f} req/s")
+        elif latency is not None and latency > self.slow_latency:
+            bucket.decrease(self.multiplicative_decrease)
+            logger.debug(f"  限速: {self.host_of(url)} 延遲 {latency:.1f}s，速率降至 {bucket.rate:.2f} req/s")
+        else:
+            bucket.increase(self.additive_increase)
+
+        delay = parse_retry_after(retry_after)
+        if delay:
+            bucket.block_for(delay)
+            logger.info(f"  限速: {self.host_of(url)} 要求 Retry-After {delay:.1f}s")
+
+    def current_rate(self, url):
+        """該主機目前的速率（每秒請求數）"""
+        return self.bucket(url).rate
+
+    def metrics(self):
+        """各主機目前的限速狀態"""
+        now = time.monotonic()
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            host: {
+                'rate': round(bucket.rate, 3),
+                'tokens': round(bucket.tokens, 3),
+                'blocked_for': round(max(0.0, bucket.blocked_until - now), 3),
+            }
+            for host, bucket in buckets.items()
+        }
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """取得整個行程共用的限速器（所有檢查器與抓取方式共用）"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = HostRateLimiter()
+        return _shared_limiter
+
+
+def request_with_retry(session, method, url, limiter=None, max_retries=3, deadline=None, **kwargs):
+    """經過限速器發出請求，對可重試的失敗使用指數退避重試
+    :param session: requests.Session
+    :param method: 'GET' / 'HEAD'
+    :param deadline: time_budget.Deadline，每次請求的timeout縮短到剩餘時間內，來不及重試時不再重試
+    :return: requests.Response（最後一次的回應，狀態碼可能仍是錯誤）
+    """
+    import requests
+
+    limiter = limiter or get_rate_limiter()
+    timeout = kwargs.get('timeout')
+    attempt = 0
+    while True:
+        limiter.acquire(url, deadline)
+        if deadline is not None and timeout is not None:
+            kwargs['timeout'] = deadline.cap(timeout)
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            limiter.record(url, latency=time.monotonic() - start, error=e)
+            delay = backoff_delay(attempt)
+            if attempt >= max_retries or _out_of_time(deadline, delay):
+                raise
+            logger.debug(f"  請求失敗 ({e.__class__.__name__})，{delay:.1f}s 後重試 ({attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        retry_after = response.headers.get('Retry-After')
+        limiter.record(url, status=response.status_code,
+                       latency=time.monotonic() - start, retry_after=retry_after)
+        if response.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+            return response
+
+        # Retry-After 由限速器處理（下一次acquire會等待），這裡只做退避
+        delay = 0.0 if parse_retry_after(retry_after) else backoff_delay(attempt)
+        if _out_of_time(deadline, max(delay, parse_retry_after(retry_after) or 0.0)):
+            return response
+        logger.debug(f"  HTTP {response.status_code}，{delay:.1f}s 後重試 ({attempt + 1}/{max_retries})")
+        response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def _out_of_time(deadline, delay):
+    """等待delay秒後已經沒有時間再發一次請求"""
+    if deadline is None or not deadline.limited:
+        return False
+    return delay >= deadline.remaining()
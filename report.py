@@ -0,0 +1,148 @@
+"""檢查結果的報告與統計
+
+結果表中的 ✓/✗/逾時 轉成布林欄位後，以向量化的pandas運算計算通過率、各項目的缺失分布、
+狀態分類與缺失組合，並寫成報告中的摘要工作表（不再逐行列印不合格餐廳）。
+"""
+import numpy as np
+import pandas as pd
+
+from time_budget import TIMEOUT_MARK
+
+# 檢查項目（結果中的欄位，依報告順序）
+CHECK_ITEMS = ['中文名稱', '英文名稱', '門面照片', '菜單', '餐點照片', '相關影片']
+
+# 狀態分類（狀態文字的開頭）
+CATEGORY_PASSED = '合格'
+CATEGORY_UPPER_BOUND = '符合上限標準'
+CATEGORY_FAILED = '不合格'
+CATEGORY_TIMEOUT = '逾時'
+CATEGORY_ERROR = '錯誤'
+CATEGORIES = [CATEGORY_PASSED, CATEGORY_UPPER_BOUND, CATEGORY_FAILED, CATEGORY_TIMEOUT, CATEGORY_ERROR]
+
+# 「與上次比較」工作表的欄位
+DELTA_COLUMNS = ['餐廳名稱', 'URL', '上次檢查時間', '上次狀態', '本次狀態', '狀態變化', '新缺少項目', '恢復項目']
+
+
+def status_categories(statuses):
+    """把狀態文字（例如「不合格 - 缺少：菜單」）轉成狀態分類"""
+    statuses = statuses.fillna('').astype(str)
+    return pd.Series(np.select(
+        [statuses == CATEGORY_PASSED,
+         statuses.str.startswith(CATEGORY_UPPER_BOUND),
+         statuses.str.startswith(CATEGORY_TIMEOUT),
+         statuses.str.startswith(CATEGORY_ERROR)],
+        [CATEGORY_PASSED, CATEGORY_UPPER_BOUND, CATEGORY_TIMEOUT, CATEGORY_ERROR],
+        default=CATEGORY_FAILED,
+    ), index=statuses.index)
+
+
+def status_category(status):
+    """單一狀態文字的分類（與status_categories相同的規則）"""
+    status = status or ''
+    if status == CATEGORY_PASSED:
+        return CATEGORY_PASSED
+    for category in (CATEGORY_UPPER_BOUND, CATEGORY_TIMEOUT, CATEGORY_ERROR):
+        if status.startswith(category):
+            return category
+    return CATEGORY_FAILED
+
+
+def outcome_frames(df_results):
+    """各檢查項目的布林結果
+    :return: (passed, timed_out) 兩個DataFrame，欄位為結果中存在的檢查項目
+    """
+    items = [item for item in CHECK_ITEMS if item in df_results.columns]
+    marks = df_results[items].fillna('')
+    return marks.eq('✓'), marks.eq(TIMEOUT_MARK)
+
+
+def summarize(df_results):
+    """計算摘要統計，回傳 {工作表名稱: DataFrame}"""
+    category = status_categories(df_results['狀態'])
+    passed, timed_out = outcome_frames(df_results)
+    total = len(df_results)
+    # 發生錯誤的餐廳沒有項目結果，不計入各項目的分母
+    checked = category != CATEGORY_ERROR
+
+    category_counts = category.value_counts().reindex(CATEGORIES, fill_value=0)
+    status_sheet = pd.DataFrame({
+        '餐廳數': category_counts,
+        '比例': (category_counts / total).round(4) if total else 0.0,
+    }).rename_axis('狀態分類').reset_index()
+
+    checked_count = int(checked.sum())
+    passed_counts = passed[checked].sum()
+    timeout_counts = timed_out[checked].sum()
+    item_sheet = pd.DataFrame({
+        '通過': passed_counts,
+        '未通過': checked_count - passed_counts - timeout_counts,
+        '逾時': timeout_counts,
+        '通過率': (passed_counts / checked_count).round(4) if checked_count else 0.0,
+    }).rename_axis('檢查項目').reset_index()
+
+    # 缺失組合：每間餐廳缺少的項目（以「、」連接），只計算有項目結果的餐廳
+    missing = ~passed[checked] & ~timed_out[checked]
+    combinations = missing.dot(pd.Index(missing.columns) + '、').str.rstrip('、')
+    combination_sheet = (combinations[combinations != ''].value_counts()
+                         .rename_axis('缺少項目').reset_index(name='餐廳數'))
+
+    return {
+        '狀態分類': status_sheet,
+        '項目缺失分布': item_sheet,
+        '缺失組合': combination_sheet,
+    }
+
+
+def failed_rows(df_results):
+    """狀態不是「合格」的餐廳"""
+    return df_results[status_categories(df_results['狀態']) != CATEGORY_PASSED]
+
+
+def write_report_sheets(writer, df_results, circuit_events=None, summary=None, delta=None):
+    """寫入完整報告、不合格餐廳、摘要統計、與上次比較與斷路器紀錄工作表，回傳摘要統計
+    :param summary: 已計算的摘要統計（summarize的結果），None時重新計算
+    :param delta: 與上次相比有變化的餐廳（HistoryStore.delta_rows的結果），None時不寫入
+    """
+    if summary is None:
+        summary = summarize(df_results)
+    df_results.to_excel(writer, sheet_name='完整報告', index=False)
+    failed = failed_rows(df_results)
+    if len(failed) > 0:
+        failed.to_excel(writer, sheet_name='不合格餐廳', index=False)
+    for sheet_name, sheet in summary.items():
+        sheet.to_excel(writer, sheet_name=sheet_name, index=False)
+    if delta is not None:
+        pd.DataFrame(delta, columns=DELTA_COLUMNS).to_excel(writer, sheet_name='與上次比較', index=False)
+    if circuit_events:
+        pd.DataFrame(circuit_events).to_excel(writer, sheet_name='斷路器紀錄', index=False)
+    return summary
+
+
+def write_report(results, output_file='restaurant_check_report.xlsx', circuit_events=None, delta=None):
+    """把檢查結果寫成Excel報告，並列印摘要統計（不合格清單在「不合格餐廳」工作表中）
+    :param results: 依原始順序排列的結果（list of dict）
+    :param circuit_events: 斷路器狀態變化紀錄，有時另寫一個工作表
+    :param delta: 與上次相比有變化的餐廳（HistoryStore.delta_rows的結果），有時另寫一個工作表
+    """
+    if not results:
+        print("沒有檢查結果可產生報告")
+        return None
+
+    df_results = pd.DataFrame(results)
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        summary = write_report_sheets(writer, df_results, circuit_events, delta=delta)
+
+    status_sheet = summary['狀態分類'].set_index('狀態分類')['餐廳數']
+    print(f"\n報告已產生: {output_file}")
+    print(f"總餐廳數: {len(df_results)}")
+    print(f"合格餐廳: {status_sheet[CATEGORY_PASSED]}")
+    print(f"不合格餐廳: {len(df_results) - status_sheet[CATEGORY_PASSED]}")
+    print("狀態分類: " + ", ".join(f"{name} {count}" for name, count in status_sheet.items() if count))
+    item_sheet = summary['項目缺失分布']
+    missing_items = item_sheet[item_sheet['未通過'] > 0].sort_values('未通過', ascending=False)
+    if len(missing_items) > 0:
+        print("缺少項目: " + ", ".join(f"{row.檢查項目} {row.未通過}" for row in missing_items.itertuples()))
+    if delta is not None:
+        newly_missing = sum(1 for row in delta if row['新缺少項目'])
+        print(f"與上次比較: {len(delta)} 間餐廳有變化（{newly_missing} 間有新缺少的項目）")
+    return summary
@@ -0,0 +1,202 @@
+"""多行程分片執行與合併
+
+把Excel中的餐廳依標準URL的穩定雜湊分成N個分片，每個分片在獨立的行程中執行
+（各自的Chrome與檢查點），最後把所有分片的檢查點合併成一份
+restaurant_check_report.xlsx（依Excel原始順序）。
+
+分片也可以在共用同一個目錄的多台機器上執行：每台機器執行自己的 worker，
+全部完成後在任一台機器上執行 merge。
+
+用法:
+    # 本機4個行程，完成後自動合併
+    python shard_runner.py run restaurants.xlsx --shards 4 --workdir shards
+
+    # 多台機器（shards目錄為共用目錄）
+    python shard_runner.py worker restaurants.xlsx --shards 4 --shard 0 --workdir shards   # 機器A
+    python shard_runner.py worker restaurants.xlsx --shards 4 --shard 1 --workdir shards   # 機器B
+    ...
+    python shard_runner.py merge restaurants.xlsx --shards 4 --workdir shards
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from batch_scheduler import Checkpoint, RULE_FAILED_FIRST, load_previous_results
+from log_config import logger, setup_logging
+
+
+def checkpoint_path(workdir, shard_index, shard_count):
+    return os.path.join(workdir, f'shard-{shard_index}-of-{shard_count}.jsonl')
+
+
+def events_path(workdir, shard_index, shard_count):
+    return os.path.join(workdir, f'shard-{shard_index}-of-{shard_count}.events.json')
+
+
+def shard_rate_env(shard_count, env=None):
+    """每個分片行程的限速器速率：總速率平均分給各分片，避免N個行程合計超過原本的速率"""
+    env = dict(os.environ if env is None else env)
+    for name, default in (('OPENRICE_RATE', '2'), ('OPENRICE_MAX_RATE', '8')):
+        env[name] = str(float(env.get(name, default)) / shard_count)
+    return env
+
+
+def run_worker(args):
+    """執行一個分片，結果寫入該分片的檢查點（可中斷後重新執行繼續）"""
+    from check_restaurants import OpenRiceChecker
+
+    os.makedirs(args.workdir, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path(args.workdir, args.shard, args.shards))
+    previous_results = load_previous_results(args.failed_first) if args.failed_first else None
+
+    checker = OpenRiceChecker(args.excel_file, use_selenium=not args.no_selenium,
+                              restaurant_budget=args.restaurant_budget)
+    try:
+        checker.run_check(priority_column=args.priority_column,
+                          priority_rule=RULE_FAILED_FIRST if previous_results else None,
+                          previous_results=previous_results, checkpoint=checkpoint,
+                          shard=(args.shard, args.shards), batch_budget=args.batch_budget)
+    finally:
+        checker.close()
+        if checker.circuit_events:
+            with open(events_path(args.workdir, args.shard, args.shards), 'w', encoding='utf-8') as f:
+                json.dump(checker.circuit_events, f, ensure_ascii=False)
+
+
+def run_local(args):
+    """在本機啟動N個分片行程，全部結束後合併"""
+    os.makedirs(args.workdir, exist_ok=True)
+    env = shard_rate_env(args.shards)
+    processes = []
+    for shard_index in range(args.shards):
+        command = [sys.executable, os.path.abspath(__file__), 'worker', args.excel_file,
+                   '--shards', str(args.shards), '--shard', str(shard_index), '--workdir', args.workdir]
+        if args.no_selenium:
+            command.append('--no-selenium')
+        if args.priority_column:
+            command += ['--priority-column', args.priority_column]
+        if args.failed_first:
+            command += ['--failed-first', args.failed_first]
+        if args.restaurant_budget:
+            command += ['--restaurant-budget', str(args.restaurant_budget)]
+        if args.batch_budget:
+            command += ['--batch-budget', str(args.batch_budget)]
+        log_file = open(os.path.join(args.workdir, f'shard-{shard_index}-of-{args.shards}.log'), 'w', encoding='utf-8')
+        processes.append((shard_index, subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT),
+                          log_file))
+        logger.info(f"分片 {shard_index}/{args.shards} 已啟動")
+
+    failed = []
+    for shard_index, process, log_file in processes:
+        if process.wait() != 0:
+            failed.append(shard_index)
+        log_file.close()
+    if failed:
+        logger.warning(f"分片 {failed} 非正常結束，合併已完成的部分（重新執行可從檢查點繼續）")
+    return merge(args)
+
+
+def merge(args):
+    """合併所有分片的檢查點，依Excel原始順序產生報告（合併結果保存為歷史紀錄中的一次執行）"""
+    from check_restaurants import load_restaurant_sheet
+    from history_store import HistoryStore
+    from report import write_report
+
+    results_by_index = {}
+    circuit_events = []
+    missing_shards = []
+    for shard_index in range(args.shards):
+        path = checkpoint_path(args.workdir, shard_index, args.shards)
+        if not os.path.exists(path):
+            missing_shards.append(shard_index)
+            continue
+        results_by_index.update(Checkpoint(path).load())
+        events_file = events_path(args.workdir, shard_index, args.shards)
+        if os.path.exists(events_file):
+            with open(events_file, encoding='utf-8') as f:
+                circuit_events.extend(json.load(f))
+
+    if missing_shards:
+        logger.warning(f"找不到分片 {missing_shards} 的檢查點")
+
+    df = load_restaurant_sheet(args.excel_file)
+    total = len(df) if df is not None else len(results_by_index)
+    if len(results_by_index) < total:
+        logger.warning(f"只有 {len(results_by_index)}/{total} 間餐廳有結果，報告只包含已完成的餐廳")
+
+    circuit_events.sort(key=lambda event: event.get('時間', ''))
+    results = [results_by_index[index] for index in sorted(results_by_index)]
+    delta = None
+    if not args.no_history and results:
+        history = HistoryStore(args.history)
+        try:
+            run_id = history.record_run(results, source='shard', label=os.path.basename(args.excel_file))
+            delta = history.delta_rows(run_id)
+        finally:
+            history.close()
+    write_report(results, args.output, circuit_events, delta=delta)
+    return 0 if len(results_by_index) >= total else 1
+
+
+def parse_args(argv=None):
+    from history_store import DEFAULT_HISTORY_FILE
+
+    parser = argparse.ArgumentParser(description='OpenRice 餐廳要素檢查：多行程分片執行與合併')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_common(sub):
+        sub.add_argument('excel_file', help='包含餐廳名稱和URL的Excel檔案')
+        sub.add_argument('--shards', type=int, required=True, help='分片數')
+        sub.add_argument('--workdir', default='shards', help='存放各分片檢查點的目錄（多台機器時使用共用目錄）')
+
+    def add_history_options(sub):
+        sub.add_argument('--history', default=os.environ.get('CHECKER_HISTORY', DEFAULT_HISTORY_FILE),
+                         help=f'歷史紀錄檔(SQLite)，合併結果保存為一次執行（預設{DEFAULT_HISTORY_FILE}）')
+        sub.add_argument('--no-history', action='store_true', help='不保存歷史紀錄')
+
+    def add_check_options(sub):
+        sub.add_argument('--no-selenium', action='store_true', help='只使用requests（不啟動Chrome）')
+        sub.add_argument('--priority-column', help='優先級欄位名稱')
+        sub.add_argument('--failed-first', metavar='PREVIOUS', help='上次的報告(xlsx)、檢查點(jsonl)或歷史紀錄(db)，上次不合格的先檢查')
+        sub.add_argument('--restaurant-budget', type=float, help='每間餐廳的時間上限（秒）')
+        sub.add_argument('--batch-budget', type=float, help='每個分片的時間上限（秒），時間到時只保留已完成的結果')
+
+    run = subparsers.add_parser('run', help='在本機以N個行程執行所有分片並合併')
+    add_common(run)
+    add_check_options(run)
+    run.add_argument('-o', '--output', default='restaurant_check_report.xlsx', help='報告輸出路徑')
+    add_history_options(run)
+
+    worker = subparsers.add_parser('worker', help='只執行一個分片（可在其他機器上執行）')
+    add_common(worker)
+    add_check_options(worker)
+    worker.add_argument('--shard', type=int, required=True, help='分片編號（0 ~ shards-1）')
+
+    merge_parser = subparsers.add_parser('merge', help='合併所有分片的檢查點為一份報告')
+    add_common(merge_parser)
+    merge_parser.add_argument('-o', '--output', default='restaurant_check_report.xlsx', help='報告輸出路徑')
+    add_history_options(merge_parser)
+
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error('--shards 必須大於0')
+    if args.command == 'worker' and not 0 <= args.shard < args.shards:
+        parser.error('--shard 必須介於 0 與 shards-1 之間')
+    return args
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(argv)
+    if args.command == 'worker':
+        run_worker(args)
+        return 0
+    if args.command == 'run':
+        return run_local(args)
+    return merge(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
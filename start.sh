@@ -20,13 +20,26 @@ if [ ! -f "app.py" ]; then
     exit 1
 fi
 
-# 检查Python依赖
+# 检查Python依赖：只确认已安装，不实际导入（Streamlit启动时才导入，Selenium等到第一次需要Chrome时才导入）
 echo "Checking Python dependencies..."
-python3 -c "import streamlit; import pandas; import check_restaurants; print('All imports successful')" || {
+python3 -c "
+import importlib.util, sys
+missing = [m for m in ('streamlit', 'pandas', 'openpyxl', 'requests', 'bs4') if importlib.util.find_spec(m) is None]
+if missing:
+    sys.exit('Missing modules: ' + ', '.join(missing))
+import check_restaurants
+print('All dependencies found')
+" || {
     echo "ERROR: Failed to import required modules"
     exit 1
 }
 
+# 设置了API_PORT时，在Streamlit旁边启动批次HTTP API（需要fastapi与uvicorn）
+if [ -n "$API_PORT" ]; then
+    echo "Starting batch API on port $API_PORT..."
+    python3 api.py --host 0.0.0.0 --port "$API_PORT" &
+fi
+
 echo "Starting Streamlit server..."
 
 # 启动Streamlit
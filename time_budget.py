@@ -0,0 +1,55 @@
+"""每間餐廳與整批檢查的時間上限
+
+一間很慢的餐廳（30秒的頁面載入上限 + 五個頁面的等待 + requests備援）可能卡住一個worker超過一分鐘。
+檢查時會帶著一個 Deadline：抓取頁面前先確認還有時間，並把各種逾時設定縮短到剩餘時間內；
+時間用完時拋出 BudgetExceeded，已完成的檢查項目保留結果，其餘標記為「逾時」。
+"""
+import time
+
+# 檢查項目逾時的標記（取代 ✗）
+TIMEOUT_MARK = '逾時'
+
+
+class BudgetExceeded(Exception):
+    """時間上限已到，剩下的頁面不再抓取"""
+
+
+class Deadline:
+    def __init__(self, seconds=None, parent=None):
+        """
+        :param seconds: 從現在起的秒數，None或0表示不限時
+        :param parent: 外層的Deadline（例如整批的上限），取兩者中較早的
+        """
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        if parent is not None and parent.expires_at is not None:
+            if self.expires_at is None or parent.expires_at < self.expires_at:
+                self.expires_at = parent.expires_at
+
+    @property
+    def limited(self):
+        return self.expires_at is not None
+
+    def remaining(self):
+        """剩餘秒數，不限時回傳None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, what=''):
+        """時間已到時拋出 BudgetExceeded"""
+        if self.expired():
+            raise BudgetExceeded(f"已超過時間上限{('，未完成: ' + what) if what else ''}")
+
+    def cap(self, timeout):
+        """把逾時設定縮短到剩餘時間內（至少0.1秒）"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return max(0.1, min(timeout, remaining))
+
+
+# 不限時的Deadline（預設值，避免到處判斷None）
+UNLIMITED = Deadline()
@@ -0,0 +1,628 @@
+"""分散式工作佇列（多個檢查器容器共同處理一批餐廳）
+
+生產者把Excel中的餐廳（build_work_queue 標準化與排序後）放進佇列，任意數量的worker行程
+（可以在不同的容器或機器上）各自用一個 OpenRiceChecker 領取餐廳：
+
+- 領取時取得一個租約（visibility timeout），期限內其他worker不會再拿到這間餐廳
+- 檢查完成後確認（ack），結果寫入共用的結果集合（以Excel原始順序為鍵，重複的結果只保留第一個）
+- worker當機或被終止時租約到期，餐廳重新回到佇列由其他worker處理；
+  同一間餐廳被領取超過 max_attempts 次仍未完成時記為錯誤結果，不再重試
+- 正常停止（Ctrl+C / SIGTERM）時把正在檢查的餐廳立刻放回佇列
+
+佇列後端（--broker 或環境變量CHECKER_BROKER）：
+- redis://host:6379/0      Redis（預設，需要 pip install redis），容器之間共用
+- sqlite:///path/queue.db  SQLite檔，同一台機器或共用磁碟上的多個行程
+- memory://                同一個行程內（測試用）
+
+每個worker行程有自己的限速器，N個worker合計的請求速率是單一行程的N倍，
+大量worker時請降低各自的 OPENRICE_RATE / OPENRICE_MAX_RATE（本機 run 會自動平均分配）。
+
+用法:
+    # 本機4個worker行程（SQLite佇列），完成後產生報告
+    python work_queue.py run restaurants.xlsx --workers 4 --broker sqlite:///queue.db
+
+    # 多個容器共用Redis
+    python work_queue.py enqueue restaurants.xlsx --broker redis://redis:6379/0 --queue batch-1   # 生產者
+    python work_queue.py worker --broker redis://redis:6379/0 --queue batch-1                    # 每個容器
+    python work_queue.py status --broker redis://redis:6379/0 --queue batch-1
+    python work_queue.py collect --broker redis://redis:6379/0 --queue batch-1 --wait
+"""
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from batch_scheduler import WorkItem
+from log_config import logger, setup_logging
+from metrics import QUEUE_EVENTS
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+DEFAULT_BROKER = 'redis://localhost:6379/0'
+DEFAULT_QUEUE = 'openrice'
+# 租約期限（秒），應大於每間餐廳的時間上限
+DEFAULT_VISIBILITY_TIMEOUT = 600
+# 同一間餐廳最多被領取幾次（超過時記為錯誤）
+DEFAULT_MAX_ATTEMPTS = 3
+# 佇列暫時沒有餐廳時，worker多久再查詢一次（秒）
+POLL_SECONDS = 2.0
+
+
+@dataclass
+class Lease:
+    """worker領取的一間餐廳"""
+    item_id: int
+    payload: dict
+    token: str
+    attempts: int
+
+    def work_item(self):
+        return WorkItem(index=self.payload['index'], name=self.payload['name'], url=self.payload['url'])
+
+
+def item_payload(item):
+    return {'index': item.index, 'name': str(item.name), 'url': item.url}
+
+
+class SQLiteBroker:
+    """以SQLite檔（或記憶體）實作的佇列：同一台機器的多個行程共用一個檔案"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS queue_items (
+        queue TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        lease_token TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        done_at REAL,
+        PRIMARY KEY (queue, item_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_queue_items_claim ON queue_items (queue, done_at, lease_until, seq);
+    """
+
+    def __init__(self, path, queue=DEFAULT_QUEUE):
+        """
+        :param path: SQLite檔路徑，':memory:' 表示只在本行程內使用
+        :param queue: 佇列名稱（同一個檔案可以有多個佇列）
+        """
+        self.path = path
+        self.queue = queue
+        self._lock = threading.Lock()
+        # 自行以 BEGIN IMMEDIATE 控制交易，多個行程同時領取時由SQLite的寫入鎖排隊
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self._SCHEMA)
+
+    def _transaction(self, statements):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                value = statements(self._conn)
+                self._conn.execute('COMMIT')
+                return value
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def enqueue(self, items):
+        """依順序放入WorkItem，回傳放入的數量（已在佇列中的餐廳不重複放入）"""
+        def insert(conn):
+            start = conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM queue_items WHERE queue = ?',
+                                 (self.queue,)).fetchone()[0]
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO queue_items (queue, item_id, seq, payload) VALUES (?, ?, ?, ?)',
+                [(self.queue, item.index, start + offset, json.dumps(item_payload(item), ensure_ascii=False))
+                 for offset, item in enumerate(items)])
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def claim(self, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """領取下一間餐廳（包括租約已到期的），沒有時回傳None"""
+        def take(conn):
+            now = time.time()
+            row = conn.execute(
+                'SELECT item_id, payload, attempts FROM queue_items '
+                'WHERE queue = ? AND done_at IS NULL AND (lease_until IS NULL OR lease_until < ?) '
+                'ORDER BY seq LIMIT 1', (self.queue, now)).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            conn.execute('UPDATE queue_items SET lease_token = ?, lease_until = ?, attempts = attempts + 1 '
+                         'WHERE queue = ? AND item_id = ?', (token, now + visibility_timeout, self.queue, row['item_id']))
+            return Lease(row['item_id'], json.loads(row['payload']), token, row['attempts'] + 1)
+        return self._transaction(take)
+
+    def ack(self, lease, result):
+        """保存結果並完成這間餐廳，回傳False表示已經有其他worker完成（結果不覆蓋）"""
+        def complete(conn):
+            cursor = conn.execute(
+                'UPDATE queue_items SET result = ?, done_at = ?, lease_token = NULL, lease_until = NULL '
+                'WHERE queue = ? AND item_id = ? AND done_at IS NULL',
+                (json.dumps(result, ensure_ascii=False, default=str), time.time(), self.queue, lease.item_id))
+            return cursor.rowcount > 0
+        return self._transaction(complete)
+
+    def release(self, lease):
+        """放棄租約，餐廳立刻回到佇列（不計入重試次數）"""
+        def give_back(conn):
+            conn.execute('UPDATE queue_items SET lease_token = NULL, lease_until = NULL, attempts = attempts - 1 '
+                         'WHERE queue = ? AND item_id = ? AND lease_token = ? AND done_at IS NULL',
+                         (self.queue, lease.item_id, lease.token))
+        self._transaction(give_back)
+
+    def stats(self):
+        """{'total', 'pending', 'in_flight', 'done'}"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COUNT(*) AS total, COUNT(done_at) AS done, '
+                'SUM(done_at IS NULL AND lease_until >= ?) AS in_flight FROM queue_items WHERE queue = ?',
+                (time.time(), self.queue)).fetchone()
+        in_flight = row['in_flight'] or 0
+        return {'total': row['total'], 'pending': row['total'] - row['done'] - in_flight,
+                'in_flight': in_flight, 'done': row['done']}
+
+    def results(self):
+        """已完成的結果 {Excel原始順序: 結果}"""
+        with self._lock:
+            rows = self._conn.execute('SELECT item_id, result FROM queue_items WHERE queue = ? AND done_at IS NOT NULL',
+                                      (self.queue,)).fetchall()
+        return {row['item_id']: json.loads(row['result']) for row in rows}
+
+    def clear(self):
+        self._transaction(lambda conn: conn.execute('DELETE FROM queue_items WHERE queue = ?', (self.queue,)))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Redis的領取、確認與放回都以Lua腳本執行（原子操作），時間使用Redis伺服器的時鐘，不受各容器時鐘誤差影響
+_REDIS_NOW = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+"""
+
+# KEYS: pending, leases, tokens, attempts, items, results；ARGV: 租約期限, token
+_REDIS_CLAIM = _REDIS_NOW + """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for i = #expired, 1, -1 do
+    redis.call('ZREM', KEYS[2], expired[i])
+    redis.call('HDEL', KEYS[3], expired[i])
+    redis.call('LPUSH', KEYS[1], expired[i])
+end
+local id
+while true do
+    id = redis.call('LPOP', KEYS[1])
+    if not id then return false end
+    if redis.call('HEXISTS', KEYS[6], id) == 0 then break end
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), id)
+redis.call('HSET', KEYS[3], id, ARGV[2])
+local attempts = redis.call('HINCRBY', KEYS[4], id, 1)
+return {id, redis.call('HGET', KEYS[5], id), attempts}
+"""
+
+# KEYS: leases, tokens, results；ARGV: id, token, 結果
+# 租約已到期並被其他worker重新領取時只保存結果（若還沒有），不移除新持有者的租約
+_REDIS_ACK = """
+if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+return redis.call('HSETNX', KEYS[3], ARGV[1], ARGV[3])
+"""
+
+# KEYS: pending, leases, tokens, attempts；ARGV: id, token
+_REDIS_RELEASE = """
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HINCRBY', KEYS[4], ARGV[1], -1)
+redis.call('LPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class RedisBroker:
+    """以Redis實作的佇列（多個容器共用）
+
+    鍵（前綴 openrice:queue:<佇列名稱>:）：items 餐廳內容、pending 待領取清單、leases 租約期限、
+    tokens 租約token、attempts 領取次數、results 結果
+    """
+
+    def __init__(self, url=DEFAULT_BROKER, queue=DEFAULT_QUEUE, client=None):
+        """
+        :param url: Redis連線URL
+        :param queue: 佇列名稱
+        :param client: 已建立的redis.Redis（需要 decode_responses=True），None時由url建立
+        """
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("redis未安裝（pip install redis），或改用 --broker sqlite:///queue.db")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.url = url
+        self.queue = queue
+        self._redis = client
+        prefix = f'openrice:queue:{queue}:'
+        self._keys = {name: prefix + name for name in ('items', 'pending', 'leases', 'tokens', 'attempts', 'results')}
+        self._claim = client.register_script(_REDIS_CLAIM)
+        self._ack = client.register_script(_REDIS_ACK)
+        self._release = client.register_script(_REDIS_RELEASE)
+
+    def enqueue(self, items):
+        """依順序放入WorkItem，回傳放入的數量（已在佇列中的餐廳不重複放入）"""
+        keys = self._keys
+        pipe = self._redis.pipeline()
+        for item in items:
+            pipe.hsetnx(keys['items'], item.index, json.dumps(item_payload(item), ensure_ascii=False))
+        new_ids = [item.index for item, is_new in zip(items, pipe.execute()) if is_new]
+        if new_ids:
+            self._redis.rpush(keys['pending'], *new_ids)
+        return len(new_ids)
+
+    def claim(self, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """領取下一間餐廳（包括租約已到期的），沒有時回傳None"""
+        keys = self._keys
+        token = uuid.uuid4().hex
+        claimed = self._claim(keys=[keys['pending'], keys['leases'], keys['tokens'], keys['attempts'],
+                                    keys['items'], keys['results']],
+                              args=[visibility_timeout, token])
+        if not claimed:
+            return None
+        item_id, payload, attempts = claimed
+        return Lease(int(item_id), json.loads(payload), token, int(attempts))
+
+    def ack(self, lease, result):
+        """保存結果並完成這間餐廳，回傳False表示已經有其他worker完成（結果不覆蓋）"""
+        keys = self._keys
+        stored = self._ack(keys=[keys['leases'], keys['tokens'], keys['results']],
+                           args=[lease.item_id, lease.token, json.dumps(result, ensure_ascii=False, default=str)])
+        return bool(stored)
+
+    def release(self, lease):
+        """放棄租約，餐廳立刻回到佇列（不計入重試次數）"""
+        keys = self._keys
+        self._release(keys=[keys['pending'], keys['leases'], keys['tokens'], keys['attempts']],
+                      args=[lease.item_id, lease.token])
+
+    def stats(self):
+        """{'total', 'pending', 'in_flight', 'done'}（已到期但還沒被重新領取的租約也算檢查中）"""
+        keys = self._keys
+        pipe = self._redis.pipeline()
+        pipe.hlen(keys['items'])
+        pipe.zcard(keys['leases'])
+        pipe.hlen(keys['results'])
+        total, in_flight, done = pipe.execute()
+        return {'total': total, 'pending': max(total - done - in_flight, 0), 'in_flight': in_flight, 'done': done}
+
+    def results(self):
+        """已完成的結果 {Excel原始順序: 結果}"""
+        return {int(item_id): json.loads(result)
+                for item_id, result in self._redis.hgetall(self._keys['results']).items()}
+
+    def clear(self):
+        self._redis.delete(*self._keys.values())
+
+    def close(self):
+        self._redis.close()
+
+
+def open_broker(url, queue=DEFAULT_QUEUE):
+    """依URL建立佇列後端：redis://...、sqlite:///path 或 memory://"""
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(url, queue)
+    if url.startswith('sqlite:///'):
+        return SQLiteBroker(url[len('sqlite:///'):], queue)
+    if url == 'memory://':
+        return SQLiteBroker(':memory:', queue)
+    raise ValueError(f"不支援的佇列後端: {url}（可用 redis://、sqlite:///、memory://）")
+
+
+class QueueWorker:
+    """從佇列領取餐廳、檢查並確認結果的worker（一個行程一個檢查器）"""
+
+    def __init__(self, broker, checker, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, restaurant_budget=None, max_pause=300):
+        """
+        :param broker: 佇列後端（RedisBroker / SQLiteBroker）
+        :param checker: OpenRiceChecker
+        :param visibility_timeout: 租約期限（秒），應大於每間餐廳的時間上限
+        :param max_attempts: 同一間餐廳最多被領取幾次，超過時記為錯誤結果
+        :param restaurant_budget: 每間餐廳的時間上限（秒），None時使用檢查器的設定
+        :param max_pause: 所有後端都不健康時最長暫停時間（秒）
+        """
+        self.broker = broker
+        self.checker = checker
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.restaurant_budget = restaurant_budget
+        self.max_pause = max_pause
+        self.processed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """檢查完目前的餐廳後停止"""
+        self._stop.set()
+
+    def process(self, lease):
+        """檢查一間領取的餐廳並確認結果"""
+        from worker_pool import error_result
+        item = lease.work_item()
+        if lease.attempts > self.max_attempts:
+            logger.warning(f"{item.name} 已被領取 {lease.attempts - 1} 次仍未完成，記為錯誤")
+            QUEUE_EVENTS.inc(event='gave_up')
+            result = error_result(item, f'已重試 {lease.attempts - 1} 次仍未完成（worker中斷或逾時）')
+        else:
+            try:
+                # 所有後端都不健康時先暫停，避免把佇列中的餐廳都慢慢失敗
+                self.checker.wait_for_backends(self.max_pause)
+                result = self.checker.check_restaurant(item.url, item.name, budget=self.restaurant_budget)
+            except Exception as e:
+                logger.warning(f"檢查 {item.name} 時出錯: {e}")
+                result = error_result(item, e)
+        if self.broker.ack(lease, result):
+            QUEUE_EVENTS.inc(event='acked')
+        else:
+            logger.info(f"{item.name} 已由其他worker完成（租約過期後被重新領取），略過這次的結果")
+            QUEUE_EVENTS.inc(event='duplicate')
+        self.processed += 1
+
+    def run(self, exit_when_empty=False, poll_seconds=POLL_SECONDS):
+        """持續領取餐廳直到 stop()；exit_when_empty 時佇列全部完成就結束
+        :return: 這個worker處理的餐廳數
+        """
+        while not self._stop.is_set():
+            lease = self.broker.claim(self.visibility_timeout)
+            if lease is None:
+                if exit_when_empty:
+                    stats = self.broker.stats()
+                    if stats['pending'] == 0 and stats['in_flight'] == 0:
+                        break
+                # 其他worker的租約可能到期（餐廳重新回到佇列），或生產者還會放入新的餐廳
+                self._stop.wait(poll_seconds)
+                continue
+            QUEUE_EVENTS.inc(event='claimed')
+            try:
+                self.process(lease)
+            except BaseException:
+                # 中斷（Ctrl+C）時把這間餐廳立刻放回佇列，不必等租約到期
+                self.broker.release(lease)
+                QUEUE_EVENTS.inc(event='released')
+                raise
+        return self.processed
+
+
+def enqueue_excel(broker, excel_file, priority_column=None, previous_results=None):
+    """讀取Excel並把標準化、排序後的餐廳放進佇列，回傳放入的數量"""
+    from batch_scheduler import RULE_FAILED_FIRST, build_work_queue
+    from check_restaurants import OpenRiceChecker, load_restaurant_sheet
+
+    df = load_restaurant_sheet(excel_file)
+    if df is None:
+        raise ValueError(f"無法讀取 {excel_file}，需要包含餐廳名稱與URL欄位")
+    items = build_work_queue(df, priority_column=priority_column,
+                             rule=RULE_FAILED_FIRST if previous_results else None,
+                             previous_results=previous_results,
+                             short_url_hosts=OpenRiceChecker.SHORT_URL_HOSTS)
+    return broker.enqueue(items)
+
+
+def enqueue_from_args(args):
+    """enqueue / run 命令：（--reset時先清空）把Excel中的餐廳放進佇列"""
+    from batch_scheduler import load_previous_results
+
+    broker = open_broker(args.broker, args.queue)
+    try:
+        if args.reset:
+            broker.clear()
+        previous_results = load_previous_results(args.failed_first) if args.failed_first else None
+        added = enqueue_excel(broker, args.excel_file, args.priority_column, previous_results)
+    finally:
+        broker.close()
+    logger.info(f"已放入 {added} 間餐廳（佇列 {args.queue}）")
+    return added
+
+
+def run_worker(args):
+    """執行一個worker行程，直到佇列完成（--exit-when-empty）或收到停止訊號"""
+    from check_restaurants import OpenRiceChecker
+    from metrics import start_metrics_server
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, host=os.environ.get('METRICS_HOST', '127.0.0.1'))
+    broker = open_broker(args.broker, args.queue)
+    checker = OpenRiceChecker('', use_selenium=not args.no_selenium, restaurant_budget=args.restaurant_budget)
+    worker = QueueWorker(broker, checker, visibility_timeout=args.visibility_timeout,
+                         max_attempts=args.max_attempts, restaurant_budget=args.restaurant_budget)
+    # 容器停止時（SIGTERM）與Ctrl+C相同：目前的餐廳放回佇列後結束
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        processed = worker.run(exit_when_empty=args.exit_when_empty)
+        logger.info(f"worker結束，共檢查 {processed} 間餐廳")
+    except KeyboardInterrupt:
+        logger.info(f"worker已停止，共檢查 {worker.processed} 間餐廳（進行中的餐廳已放回佇列）")
+    finally:
+        checker.close()
+        broker.close()
+
+
+def worker_command(args):
+    """以相同的佇列設定啟動worker子行程的命令"""
+    command = [sys.executable, os.path.abspath(__file__), 'worker', '--broker', args.broker, '--queue', args.queue,
+               '--visibility-timeout', str(args.visibility_timeout), '--max-attempts', str(args.max_attempts),
+               '--exit-when-empty']
+    if args.no_selenium:
+        command.append('--no-selenium')
+    if args.restaurant_budget:
+        command += ['--restaurant-budget', str(args.restaurant_budget)]
+    return command
+
+
+def run_local(args):
+    """放入佇列後在本機啟動N個worker行程，全部結束後產生報告"""
+    from shard_runner import shard_rate_env
+
+    enqueue_from_args(args)
+    os.makedirs(args.workdir, exist_ok=True)
+    # 總速率平均分給各worker（與分片執行相同）
+    env = shard_rate_env(args.workers)
+    processes = []
+    for worker_index in range(args.workers):
+        log_file = open(os.path.join(args.workdir, f'worker-{worker_index}.log'), 'w', encoding='utf-8')
+        processes.append((subprocess.Popen(worker_command(args), env=env, stdout=log_file, stderr=subprocess.STDOUT),
+                          log_file))
+    logger.info(f"已啟動 {args.workers} 個worker行程（日誌在 {args.workdir}）")
+    for process, log_file in processes:
+        process.wait()
+        log_file.close()
+    return collect(args)
+
+
+def collect(args):
+    """依Excel原始順序把佇列中的結果寫成報告（結果保存為歷史紀錄中的一次執行）"""
+    from history_store import HistoryStore
+    from report import write_report
+
+    broker = open_broker(args.broker, args.queue)
+    try:
+        stats = broker.stats()
+        while getattr(args, 'wait', False) and stats['done'] < stats['total']:
+            logger.info(f"等待佇列完成: {stats['done']}/{stats['total']}（進行中 {stats['in_flight']}）")
+            time.sleep(10)
+            stats = broker.stats()
+        results_by_index = broker.results()
+    finally:
+        broker.close()
+
+    if len(results_by_index) < stats['total']:
+        logger.warning(f"只有 {len(results_by_index)}/{stats['total']} 間餐廳有結果，報告只包含已完成的餐廳")
+    results = [results_by_index[index] for index in sorted(results_by_index)]
+    delta = None
+    if not args.no_history and results:
+        history = HistoryStore(args.history)
+        try:
+            run_id = history.record_run(results, source='queue', label=args.queue)
+            delta = history.delta_rows(run_id)
+        finally:
+            history.close()
+    write_report(results, args.output, delta=delta)
+    return 0 if stats['total'] and len(results_by_index) >= stats['total'] else 1
+
+
+def show_status(args):
+    broker = open_broker(args.broker, args.queue)
+    try:
+        stats = broker.stats()
+    finally:
+        broker.close()
+    print(f"佇列 {args.queue}: 共 {stats['total']} 間，待領取 {stats['pending']}，"
+          f"檢查中 {stats['in_flight']}，已完成 {stats['done']}")
+    return 0
+
+
+def parse_args(argv=None):
+    from history_store import DEFAULT_HISTORY_FILE
+
+    parser = argparse.ArgumentParser(description='OpenRice 餐廳要素檢查：分散式工作佇列')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_broker_options(sub):
+        sub.add_argument('--broker', default=os.environ.get('CHECKER_BROKER', DEFAULT_BROKER),
+                         help=f'佇列後端 redis://... 或 sqlite:///path（預設環境變量CHECKER_BROKER或{DEFAULT_BROKER}）')
+        sub.add_argument('--queue', default=os.environ.get('CHECKER_QUEUE', DEFAULT_QUEUE),
+                         help=f'佇列名稱（預設{DEFAULT_QUEUE}）')
+
+    def add_enqueue_options(sub):
+        sub.add_argument('excel_file', help='包含餐廳名稱和URL的Excel檔案')
+        sub.add_argument('--priority-column', help='優先級欄位名稱')
+        sub.add_argument('--failed-first', metavar='PREVIOUS', help='上次的報告(xlsx)、檢查點(jsonl)或歷史紀錄(db)，上次不合格的先檢查')
+        sub.add_argument('--reset', action='store_true', help='先清空佇列（包括已完成的結果）')
+
+    def add_worker_options(sub):
+        sub.add_argument('--no-selenium', action='store_true', help='只使用requests（不啟動Chrome）')
+        sub.add_argument('--restaurant-budget', type=float, help='每間餐廳的時間上限（秒）')
+        sub.add_argument('--visibility-timeout', type=float, default=DEFAULT_VISIBILITY_TIMEOUT,
+                         help=f'租約期限（秒），worker中斷後餐廳多久回到佇列（預設{DEFAULT_VISIBILITY_TIMEOUT}）')
+        sub.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                         help=f'同一間餐廳最多領取幾次（預設{DEFAULT_MAX_ATTEMPTS}）')
+
+    def add_report_options(sub):
+        sub.add_argument('-o', '--output', default='restaurant_check_report.xlsx', help='報告輸出路徑')
+        sub.add_argument('--history', default=os.environ.get('CHECKER_HISTORY', DEFAULT_HISTORY_FILE),
+                         help=f'歷史紀錄檔(SQLite)，結果保存為一次執行（預設{DEFAULT_HISTORY_FILE}）')
+        sub.add_argument('--no-history', action='store_true', help='不保存歷史紀錄')
+
+    enqueue = subparsers.add_parser('enqueue', help='把Excel中的餐廳放進佇列')
+    add_broker_options(enqueue)
+    add_enqueue_options(enqueue)
+
+    worker = subparsers.add_parser('worker', help='執行一個worker（每個容器一個）')
+    add_broker_options(worker)
+    add_worker_options(worker)
+    worker.add_argument('--exit-when-empty', action='store_true', help='佇列全部完成後結束（預設持續等待新的餐廳）')
+    worker.add_argument('--metrics-port', type=int, default=int(os.environ.get('METRICS_PORT', '0')),
+                        help='在 127.0.0.1:埠/metrics 提供Prometheus格式的指標（預設0：不啟動，可用環境變量METRICS_PORT）')
+
+    status = subparsers.add_parser('status', help='顯示佇列進度')
+    add_broker_options(status)
+
+    collect_parser = subparsers.add_parser('collect', help='把佇列中的結果寫成報告')
+    add_broker_options(collect_parser)
+    add_report_options(collect_parser)
+    collect_parser.add_argument('--wait', action='store_true', help='等到所有餐廳都完成')
+
+    run = subparsers.add_parser('run', help='在本機放入佇列並以N個worker行程執行，完成後產生報告')
+    add_broker_options(run)
+    add_enqueue_options(run)
+    add_worker_options(run)
+    add_report_options(run)
+    run.add_argument('--workers', type=int, default=int(os.environ.get('CHECKER_WORKERS', '2')),
+                     help='worker行程數（預設環境變量CHECKER_WORKERS或2）')
+    run.add_argument('--workdir', default='queue_workers', help='存放各worker日誌的目錄')
+
+    args = parser.parse_args(argv)
+    if args.broker == 'memory://':
+        parser.error('memory:// 只能在同一個行程內使用，請改用 redis:// 或 sqlite:///')
+    if args.command == 'run' and args.workers < 1:
+        parser.error('--workers 必須大於0')
+    if getattr(args, 'restaurant_budget', None) and args.visibility_timeout <= args.restaurant_budget:
+        parser.error('--visibility-timeout 必須大於 --restaurant-budget，否則檢查中的餐廳會被其他worker重複領取')
+    return args
+
+
+def main(argv=None):
+    setup_logging()
+    args = parse_args(argv)
+    if args.command == 'enqueue':
+        enqueue_from_args(args)
+        return 0
+    if args.command == 'worker':
+        run_worker(args)
+        return 0
+    if args.command == 'status':
+        return show_status(args)
+    if args.command == 'run':
+        return run_local(args)
+    return collect(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
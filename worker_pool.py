@@ -0,0 +1,244 @@
+"""共用的檢查器worker池與批次工作
+
+固定數量的worker執行緒，每個worker一個 OpenRiceChecker（檢查器本身不是執行緒安全的），
+所有worker共用整個行程的限速器、斷路器探測與共用Chromium。批次工作（BatchJob）的餐廳
+依 build_work_queue 的順序放進同一個佇列，多個工作同時送出時依送出順序輪流由所有worker處理，
+大批次也能用滿全部的並行度。每完成一間餐廳就通知等待中的讀取者（例如API的NDJSON串流）。
+
+worker數由環境變量CHECKER_WORKERS設定（預設2），每個worker使用Chrome時各自佔用一個瀏覽器，
+記憶體有限時可搭配 CHECKER_BROWSER=playwright。
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from log_config import logger
+
+# 工作狀態
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+
+
+class BatchJob:
+    """一批要檢查的餐廳與已完成的結果（執行緒安全）"""
+
+    def __init__(self, items, restaurant_budget=None, on_result=None, on_finish=None, label=None):
+        """
+        :param items: 已排序的WorkItem清單（build_work_queue的結果）
+        :param restaurant_budget: 每間餐廳的時間上限（秒），None時使用檢查器的設定
+        :param on_result: 每完成一間餐廳時呼叫 on_result(job, work_item, result)
+        :param on_finish: 所有餐廳都完成或略過時呼叫 on_finish(job)
+        :param label: 說明（例如上傳的檔名）
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.items = list(items)
+        self.restaurant_budget = restaurant_budget
+        self.on_result = on_result
+        self.on_finish = on_finish
+        self.label = label
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        # 依完成順序排列的 (WorkItem, 結果)
+        self._results = []
+        self._pending = len(self.items)
+        self._condition = threading.Condition()
+
+    @property
+    def total(self):
+        return len(self.items)
+
+    @property
+    def completed(self):
+        with self._condition:
+            return len(self._results)
+
+    @property
+    def finished(self):
+        with self._condition:
+            return self._pending == 0
+
+    @property
+    def status(self):
+        with self._condition:
+            if self._pending == 0:
+                return JOB_CANCELLED if self.cancelled else JOB_DONE
+            return JOB_RUNNING if self._results else JOB_QUEUED
+
+    def cancel(self):
+        """取消尚未開始的餐廳（正在檢查的會完成）"""
+        self.cancelled = True
+
+    def add_result(self, item, result):
+        if self.on_result is not None:
+            try:
+                self.on_result(self, item, result)
+            except Exception as e:
+                logger.warning(f"處理工作 {self.id} 的結果時出錯: {e}")
+        with self._condition:
+            self._results.append((item, result))
+            finished = self._task_done()
+        if finished:
+            self._finish()
+
+    def skip(self, item):
+        """已取消：這間餐廳不檢查"""
+        with self._condition:
+            finished = self._task_done()
+        if finished:
+            self._finish()
+
+    def _task_done(self):
+        self._pending -= 1
+        self._condition.notify_all()
+        if self._pending == 0:
+            self.finished_at = time.time()
+            return True
+        return False
+
+    def _finish(self):
+        if self.on_finish is not None:
+            try:
+                self.on_finish(self)
+            except Exception as e:
+                logger.warning(f"工作 {self.id} 結束時的處理出錯: {e}")
+
+    def wait_results(self, cursor, timeout=None):
+        """等到有第cursor個之後的結果或工作結束，回傳新的 (WorkItem, 結果) 清單"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._results) > cursor or self._pending == 0, timeout)
+            return self._results[cursor:]
+
+    def results_in_order(self):
+        """依Excel/請求中的原始順序排列的結果"""
+        with self._condition:
+            return [result for item, result in sorted(self._results, key=lambda pair: pair[0].index)]
+
+    def summary(self):
+        with self._condition:
+            statuses = [result.get('狀態', '').split(' - ')[0] for _, result in self._results]
+        return {
+            'job_id': self.id,
+            'label': self.label,
+            'status': self.status,
+            'total': self.total,
+            'completed': len(statuses),
+            'statuses': {status: statuses.count(status) for status in sorted(set(statuses))},
+            'created_at': datetime.fromtimestamp(self.created_at).strftime('%Y-%m-%d %H:%M:%S'),
+            'finished_at': (datetime.fromtimestamp(self.finished_at).strftime('%Y-%m-%d %H:%M:%S')
+                            if self.finished_at else None),
+        }
+
+
+def error_result(item, error):
+    """worker本身出錯時的結果（與檢查器的錯誤結果格式相同）"""
+    result = {
+        '餐廳名稱': item.name,
+        'URL': item.url,
+        '檢查時間': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        '通過率': '0/6',
+        '狀態': '錯誤',
+        '錯誤資訊': str(error),
+    }
+    for key in ('中文名稱', '英文名稱', '門面照片', '菜單', '餐點照片', '相關影片'):
+        result[key] = '✗'
+    return result
+
+
+class CheckerPool:
+    """固定數量的worker執行緒，每個worker一個OpenRiceChecker（第一次有工作時才建立）"""
+
+    def __init__(self, workers=None, checker_options=None, max_pause=300):
+        """
+        :param workers: worker數，None時使用環境變量CHECKER_WORKERS（預設2）
+        :param checker_options: 建立OpenRiceChecker的參數（例如 use_selenium、browser）
+        :param max_pause: 所有後端都不健康時，worker暫停等待恢復的最長時間（秒）
+        """
+        self.workers = workers or int(os.environ.get('CHECKER_WORKERS', '2'))
+        self.checker_options = checker_options or {}
+        self.max_pause = max_pause
+        self._tasks = queue.Queue()
+        self._threads = []
+        self._checkers = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, args=(index,), name=f'checker-worker-{index}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"檢查器worker池已啟動（{self.workers} 個worker）")
+
+    def submit(self, job):
+        """把工作的所有餐廳放進佇列（依工作內的順序）"""
+        self._ensure_started()
+        for item in job.items:
+            self._tasks.put((job, item))
+        if not job.items:
+            job.finished_at = time.time()
+            job._finish()
+        return job
+
+    @property
+    def queued(self):
+        """佇列中尚未開始的餐廳數"""
+        return self._tasks.qsize()
+
+    def _create_checker(self):
+        from check_restaurants import OpenRiceChecker
+        checker = OpenRiceChecker('', **self.checker_options)
+        with self._lock:
+            self._checkers.append(checker)
+        return checker
+
+    def _run(self, index):
+        checker = None
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            job, item = task
+            if job.cancelled:
+                job.skip(item)
+                continue
+            try:
+                if checker is None:
+                    checker = self._create_checker()
+                # 所有後端都不健康時先暫停，避免整批餐廳都慢慢失敗
+                checker.wait_for_backends(self.max_pause)
+                result = checker.check_restaurant(item.url, item.name, budget=job.restaurant_budget)
+            except Exception as e:
+                logger.warning(f"worker {index} 檢查 {item.name} 時出錯: {e}")
+                result = error_result(item, e)
+            job.add_result(item, result)
+
+    def close(self):
+        """停止所有worker並關閉檢查器的瀏覽器（佇列中剩下的餐廳不再檢查）"""
+        with self._lock:
+            threads = list(self._threads)
+            self._threads = []
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                task[0].skip(task[1])
+        for _ in threads:
+            self._tasks.put(None)
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            checkers = list(self._checkers)
+            self._checkers = []
+        for checker in checkers:
+            checker.close()